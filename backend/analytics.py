@@ -0,0 +1,166 @@
+import threading
+import numpy as np
+import pandas as pd
+
+# fields the roster is broken down by; Family_Income is grouped into bands
+GROUP_FIELDS = ['Gender', 'Parental_Involvement', 'Internet_Access', 'Access_to_Resources', 'Peer_Influence',
+                'Learning_Disabilities', 'Parental_Education_Level', 'Family_Income']
+INCOME_BANDS = [(30000, '<30k'), (50000, '30k-50k'), (70000, '50k-70k'), (90000, '70k-90k'), (np.inf, '90k+')]
+# fields with a mean in every group
+MEAN_FIELDS = ['Hours_Studied', 'Attendance', 'Previous_Scores', 'prediction_probability']
+# histogram bin edges; values outside fall into the first/last bin
+HISTOGRAMS = {
+    'Attendance': list(range(0, 101, 10)),
+    'Hours_Studied': list(range(0, 13)),
+    'Previous_Scores': list(range(0, 101, 10)),
+}
+OVERALL = ('all', 'all')
+
+
+def _group_keys(df, field):
+    if field == 'Family_Income':
+        income = pd.to_numeric(df[field], errors='coerce').to_numpy()
+        bounds = np.array([b for b, _ in INCOME_BANDS])
+        labels = np.array([l for _, l in INCOME_BANDS], dtype=object)
+        keys = labels[np.minimum(np.searchsorted(bounds, income, side='right'), len(bounds) - 1)]
+        return pd.Series(np.where(np.isnan(income), 'Unknown', keys), index=df.index)
+    return df[field].astype(object).where(df[field].notna(), 'Unknown').astype(str)
+
+
+def _contributions(df):
+    # one row per student of additive quantities; every aggregate is a sum of these
+    cols = {
+        'students': np.ones(len(df), dtype=np.int64),
+        'pass': (df['result'].astype(str).str.lower() == 'pass').to_numpy(np.int64) if 'result' in df.columns
+        else np.zeros(len(df), dtype=np.int64),
+    }
+    for field in MEAN_FIELDS:
+        values = pd.to_numeric(df[field], errors='coerce') if field in df.columns else pd.Series(np.nan, index=df.index)
+        cols[f'{field}:sum'] = values.fillna(0).to_numpy(np.float64)
+        cols[f'{field}:n'] = values.notna().to_numpy(np.int64)
+    for field, edges in HISTOGRAMS.items():
+        values = pd.to_numeric(df[field], errors='coerce').to_numpy(np.float64) if field in df.columns \
+            else np.full(len(df), np.nan)
+        bins = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+        present = ~np.isnan(values)
+        for b in range(len(edges) - 1):
+            hit = present & (bins == b)
+            cols[f'{field}:{b}:n'] = hit.astype(np.int64)
+            cols[f'{field}:{b}:pass'] = (hit & (cols['pass'] == 1)).astype(np.int64)
+    return pd.DataFrame(cols, index=df.index)
+
+
+def aggregate(df):
+    """Additive cohort aggregates of ``df``, indexed by ``(field, value)``.
+
+    All work is vectorized groupby sums over a per-student contribution
+    frame, so two cubes can be combined with ``combine(a, b)`` and a set of
+    rows can be taken out again with ``combine(a, b, sign=-1)``.
+    """
+    contrib = _contributions(df)
+    parts = [pd.DataFrame([contrib.sum()], index=pd.MultiIndex.from_tuples([OVERALL], names=['field', 'value']))]
+    for field in GROUP_FIELDS:
+        if field not in df.columns:
+            continue
+        sums = contrib.groupby(_group_keys(df, field).to_numpy()).sum()
+        sums.index = pd.MultiIndex.from_product([[field], sums.index.astype(str)], names=['field', 'value'])
+        parts.append(sums)
+    return pd.concat(parts)
+
+
+def combine(cube, other, sign=1):
+    """``cube + sign * other``; groups that end up empty are dropped."""
+    if cube is None:
+        return other if sign > 0 else None
+    out = cube.add(other * sign, fill_value=0)
+    return out[out['students'] > 0]
+
+
+class AggregateBuilder:
+    """Accumulates aggregates chunk by chunk while an upload streams through."""
+
+    def __init__(self):
+        self.cube = None
+
+    def add(self, chunk):
+        self.cube = combine(self.cube, aggregate(chunk))
+
+
+def _histogram(row, field):
+    edges = HISTOGRAMS[field]
+    bins = []
+    for b in range(len(edges) - 1):
+        n = int(row[f'{field}:{b}:n'])
+        passed = int(row[f'{field}:{b}:pass'])
+        bins.append({'from': edges[b], 'to': edges[b + 1], 'students': n, 'pass_count': passed,
+                     'pass_rate': round(passed / n, 4) if n else None})
+    return bins
+
+
+def _summary(row, histograms):
+    students, passed = int(row['students']), int(row['pass'])
+    out = {'students': students, 'pass_count': passed, 'fail_count': students - passed,
+           'pass_rate': round(passed / students, 4) if students else None}
+    for field in MEAN_FIELDS:
+        n = row[f'{field}:n']
+        out[f'mean_{field}'] = round(float(row[f'{field}:sum'] / n), 4) if n else None
+    if histograms:
+        out['histograms'] = {field: _histogram(row, field) for field in HISTOGRAMS}
+    return out
+
+
+def render(cube, fields=None, histograms=True):
+    """JSON-ready view of a cube: overall summary plus one list of groups per field."""
+    if cube is None or OVERALL not in cube.index:
+        return {'overall': None, 'groups': {}}
+    groups = {}
+    for (field, value), row in cube.iterrows():
+        if (field, value) == OVERALL or (fields and field not in fields):
+            continue
+        groups.setdefault(field, []).append({'value': value, **_summary(row, histograms)})
+    return {'overall': _summary(cube.loc[OVERALL], True), 'groups': groups}
+
+
+class CohortAnalytics:
+    """Materialized aggregates for the roster currently on disk.
+
+    The cube is tied to the roster signature. Uploads hand over the rows
+    they replaced and wrote (``apply_delta``) or, when streaming, the cube
+    built from the written chunks (``apply_cubes``), so summaries never need
+    a pass over the full roster or the other shards; any other change is picked up by recomputing from the cached
+    roster frame on the next request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+        self._cube = None
+
+    def current(self, roster):
+        signature = roster.signature()
+        with self._lock:
+            if signature == self._signature:
+                return self._cube
+        frame = roster.frame()
+        cube = aggregate(frame) if frame is not None else None
+        self.set(signature, cube)
+        return cube
+
+    def set(self, signature, cube):
+        with self._lock:
+            self._signature, self._cube = signature, cube
+
+    def apply_delta(self, before, after, removed, added):
+        """Move the cube from roster ``before`` to ``after`` by taking out ``removed`` rows and adding ``added``."""
+        self.apply_cubes(before, after, aggregate(removed) if removed is not None and len(removed) else None,
+                         aggregate(added) if added is not None and len(added) else None)
+
+    def apply_cubes(self, before, after, removed, added):
+        """``apply_delta`` with already aggregated cubes (None for no rows)."""
+        with self._lock:
+            if self._signature != before or self._cube is None:
+                self._signature = self._cube = None  # not in sync: recompute lazily
+                return
+            cube = combine(self._cube, removed, sign=-1) if removed is not None else self._cube
+            self._cube = combine(cube, added) if added is not None else cube
+            self._signature = after
@@ -1,56 +1,192 @@
+import logging
 import os
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-import joblib
+import json
+import time
 import jwt
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
+from roster import RosterStore, RosterQuery, QueryError, run_query, encode_cursor
+from locks import FileLock
+from catalog import DEFAULT_SHARD, CatalogError, ShardStats, validate_shard_name
+from serialization import frame_response, envelope_response, ndjson_response
+from features import FEATURES, prepare_features, score_features, outcome_from_proba, normalize_payload
+from ingest import IngestError, UploadIds, ingest_csv_stream, ingest_frame, ingest_upsert
+from jobs import TrainingQueue
+from model_registry import ModelRegistry, MODEL_FORMAT
+from prediction_cache import PredictionCache
+from analytics import AggregateBuilder, CohortAnalytics, GROUP_FIELDS, aggregate, render
+from token_cache import TokenCache
+from metrics import metrics, stage
+from explain import global_importances, top_contributions
+from drift import DriftMonitor
+
+APP_STARTED = time.time()
+
+# LOG_LEVEL=DEBUG brings back per-request auth/login diagnostics (without tokens or passwords)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger('app')
 
 app = Flask(__name__, static_folder='../frontend/build', static_url_path='/')
-# Increase maximum file size to 50MB
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
+# Maximum upload size (default 50MB). CSV uploads are processed in bounded chunks,
+# so this can be raised with MAX_UPLOAD_MB without raising peak memory.
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 50)) * 1024 * 1024
 CORS(app)
 
 SECRET = os.environ.get('JWT_SECRET', 'CHANGE_THIS_SECRET')
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
-MODEL_PATH = os.path.join(os.path.dirname(__file__), 'model', 'model.pkl')
-UPLOAD_FOLDER = DATA_DIR
+MODEL_PATH = os.path.join(os.path.dirname(__file__), 'model', 'model.compact.npz' if MODEL_FORMAT == 'compact' else 'model.pkl')
+# raw uploads are kept here only while they are ingested
+UPLOAD_FOLDER = os.path.join(DATA_DIR, '.uploads')
 ALLOWED_EXT = {'csv', 'xlsx', 'xls'}
 
 os.makedirs(DATA_DIR, exist_ok=True)
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(os.path.join(os.path.dirname(__file__), 'model'), exist_ok=True)
 
-# load model if exists
-model = None
-try:
-    if os.path.exists(MODEL_PATH):
-        model = joblib.load(MODEL_PATH)
-except Exception as e:
-    print('Could not load model:', e)
-    model = None
+# student roster shared by login and students, one catalog shard per class/term file,
+# each reloaded only when its own file changes
+roster = RosterStore(DATA_DIR)
+
+# load model if exists; the watcher swaps in new versions written by training
+model_registry = ModelRegistry(MODEL_PATH, model_format=MODEL_FORMAT)
+MODEL_READY_AT = None
+
+def _mark_model_ready(loaded):
+    # startup time = process import until the first model is servable
+    global MODEL_READY_AT
+    if MODEL_READY_AT is None:
+        MODEL_READY_AT = time.time()
+
+model_registry.add_listener(_mark_model_ready)
+
+# single-student prediction cache, emptied whenever a new model version is swapped in
+prediction_cache = PredictionCache()
+model_registry.add_listener(lambda loaded: prediction_cache.clear())
+# uploads and predictions compared with the training data of the serving model
+drift_monitor = DriftMonitor()
+model_registry.add_listener(lambda loaded: drift_monitor.load())
+model_registry.refresh()
+model_registry.start()
+
+# cohort aggregates for /api/analytics, maintained by uploads instead of recomputed per request
+cohort_analytics = CohortAnalytics()
+
+# serializes /api/upload across threads and gunicorn workers: concurrent uploads would
+# race on the shard files (and their .tmp copies) and the manifest
+upload_lock = FileLock(os.path.join(DATA_DIR, '.upload.lock'))
+
+# background trainings, one at a time across all workers (job records in model/jobs);
+# a finished job loads its model right away in the worker that ran it
+training_queue = TrainingQueue(on_success=lambda job: model_registry.refresh())
+
+def _collect_worker_metrics():
+    # this worker's own state, written with its metrics snapshot and merged across workers on scrape
+    loaded = model_registry.current()
+    families = [('uptime_seconds', 'gauge', 'Seconds since the app was imported.', [({}, time.time() - APP_STARTED)])]
+    if loaded is not None:
+        families += [
+            ('model_info', 'gauge', 'Serving model version (value is always 1).',
+             [({'version': loaded.version, 'fast_encoder': str(loaded.encoder is not None).lower()}, 1)]),
+            ('model_load_seconds', 'gauge', 'Time to load the serving model.', [({}, loaded.load_seconds)]),
+            ('model_loaded_timestamp_seconds', 'gauge', 'When the serving model was loaded.', [({}, loaded.loaded_at)]),
+        ]
+    cache = prediction_cache.stats()
+    for key in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+        families.append((f'prediction_cache_{key}_total', 'counter', f'Prediction cache {key}.', [({}, cache[key])]))
+    families.append(('prediction_cache_entries', 'gauge', 'Entries in the prediction cache.', [({}, cache['size'])]))
+    tokens = token_cache.stats()
+    for key in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+        families.append((f'token_cache_{key}_total', 'counter', f'Verified-token cache {key}.', [({}, tokens[key])]))
+    return families
+
+def _collect_shared_metrics():
+    # state every worker sees alike (shared drift windows, roster files), sampled at scrape time
+    families = []
+    drift = drift_monitor.report()
+    families.append(('drift_psi', 'gauge', 'Population stability index of recent data against the training data.',
+                     [({'source': source, 'feature': field}, score['psi'])
+                      for source, report in drift['sources'].items() for field, score in report['features'].items()
+                      if score['psi'] is not None]))
+    frame = roster.frame()
+    families.append(('roster_rows', 'gauge', 'Rows in the loaded roster.', [({}, 0 if frame is None else len(frame))]))
+    return families
+
+metrics.add_collector(_collect_worker_metrics, per_worker=True)
+metrics.add_collector(_collect_shared_metrics)
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+    metrics.begin_request()
+
+@app.after_request
+def _record_timing(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe_request(endpoint, request.method, response.status_code, elapsed)
+    # per-stage breakdown for browser devtools / curl -v
+    timings = metrics.end_request()
+    response.headers['Server-Timing'] = ', '.join(
+        [f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings] + [f'total;dur={elapsed * 1000:.2f}'])
+    return response
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    # liveness: the process answers requests
+    return jsonify({'ok': True})
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    # readiness: only route traffic here once a model and the roster are loaded
+    loaded = model_registry.current()
+    frame = roster.frame()
+    ok = loaded is not None and frame is not None
+    return jsonify({
+        'ok': ok,
+        'model_version': loaded.version if loaded is not None else None,
+        'roster_rows': len(frame) if frame is not None else 0,
+        'pid': os.getpid(),
+    }), 200 if ok else 503
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Prometheus text format; unauthenticated like a health check, it holds no student data
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 # demo users
 USERS = {'teacher@example.com': {'password':'teacher123','role':'teacher'}}
 
 def create_token(payload):
-    import time
     return jwt.encode({**payload, 'exp': int(time.time()) + (8 * 3600)}, SECRET, algorithm='HS256')
 
+# verified token payloads; dashboards repeat the same bearer token on every poll
+token_cache = TokenCache()
+
 def decode_token(token):
+    secret = SECRET
+    payload = token_cache.get(token, secret)
+    if payload is not None:
+        return payload
     try:
-        return jwt.decode(token, SECRET, algorithms=['HS256'])
+        payload = jwt.decode(token, secret, algorithms=['HS256'])
     except Exception:
         return None
+    token_cache.put(token, secret, payload)
+    return payload
 
 @app.route('/api/login', methods=['POST'])
 def login():
-    print("Login request received:", request.json)
     data = request.json or {}
     role = data.get('role')
-    
-    print(f"Login role: {role}, Data received: {data}")
+    logger.debug("Login request for role %s", role)
     
     if role=='teacher':
         email = data.get('email'); pw = data.get('password')
@@ -61,109 +197,67 @@ def login():
         return jsonify({'ok':False,'message':'Invalid teacher credentials'}),401
     else:
         # Handle student login
-        print(f"Full student login request data: {data}")
-        
         # Get student ID from either id or email field (backward compatibility)
         sid = data.get('id')
         if sid is None:
             # Try to get ID from email field (older form submissions might use this)
             sid = data.get('email')
-            print(f"No 'id' field found, using 'email' field instead: {sid}")
-        
-        print(f"Raw student ID from request: {sid}, Type: {type(sid)}")
+            logger.debug("No 'id' field found, using 'email' field instead")
         
         # Check if ID is missing or None
         if sid is None:
-            print("Student ID is None/missing in request")
+            logger.debug("Student login rejected: ID missing")
             return jsonify({'ok':False,'message':'Student ID is required'}),400
         
         # Convert to string and clean up
         sid = str(sid).strip()
         pw = str(data.get('password', '')).strip()
-        print(f"Processed student login attempt - ID: '{sid}', Password: '{pw}'")
         
         # Check if ID is empty after processing
         if not sid:
-            print("Student ID is empty after processing")
+            logger.debug("Student login rejected: ID empty")
             return jsonify({'ok':False,'message':'Student ID is required'}),400
             
         # Check if password is empty
         if not pw:
-            print("Password is empty")
+            logger.debug("Student login rejected: password empty")
             return jsonify({'ok':False,'message':'Password is required'}),400
             
-        # check student id exists in any CSV in data/
-        df = None
-        for f in os.listdir(DATA_DIR):
-            if f.lower().endswith('.csv'):
-                try:
-                    df = pd.read_csv(os.path.join(DATA_DIR,f))
-                    print(f"Found data file: {f} with {len(df)} records")
-                    break
-                except Exception as e:
-                    print(f"Error reading file {f}: {str(e)}")
-                    continue
-        if df is None:
+        # check student id exists in the roster
+        if roster.signature() is None:
             return jsonify({'ok':False,'message':'No student data available on server'}),400
-            
-        # assume student_id column exists or assign by index
-        if 'student_id' not in df.columns:
-            # create student_id sequential starting at 1001
-            df = df.copy()
-            df.insert(0, 'student_id', range(1001, 1001 + len(df)))
-            print("Added student_id column")
-        
-        # Convert student_id column to string for proper comparison
-        df['student_id'] = df['student_id'].astype(str).str.strip()
-        
-        # Print all student IDs for debugging
-        student_ids = df['student_id'].tolist()
-        print(f"First 5 student IDs in data: {student_ids[:5]}")
-        print(f"Looking for student ID: '{sid}' in database")
         
-        # Check if student ID exists using explicit comparison
-        exists = False
-        for db_id in student_ids:
-            if str(db_id).strip() == sid:
-                exists = True
-                print(f"Found matching ID: '{db_id}' == '{sid}'")
-                break
-        
-        print(f"Student ID '{sid}' exists in data: {exists}")
+        exists = sid in roster
         
         # Check password (only student123 is valid)
         valid_pw = (pw == 'student123')
-        print(f"Password valid: {valid_pw}")
         
         # Handle error cases
         if not exists:
-            print(f"Login failed: Student ID '{sid}' not found in database")
+            logger.info("Login failed: student ID %s not found", sid)
             return jsonify({'ok':False,'message':f'Student ID {sid} not found in database'}),401
             
         if not valid_pw:
-            print(f"Login failed: Incorrect password for Student ID '{sid}'")
+            logger.info("Login failed: incorrect password for student ID %s", sid)
             return jsonify({'ok':False,'message':'Incorrect password'}),401
             
         # Success case
         token = create_token({'id':sid,'role':'student'})
-        print(f"Student login successful for ID: {sid}")
+        logger.debug("Student login successful for ID %s", sid)
         return jsonify({'ok':True,'token':token,'role':'student','id':sid})
 
 def require_auth_role(req, role=None):
     auth = req.headers.get('Authorization','')
-    print(f"DEBUG: Authorization header: {auth}")
     if not auth.startswith('Bearer '): 
-        print("DEBUG: No Bearer token found")
+        logger.debug("No Bearer token found")
         return None
     token = auth.split(' ',1)[1]
-    print(f"DEBUG: Token: {token}")
     payload = decode_token(token)
-    print(f"DEBUG: Decoded payload: {payload}")
     if not payload: 
-        print("DEBUG: Failed to decode token")
+        logger.debug("Failed to decode token")
         return None
     if role and payload.get('role')!=role: 
-        print(f"DEBUG: Role mismatch. Expected: {role}, Got: {payload.get('role')}")
+        logger.debug("Role mismatch. Expected: %s, got: %s", role, payload.get('role'))
         return None
     return payload
 
@@ -172,27 +266,33 @@ def students():
     # protected endpoint: teacher sees all, student sees their record
     auth = require_auth_role(request)
     if not auth: return jsonify({'ok':False,'message':'Unauthorized'}),401
-    # find first csv
-    df = None
-    for f in os.listdir(DATA_DIR):
-        if f.lower().endswith('.csv'):
-            try:
-                df = pd.read_csv(os.path.join(DATA_DIR,f))
-                break
-            except:
-                continue
+    df = roster.frame()
+    ndjson = request.args.get('format') == 'ndjson'
+    if auth.get('role')=='teacher' and df is not None and RosterQuery.is_paged(request.args, df.columns):
+        # paginated / filtered / projected view; without parameters the full list is returned as before
+        try:
+            query = RosterQuery.from_args(request.args, df.columns)
+            page, total = run_query(roster, query)
+        except QueryError as e:
+            return jsonify({'ok':False,'message':str(e)}),400
+        if ndjson:
+            return ndjson_response(page)
+        next_offset = query.offset + len(page)
+        return envelope_response({
+            'total': total,
+            'offset': query.offset,
+            'limit': query.limit,
+            'next_cursor': encode_cursor(next_offset) if next_offset < total else None
+        }, {'items': page})
     if df is None:
         return jsonify([])
-    if 'student_id' not in df.columns:
-        df = df.copy()
-        df.insert(0, 'student_id', range(1001, 1001 + len(df)))
     if auth.get('role')=='teacher':
-        return jsonify(df.to_dict(orient='records'))
+        # serialized column-wise by pandas instead of one dict per row
+        return ndjson_response(df) if ndjson else frame_response(df)
     else:
-        sid = str(auth.get('id'))
-        rec = df[df['student_id'].astype(str)==sid]
-        if rec.empty: return jsonify({}),404
-        return jsonify(rec.iloc[0].to_dict())
+        rec = roster.lookup(auth.get('id'))
+        if rec is None: return jsonify({}),404
+        return jsonify(rec)
 
 @app.route('/api/upload', methods=['POST'])
 def upload_csv():
@@ -213,158 +313,252 @@ def upload_csv():
     if file_ext not in ALLOWED_EXT:
         return jsonify({'ok':False,'message':f'File type not allowed. Please upload .csv, .xlsx or .xls files'}),400
     
-    save_path = os.path.join(UPLOAD_FOLDER, filename)
-    f.save(save_path)
-    
-    # Process the file based on extension
+    # shard=<name> writes a class/term shard of the catalog; without it the default roster (students.csv)
+    shard = request.form.get('shard') or request.args.get('shard') or DEFAULT_SHARD
     try:
-        # Read the file based on its extension
-        if file_ext in ['xlsx', 'xls']:
-            df = pd.read_excel(save_path)
-        else:  # csv
-            df = pd.read_csv(save_path)
+        validate_shard_name(shard)
+    except CatalogError as e:
+        return jsonify({'ok':False,'message':str(e)}),400
+    
+    # uploads rewrite the same files; one at a time
+    with upload_lock:
+        save_path = os.path.join(UPLOAD_FOLDER, f'{shard}.{file_ext}')
+        f.save(save_path)
+    
+        # Process the file based on extension
+        output_path = roster.catalog.shard_path(shard)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        saved_as = os.path.relpath(output_path, DATA_DIR)
+        # mode=upsert merges into the stored shard instead of replacing it
+        upsert = (request.form.get('mode') or request.args.get('mode')) == 'upsert'
+        # a student_id must live in one shard only, or logins could resolve to another class's row
+        allow_duplicates = (request.form.get('allow_duplicate_ids') or request.args.get('allow_duplicate_ids', '0')) not in ('0', 'false')
+        upload_ids = UploadIds()
+        def check_ids(rows):
+            if allow_duplicates or 'student_id' not in rows.columns:
+                return
+            upload_ids.check(rows)
+            found = roster.find_ids(rows['student_id'], exclude=shard)
+            if found:
+                name, ids = next(iter(found.items()))
+                more = f' (+{len(ids) - 5} more)' if len(ids) > 5 else ''
+                raise IngestError(f"student_id {', '.join(ids[:5])}{more} already stored in shard '{name}'; "
+                                  f"use ids that are unique across shards or pass allow_duplicate_ids=1")
+        model = current_model()
+        try:
+            if model is not None:
+                logger.info("Generating predictions for uploaded students...")
+            else:
+                logger.info("No model available. Keeping uploaded results or generating defaults from scores and hours.")
+            # the shard's previous rows leave the cohort cube; the other shards are not touched
+            existing = roster.shard_frame(shard)
+            before = roster.signature()
+            stats = ShardStats()
+            with stage('ingest'):
+                if upsert and existing is not None:
+                    # delta upload: merge by student_id and rescore only rows whose features changed
+                    upload = pd.read_excel(save_path) if file_ext in ['xlsx', 'xls'] else pd.read_csv(save_path)
+                    df, result = ingest_upsert(upload, existing, output_path, model, validate=check_ids)
+                    stats.add(df)
+                    roster.catalog.record(shard, stats)
+                    roster.replace(df, output_path, shard)
+                    cohort_analytics.apply_delta(before, roster.signature(), result.replaced_rows, result.written_rows)
+                    drift_monitor.observe('upload', result.written_rows, flush=True)
+                elif file_ext in ['xlsx', 'xls']:
+                    # Excel cannot be read incrementally; score the whole sheet at once
+                    df, result = ingest_frame(pd.read_excel(save_path), output_path, model, validate=check_ids)
+                    stats.add(df)
+                    roster.catalog.record(shard, stats)
+                    roster.replace(df, output_path, shard)
+                    cohort_analytics.apply_delta(before, roster.signature(), existing, df)
+                    drift_monitor.observe('upload', df, flush=True)
+                else:  # csv
+                    # stream the CSV in bounded chunks; the shard reloads from disk on next access
+                    builder = AggregateBuilder()
+                    drift_rows = drift_monitor.staged()
+                    # only collected per chunk: a later chunk can still reject the whole upload
+                    def on_chunk(chunk):
+                        builder.add(chunk)
+                        stats.add(chunk)
+                        drift_rows.observe(chunk)
+                    result = ingest_csv_stream(save_path, output_path, model, on_chunk=on_chunk, validate=check_ids)
+                    roster.catalog.record(shard, stats)
+                    roster.invalidate(shard)
+                    removed = aggregate(existing) if existing is not None and len(existing) else None
+                    cohort_analytics.apply_cubes(before, roster.signature(), removed, builder.cube)
+                    drift_monitor.commit('upload', drift_rows)
         
-        # Validate required columns
-        required_columns = [
-            'Hours_Studied', 'Attendance', 'Parental_Involvement', 'Access_to_Resources',
-            'Previous_Scores', 'Internet_Access', 'Tutoring_Sessions', 'Family_Income',
-            'Peer_Influence', 'Learning_Disabilities', 'Parental_Education_Level',
-            'Distance_from_Home', 'Gender'
-        ]
+            if model is not None:
+                log_feature_importance(model)
+                logger.info("Predictions generated: %d Pass, %d Fail", result.pass_count, result.fail_count)
         
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            return jsonify({
-                'ok': False, 
-                'message': f'Missing required columns: {", ".join(missing_columns)}'
-            }), 400
+            response = {
+                'ok': True, 
+                'shard': shard,
+                'rows': result.rows,
+                'pass_count': result.pass_count,
+                'fail_count': result.fail_count,
+                'message': f'Successfully processed {result.rows} student records ({result.pass_count} Pass, {result.fail_count} Fail). File saved as {saved_as}.'
+            }
+            if result.rescored is not None:
+                response.update({'mode': 'upsert', 'inserted': result.inserted, 'updated': result.updated,
+                                 'unchanged': result.unchanged, 'rescored': result.rescored})
+                response['message'] = (f'Merged {result.updated} updated and {result.inserted} new student records '
+                                       f'({result.unchanged} uploaded unchanged), '
+                                       f'rescored {result.rescored}; shard now has {result.rows} records '
+                                       f'({result.pass_count} Pass, {result.fail_count} Fail). File saved as {saved_as}.')
+            return jsonify(response)
         
-            # Add student_id if it doesn't exist
-        if 'student_id' not in df.columns:
-            df.insert(0, 'student_id', range(1001, 1001 + len(df)))
-            
-        # Add Student_Name if it doesn't exist
-        if 'Student_Name' not in df.columns:
-            # Generate placeholder names
-            df.insert(1, 'Student_Name', [f'Student_{i}' for i in range(len(df))])        # Generate predictions for all students if model exists
-        global model
-        if model is not None:
+        except IngestError as e:
+            return jsonify({'ok':False,'message':str(e)}),400
+        except Exception as e:
+            return jsonify({'ok':False,'message':'Error processing file: '+str(e)}),500
+        finally:
+            # the shard file is the stored copy; the raw upload is not kept next to it
             try:
-                print(f"Generating predictions for {len(df)} students...")
-                
-                # Prepare data for prediction by ensuring all required columns exist with appropriate types
-                numeric_fields = ['Hours_Studied', 'Attendance', 'Previous_Scores', 'Tutoring_Sessions', 'Family_Income', 'Distance_from_Home']
-                categorical_fields = ['Parental_Involvement', 'Access_to_Resources', 'Internet_Access', 'Peer_Influence', 'Learning_Disabilities', 'Parental_Education_Level', 'Gender']
-                
-                # Handle missing numeric fields
-                for col in numeric_fields:
-                    if col not in df.columns:
-                        df[col] = 0
-                    else:
-                        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-                
-                # Handle missing categorical fields
-                for col in categorical_fields:
-                    if col not in df.columns:
-                        # Set default values
-                        if col == 'Parental_Involvement': df[col] = 'Medium'
-                        elif col == 'Access_to_Resources': df[col] = 'Yes'
-                        elif col == 'Internet_Access': df[col] = 'Yes'
-                        elif col == 'Peer_Influence': df[col] = 'Neutral'
-                        elif col == 'Learning_Disabilities': df[col] = 'No'
-                        elif col == 'Parental_Education_Level': df[col] = 'Secondary'
-                        elif col == 'Gender': df[col] = 'Other'
-                    else:
-                        # Fill missing values with mode or default
-                        mode_value = df[col].mode().iloc[0] if not df[col].isna().all() else 'Unknown'
-                        df[col] = df[col].fillna(mode_value)
-                
-                # Select only the required features in the correct order
-                X_pred = df[required_columns]
-                
-                # Make predictions using the model pipeline (which applies the preprocessing)
-                predictions = model.predict(X_pred)
-                
-                # Safely handle probabilities with error handling
-                probabilities = None
-                try:
-                    if hasattr(model, 'predict_proba'):
-                        proba_result = model.predict_proba(X_pred)
-                        
-                        # Handle different shapes of probability results
-                        if proba_result.ndim > 1 and proba_result.shape[1] >= 2:
-                            # Standard case - get probability of positive class (usually index 1)
-                            probabilities = proba_result[:, 1]
-                        elif proba_result.ndim > 0 and proba_result.size > 0:
-                            # Single probability value
-                            probabilities = proba_result.flatten()
-                        else:
-                            # Fallback if shape is unexpected
-                            probabilities = np.array([1.0 if pred == 1 else 0.0 for pred in predictions])
-                except Exception as e:
-                    print(f"Error calculating probabilities: {str(e)}")
-                    probabilities = np.array([1.0 if pred == 1 else 0.0 for pred in predictions])
-                
-                # Add predictions to dataframe
-                df['result'] = ['Pass' if pred == 1 else 'Fail' for pred in predictions]
-                if probabilities is not None:
-                    df['prediction_probability'] = probabilities
-                
-                # Log the feature importance if available
-                if hasattr(model, 'named_steps') and hasattr(model.named_steps.get('clf', None), 'feature_importances_'):
-                    importances = model.named_steps['clf'].feature_importances_
-                    print("Top 5 important features:")
-                    feature_importance = [(i, col) for i, col in zip(importances, required_columns)]
-                    feature_importance.sort(reverse=True)
-                    for i, (imp, col) in enumerate(feature_importance[:5]):
-                        print(f"{i+1}. {col}: {imp:.4f}")
-                    
-                print(f"Predictions generated: {sum(predictions)} Pass, {len(predictions) - sum(predictions)} Fail")
-            except Exception as e:
-                print(f"Error generating predictions: {str(e)}")
-        else:
-            # If no model exists yet, generate default results based on scores and hours
-            if 'result' not in df.columns:
-                print("No model available. Generating default results based on scores and hours.")
-                scores_mask = pd.notna(df.get('Previous_Scores', pd.Series([np.nan] * len(df)))) & (df.get('Previous_Scores', 0) >= 50)
-                hours_mask = pd.notna(df.get('Hours_Studied', pd.Series([np.nan] * len(df)))) & (df.get('Hours_Studied', 0) >= 5)
-                df['result'] = np.where(scores_mask | hours_mask, 'Pass', 'Fail')
-            
-        # Save as canonical CSV
-        output_path = os.path.join(UPLOAD_FOLDER, 'students.csv')
-        df.to_csv(output_path, index=False)
-        
-        row_count = len(df)
-        pass_count = len(df[df['result'] == 'Pass'])
-        fail_count = row_count - pass_count
-        
-        return jsonify({
-            'ok': True, 
-            'message': f'Successfully processed {row_count} student records ({pass_count} Pass, {fail_count} Fail). File saved as students.csv.'
-        })
-        
-    except Exception as e:
-        return jsonify({'ok':False,'message':'Error processing file: '+str(e)}),500
+                os.remove(save_path)
+            except OSError:
+                pass
+
+def log_feature_importance(model):
+    # Log the feature importance if available, summed over each feature's one-hot columns
+    importances = global_importances(model)
+    if importances is not None:
+        feature_importance = sorted(zip(importances, FEATURES), reverse=True)
+        logger.debug("Top 5 important features: %s",
+                     ', '.join(f"{col}: {imp:.4f}" for imp, col in feature_importance[:5]))
+
+def wants_explanation(req):
+    return req.args.get('explain', '0') not in ('0', 'false', '')
+
+@app.route('/api/analytics', methods=['GET'])
+def analytics():
+    # teacher only: roster-wide summaries without shipping the roster to the browser
+    auth = require_auth_role(request, role='teacher')
+    if not auth: return jsonify({'ok':False,'message':'Unauthorized'}),401
+    fields = [f.strip() for f in request.args.get('group_by', '').split(',') if f.strip()]
+    unknown = [f for f in fields if f not in GROUP_FIELDS]
+    if unknown:
+        return jsonify({'ok':False,'message':f"Unknown group_by field(s): {', '.join(unknown)}. Use: {', '.join(GROUP_FIELDS)}"}),400
+    cube = cohort_analytics.current(roster)
+    histograms = request.args.get('histograms', '1') not in ('0', 'false')
+    return jsonify({'ok':True, **render(cube, fields=fields or None, histograms=histograms)})
+
+@app.route('/api/catalog', methods=['GET'])
+def catalog():
+    # teacher only: the roster's shards with their manifest entries (rows, schema, pass/fail, id range)
+    auth = require_auth_role(request, role='teacher')
+    if not auth: return jsonify({'ok':False,'message':'Unauthorized'}),401
+    manifest = roster.catalog.manifest()
+    shards = [{'name': name, **manifest.get(name, {'file': os.path.relpath(path, DATA_DIR)})}
+              for name, path in roster.catalog.select()]
+    return jsonify({'ok':True, 'shards':shards})
+
+@app.route('/api/drift', methods=['GET'])
+def drift_status():
+    # teacher only: how far recent uploads/predictions are from the data the serving model was trained on
+    auth = require_auth_role(request, role='teacher')
+    if not auth: return jsonify({'ok':False,'message':'Unauthorized'}),401
+    report = drift_monitor.report()
+    if report['reference'] is None:
+        report['message'] = 'No drift reference for the serving model; it is written by the next training'
+    return jsonify({'ok':True, **report})
 
 @app.route('/api/train', methods=['POST'])
 def train():
     # teacher only
     auth = require_auth_role(request, role='teacher')
     if not auth: return jsonify({'ok':False,'message':'Unauthorized'}),401
-    # run training script (train_model.py) if present in backend; else train here if scikit-learn available
-    try:
-        train_script = os.path.join(os.path.dirname(__file__), 'train_model.py')
-        if os.path.exists(train_script):
-            # execute train script in subprocess to avoid dependency issues
-            import subprocess, sys
-            res = subprocess.run([sys.executable, train_script], capture_output=True, text=True)
-            if res.returncode!=0:
-                return jsonify({'ok':False,'message':'Train failed','stdout':res.stdout,'stderr':res.stderr}),500
-            return jsonify({'ok':True,'message':'Retrain finished','stdout':res.stdout})
-        else:
-            return jsonify({'ok':False,'message':'No train_model.py found on server'}),500
-    except Exception as e:
-        return jsonify({'ok':False,'message':str(e)}),500
+    # mode=incremental adds trees to the current forest instead of refitting from scratch
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode') or request.args.get('mode')
+    if mode not in (None, 'full', 'incremental'):
+        return jsonify({'ok':False,'message':"mode must be 'full' or 'incremental'"}),400
+    # if_drifted: scheduled retrains only run when recent data no longer matches the training data
+    if_drifted = data.get('if_drifted', request.args.get('if_drifted', '0'))
+    if isinstance(if_drifted, str):
+        if_drifted = if_drifted.strip().lower() not in ('0', 'false')
+    if if_drifted:
+        report = drift_monitor.report()
+        if report['reference'] is not None and not report['retrain_recommended']:
+            return jsonify({'ok':True,'job_id':None,'status':'skipped','message':'No feature drift detected; training skipped'})
+    # shards: train on these catalog shards only (list or comma separated); default all of them
+    shards = data.get('shards', request.args.get('shards'))
+    if isinstance(shards, str):
+        shards = [name.strip() for name in shards.split(',') if name.strip()]
+    if shards is not None:
+        if not isinstance(shards, list) or not shards:
+            return jsonify({'ok':False,'message':'shards must be a non-empty list of shard names'}),400
+        try:
+            roster.catalog.select(shards)
+        except CatalogError as e:
+            return jsonify({'ok':False,'message':str(e)}),400
+    # training runs in the background job queue; poll or stream GET /api/train/<id>
+    job, created = training_queue.submit(mode, shards)
+    return jsonify({
+        'ok': True,
+        'job_id': job.id,
+        'status': job.status,
+        'mode': job.mode,
+        'shards': job.shards,
+        'deduplicated': not created,
+        'message': 'Training queued' if created else 'Training already queued'
+    }),202
+
+@app.route('/api/train/<job_id>', methods=['GET'])
+def train_status(job_id):
+    auth = require_auth_role(request, role='teacher')
+    if not auth: return jsonify({'ok':False,'message':'Unauthorized'}),401
+    job = training_queue.get(job_id)
+    if job is None:
+        return jsonify({'ok':False,'message':'Unknown training job'}),404
+    if request.args.get('stream') not in ('1', 'true'):
+        return jsonify({'ok':True,'job':job.to_dict()})
+
+    def generate(job):
+        # NDJSON: one {"log": ...} line per output line, then the final job state
+        sent = 0
+        while True:
+            finished = job.done.wait(0.5)
+            lines = job.log[sent:]
+            sent += len(lines)
+            for line in lines:
+                yield json.dumps({'log': line}) + '\n'
+            if finished:
+                final = job.to_dict()
+                final.pop('stdout')
+                yield json.dumps(final) + '\n'
+                return
+            if not training_queue.is_local(job):
+                # owned by another worker: follow its stored record
+                job = training_queue.get(job_id) or job
+    return Response(generate(job), mimetype='application/x-ndjson')
+
+def current_model():
+    # snapshot of the serving pipeline; a concurrent reload does not affect the caller
+    loaded = model_registry.current()
+    if loaded is None:
+        model_registry.wake()
+        return None
+    return loaded.pipeline
+
+def read_batch_rows(req):
+    # JSON array of feature objects, or NDJSON (one object per line)
+    body = req.get_data(cache=False)
+    if req.mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    rows = json.loads(body or b'[]')
+    if isinstance(rows, dict):
+        rows = rows.get('students', [])
+    return rows
+
+@app.route('/api/model', methods=['GET'])
+def model_info():
+    auth = require_auth_role(request, role='teacher')
+    if not auth: return jsonify({'ok':False,'message':'Unauthorized'}),401
+    info = model_registry.info()
+    info['startup_seconds'] = round(MODEL_READY_AT - APP_STARTED, 4) if MODEL_READY_AT else None
+    return jsonify({'ok':True, **info})
 
 @app.route('/api/predict', methods=['POST'])
 def predict():
@@ -374,93 +568,108 @@ def predict():
     if auth.get('role')!='teacher':
         return jsonify({'ok':False,'message':'Only teachers can predict via form'}),403
     payload = request.json or {}
-    # find model
-    global model
-    if model is None:
-        if os.path.exists(MODEL_PATH):
-            try:
-                model = joblib.load(MODEL_PATH)
-            except Exception as e:
-                return jsonify({'ok':False,'message':'Model load error: '+str(e)}),500
-        else:
-            return jsonify({'ok':False,'message':'Model not available. Please train first.'}),400
+    loaded = model_registry.current()
+    if loaded is None:
+        model_registry.wake()
+        return jsonify({'ok':False,'message':'Model not available. Please train first.'}),400
     # expected features: client should send the 13 fields (Student_Name is not used for prediction)
-    expected = ['Hours_Studied','Attendance','Parental_Involvement','Access_to_Resources','Previous_Scores','Internet_Access','Tutoring_Sessions','Family_Income','Peer_Influence','Learning_Disabilities','Parental_Education_Level','Distance_from_Home','Gender']
     try:
-        # Create a dataframe from payload but ensure Student_Name is not used in prediction
-        if 'Student_Name' in payload:
-            student_name = payload.pop('Student_Name')  # Remove but save it
-            df = pd.DataFrame([payload])
-            # Add it back after prediction if needed
-            payload['Student_Name'] = student_name
+        # identical (normalized) profiles on the same model version skip inference
+        features_key = normalize_payload(payload)
+        drift_monitor.observe_key('predict', features_key)
+        cache_key = (loaded.version, features_key) if features_key is not None else None
+        cached = prediction_cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            pred, prob = cached
         else:
-            df = pd.DataFrame([payload])
-        
-        # Handle missing fields with appropriate defaults
-        numeric_fields = ['Hours_Studied', 'Attendance', 'Previous_Scores', 'Tutoring_Sessions', 'Family_Income', 'Distance_from_Home']
-        categorical_fields = ['Parental_Involvement', 'Access_to_Resources', 'Internet_Access', 'Peer_Influence', 'Learning_Disabilities', 'Parental_Education_Level', 'Gender']
-        
-        # Set default values for missing fields
-        for c in numeric_fields:
-            if c not in df.columns or pd.isna(df[c]).any():
-                df[c] = 0
-        
-        for c in categorical_fields:
-            if c not in df.columns or pd.isna(df[c]).any():
-                # Set appropriate defaults for categorical fields
-                if c == 'Parental_Involvement': df[c] = 'Medium'
-                elif c == 'Access_to_Resources': df[c] = 'Yes'
-                elif c == 'Internet_Access': df[c] = 'Yes'
-                elif c == 'Peer_Influence': df[c] = 'Neutral'
-                elif c == 'Learning_Disabilities': df[c] = 'No'
-                elif c == 'Parental_Education_Level': df[c] = 'Secondary'
-                elif c == 'Gender': df[c] = 'Other'
-        
-        # Convert numeric fields to proper type
-        for c in numeric_fields:
-            df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
-        
-        # Ensure we use the exact expected columns in the right order
-        df = df[expected]
-        
-        # Use model's predict method - it will apply the same preprocessing as during training
-        pred = model.predict(df)[0]
-        
-        # Handle predict_proba safely with error catching
-        try:
-            if hasattr(model, 'predict_proba'):
-                proba_result = model.predict_proba(df)
-                
-                # Debug information
-                print(f"Prediction result: {pred}")
-                print(f"Probability shape: {proba_result.shape}")
-                
-                # Handle different shapes of probability results
-                if proba_result.ndim > 1 and proba_result.shape[1] >= 2:
-                    # If we have a probability for each class (standard case)
-                    prob = float(proba_result[0][1])
-                    print(f"Using probability from array: {prob}")
-                elif proba_result.ndim > 0 and proba_result.size > 0:
-                    # If we have a single probability value
-                    prob = float(proba_result[0])
-                    print(f"Using single probability value: {prob}")
-                else:
-                    # Fallback
-                    prob = 1.0 if int(pred) == 1 else 0.0
-                    print(f"Using fallback probability: {prob}")
+            # compiled encoder: payload -> feature vector -> trees, no pandas/ColumnTransformer
+            with stage('compiled_predict_proba'):
+                proba = loaded.encoder.predict_proba(payload) if loaded.encoder is not None else None
+            if proba is not None:
+                passed, probability = outcome_from_proba(loaded.pipeline, proba)
             else:
-                prob = 1.0 if int(pred) == 1 else 0.0
-                print(f"Model has no predict_proba method, using fallback: {prob}")
-        except Exception as e:
-            print(f"Error calculating probability: {str(e)}")
-            prob = 1.0 if int(pred) == 1 else 0.0
+                # Student_Name is not used in prediction; prepare_features only keeps the 13 model inputs
+                df = prepare_features(pd.DataFrame([payload]))
+                passed, probability = score_features(loaded.pipeline, df)
+            pred = 1 if passed[0] else 0
+            prob = float(probability[0])
+            if cache_key is not None:
+                prediction_cache.put(cache_key, (pred, prob))
         
         # Return detailed information about the prediction
-        return jsonify({
+        response = {
             'prediction': 'Pass' if int(pred)==1 else 'Fail',
             'probability': prob,
             'input_features': payload
+        }
+        if wants_explanation(request):
+            explainer = loaded.explainer
+            if explainer is None:
+                return jsonify({'ok':False,'message':'Explanations are not supported for this model'}),400
+            baseline, contributions = explainer.explain(prepare_features(pd.DataFrame([payload])))
+            response['explanation'] = {'baseline': baseline, 'contributions': top_contributions(contributions[0])}
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({'ok':False,'message':str(e)}),500
+
+@app.route('/api/predict/cache', methods=['GET'])
+def predict_cache_stats():
+    auth = require_auth_role(request, role='teacher')
+    if not auth: return jsonify({'ok':False,'message':'Unauthorized'}),401
+    loaded = model_registry.current()
+    return jsonify({'ok':True,'model_version':loaded.version if loaded else None,**prediction_cache.stats()})
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    auth = require_auth_role(request, role='teacher')
+    if not auth: return jsonify({'ok':False,'message':'Unauthorized'}),401
+    loaded = model_registry.current()
+    if loaded is None:
+        model_registry.wake()
+        return jsonify({'ok':False,'message':'Model not available. Please train first.'}),400
+    explainer = None
+    if wants_explanation(request):
+        explainer = loaded.explainer
+        if explainer is None:
+            return jsonify({'ok':False,'message':'Explanations are not supported for this model'}),400
+    try:
+        rows = read_batch_rows(request)
+    except ValueError as e:
+        return jsonify({'ok':False,'message':'Invalid JSON body: '+str(e)}),400
+    if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+        return jsonify({'ok':False,'message':'Expected a JSON array (or NDJSON lines) of student objects'}),400
+    if not rows:
+        return jsonify({'ok':True,'count':0,'pass_count':0,'fail_count':0,'predictions':[]})
+    try:
+        df = pd.DataFrame.from_records(rows)
+        X = prepare_features(df)
+        drift_monitor.observe('predict', X, prepared=True)
+        passed, probability = score_features(loaded.pipeline, X)
+        out = pd.DataFrame({
+            'prediction': np.where(passed, 'Pass', 'Fail'),
+            'probability': probability,
         })
+        fields = {}
+        if explainer is not None:
+            # one column per input: its share of the Pass probability relative to the baseline
+            baseline, contributions = explainer.explain(X)
+            out = pd.concat([out, pd.DataFrame(contributions, columns=[f'contribution_{f}' for f in FEATURES])], axis=1)
+            fields['baseline'] = baseline
+        # echo identifiers so callers can match results to their rows
+        for col in ('Student_Name', 'student_id'):
+            if col in df.columns:
+                ids = df[col]
+                if ids.dtype.kind == 'f' and (ids.dropna() % 1 == 0).all():
+                    ids = ids.astype('Int64')  # ids with gaps come back as floats from from_records
+                out.insert(0, col, ids.array)
+        pass_count = int(passed.sum())
+        return envelope_response({
+            'ok': True,
+            'count': len(out),
+            'pass_count': pass_count,
+            'fail_count': len(out) - pass_count,
+            **fields,
+        }, {'predictions': out})
     except Exception as e:
         return jsonify({'ok':False,'message':str(e)}),500
 
@@ -478,4 +687,6 @@ def serve(path):
         return jsonify({'message':'Backend running. Frontend not built.'})
 
 if __name__ == '__main__':
+    metrics.reset_directory()
+    metrics.start_flusher()
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT',5000)), debug=True)
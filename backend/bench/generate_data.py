@@ -0,0 +1,95 @@
+"""Write a synthetic student roster with the same schema as data/students.csv.
+
+    python bench/generate_data.py --rows 1000000 --output /tmp/students_1m.csv
+    python bench/generate_data.py --rows 10000000 --output data/students.csv --seed 7
+
+Numeric ranges and categorical levels (with their sample frequencies) follow
+the bundled 100-row sample. Rows are generated and appended in chunks, so
+memory stays flat even for 10M rows. The ``result`` label comes from a noisy
+score over the features, so models trained on it have something to learn.
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from features import FEATURES  # noqa: E402
+
+# (low, high) inclusive, as in the sample roster
+NUMERIC_RANGES = {
+    'Hours_Studied': (2, 9),
+    'Attendance': (45, 96),
+    'Previous_Scores': (34, 92),
+    'Tutoring_Sessions': (0, 6),
+    'Family_Income': (20000, 99000),
+    'Distance_from_Home': (1, 15),
+}
+# level -> share of rows in the sample roster
+CATEGORICAL_LEVELS = {
+    'Parental_Involvement': {'Low': 0.40, 'Medium': 0.32, 'High': 0.28},
+    'Access_to_Resources': {'High': 0.45, 'Medium': 0.30, 'Low': 0.25},
+    'Internet_Access': {'Yes': 0.75, 'No': 0.25},
+    'Peer_Influence': {'Positive': 0.46, 'Negative': 0.30, 'Neutral': 0.24},
+    'Learning_Disabilities': {'No': 0.75, 'Yes': 0.25},
+    'Parental_Education_Level': {'High School': 0.26, 'College': 0.21, 'Post Graduate': 0.21,
+                                 'Graduate': 0.18, 'Middle School': 0.14},
+    'Gender': {'Male': 0.50, 'Female': 0.50},
+}
+FIRST_ID = 1001
+
+
+def generate_chunk(rng, start, rows):
+    """``rows`` synthetic students with ids starting at ``FIRST_ID + start``."""
+    ids = np.arange(FIRST_ID + start, FIRST_ID + start + rows)
+    cols = {'student_id': ids, 'Student_Name': ['Student_' + str(i) for i in ids]}
+    for col, (low, high) in NUMERIC_RANGES.items():
+        cols[col] = rng.integers(low, high + 1, size=rows)
+    if 'Family_Income' in cols:
+        cols['Family_Income'] = cols['Family_Income'] // 1000 * 1000
+    for col, levels in CATEGORICAL_LEVELS.items():
+        cols[col] = rng.choice(list(levels), size=rows, p=list(levels.values()))
+    df = pd.DataFrame(cols)
+
+    # noisy linear score: prior results, study time and attendance dominate
+    score = (0.5 * (df['Previous_Scores'] - 60) + 4 * (df['Hours_Studied'] - 5)
+             + 0.3 * (df['Attendance'] - 70) + 2 * (df['Tutoring_Sessions'] - 3)
+             + np.where(df['Parental_Involvement'] == 'High', 4, 0)
+             + np.where(df['Learning_Disabilities'] == 'Yes', -4, 0)
+             + rng.normal(0, 6, size=rows))
+    df['result'] = np.where(score > 0, 'Pass', 'Fail')
+    return df[['student_id', 'Student_Name'] + FEATURES + ['result']]
+
+
+def generate(output, rows, seed=42, chunk_rows=500000):
+    rng = np.random.default_rng(seed)
+    start = time.time()
+    tmp_path = output + '.tmp'
+    written = 0
+    while written < rows:
+        n = min(chunk_rows, rows - written)
+        generate_chunk(rng, written, n).to_csv(tmp_path, mode='w' if written == 0 else 'a',
+                                               header=written == 0, index=False)
+        written += n
+        print(f"{written}/{rows} rows", flush=True)
+    os.replace(tmp_path, output)
+    print(f"Wrote {rows} rows to {output} in {time.time() - start:.1f}s "
+          f"({os.path.getsize(output) / 2**20:.1f} MB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic student roster.')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-rows', type=int, default=500000)
+    args = parser.parse_args(argv)
+    if args.rows <= 0:
+        parser.error('--rows must be positive')
+    generate(args.output, args.rows, seed=args.seed, chunk_rows=args.chunk_rows)
+
+
+if __name__ == '__main__':
+    main()
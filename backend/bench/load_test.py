@@ -0,0 +1,280 @@
+"""End-to-end load test for a running backend.
+
+    python app.py &                                   # or gunicorn, docker compose ...
+    python bench/load_test.py --url http://127.0.0.1:5000 --concurrency 16 --requests 2000
+    python bench/load_test.py --save-baseline bench/baselines/local.json
+    python bench/load_test.py --compare bench/baselines/local.json --fail-on-regression
+    python bench/load_test.py --allow-mutation        # also upload and train; only against a scratch deployment
+
+Each scenario (login, students, predict, upload, train) is driven by a pool of
+client threads against the live HTTP server. The report gives throughput and
+p50/p95/p99 latency per scenario. Results can be saved as a JSON baseline
+and later runs compared against it.
+
+login, students and predict only read. upload and train change the server's
+data and need ``--allow-mutation``: uploads upsert synthetic features over
+the first ``--upload-rows`` existing student ids, which are rescored and
+saved, so the roster, /api/analytics and later trainings see the synthetic
+rows (the roster size stays the same). Train runs real full refits, one at
+a time, and each one replaces the serving model.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib import error, request
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from generate_data import CATEGORICAL_LEVELS, NUMERIC_RANGES, generate_chunk  # noqa: E402
+
+SCENARIOS = ['login', 'students', 'predict', 'upload', 'train']
+# scenarios that overwrite roster rows or the serving model
+MUTATING = ['upload', 'train']
+TEACHER = {'role': 'teacher', 'email': 'teacher@example.com', 'password': 'teacher123'}
+# relative change of p95 latency / throughput reported as a regression
+DEFAULT_TOLERANCE = 0.10
+
+
+class Client:
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.token = None
+
+    def call(self, method, path, body=None, headers=None):
+        """Return ``(status, parsed JSON or None)``; HTTP errors are returned, not raised."""
+        headers = dict(headers or {})
+        if self.token:
+            headers['Authorization'] = 'Bearer ' + self.token
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        req = request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with request.urlopen(req, timeout=self.timeout) as resp:
+                status, data = resp.status, resp.read()
+        except error.HTTPError as e:
+            status, data = e.code, e.read()
+        try:
+            return status, json.loads(data)
+        except ValueError:
+            return status, None
+
+    def login(self):
+        status, data = self.call('POST', '/api/login', TEACHER)
+        if status != 200 or not data or not data.get('ok'):
+            raise RuntimeError(f'Teacher login failed ({status}): {data}')
+        self.token = data['token']
+
+
+def _multipart(fields, filename, content):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                 f'Content-Type: text/csv\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+
+def random_payload(rng):
+    payload = {col: rng.randint(low, high) for col, (low, high) in NUMERIC_RANGES.items()}
+    for col, levels in CATEGORICAL_LEVELS.items():
+        payload[col] = rng.choices(list(levels), weights=list(levels.values()))[0]
+    return payload
+
+
+class Workload:
+    """Builds one request per call for each scenario, sharing state set up once."""
+
+    def __init__(self, client, upload_rows=100, student_ids=None):
+        self.client = client
+        self.student_ids = student_ids or []
+        self.upload_rows = upload_rows
+        self._upload_body = None
+
+    def setup(self):
+        status, data = self.client.call('GET', '/api/students?limit=1000&fields=student_id')
+        if status == 200 and data:
+            self.student_ids = [str(item['student_id']) for item in data.get('items', [])]
+        if not self.student_ids:
+            raise RuntimeError('The server has no roster; generate one with bench/generate_data.py and upload it')
+        # an upsert of existing ids with synthetic features leaves the roster size unchanged
+        chunk = generate_chunk(np.random.default_rng(0), 0, min(self.upload_rows, len(self.student_ids)))
+        chunk['student_id'] = self.student_ids[:len(chunk)]
+        chunk = chunk.drop(columns=['Student_Name', 'result'])
+        self._upload_body = chunk.to_csv(index=False).encode()
+
+    def login(self, rng):
+        if rng.random() < 0.5:
+            return self.client.call('POST', '/api/login', TEACHER)[0]
+        sid = rng.choice(self.student_ids)
+        return self.client.call('POST', '/api/login', {'role': 'student', 'id': sid, 'password': 'student123'})[0]
+
+    def students(self, rng):
+        if rng.random() < 0.5:
+            return self.client.call('GET', f'/api/students?limit=100&offset={rng.randint(0, 900)}')[0]
+        return self.client.call('GET', f'/api/students?student_id={rng.choice(self.student_ids)}')[0]
+
+    def predict(self, rng):
+        return self.client.call('POST', '/api/predict', random_payload(rng))[0]
+
+    def upload(self, rng):
+        body, headers = _multipart({'mode': 'upsert'}, 'bench.csv', self._upload_body)
+        return self.client.call('POST', '/api/upload', body, headers)[0]
+
+    def train(self, rng):
+        status, data = self.client.call('POST', '/api/train', {'mode': 'full'})
+        if status != 202:
+            return status
+        while True:
+            time.sleep(0.2)
+            status, job = self.client.call('GET', f"/api/train/{data['job_id']}")
+            if status != 200:
+                return status
+            if job['job']['status'] in ('succeeded', 'failed'):
+                return 200 if job['job']['status'] == 'succeeded' else 500
+
+
+def run_scenario(workload, name, requests, concurrency, seed=0):
+    """Fire ``requests`` calls of one scenario from ``concurrency`` threads."""
+    action = getattr(workload, name)
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker(index):
+        nonlocal errors
+        rng = random.Random(seed + index)
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                ok = 200 <= action(rng) < 300
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors += not ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'concurrency': concurrency,
+        'seconds': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(ms, 95)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+        'mean_ms': round(float(ms.mean()), 2),
+    }
+
+
+def print_report(results):
+    print(f"{'scenario':<10} {'reqs':>7} {'errors':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['requests']:>7} {r['errors']:>6} {r['throughput_rps']:>9.1f} "
+              f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Print changes against ``baseline``; returns the list of regressed scenarios."""
+    regressed = []
+    print(f"\nAgainst baseline ({baseline.get('created')}, tolerance {tolerance:.0%}):")
+    for name, r in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f"{name:<10} (no baseline)")
+            continue
+        p95 = r['p95_ms'] / base['p95_ms'] - 1 if base['p95_ms'] else 0.0
+        rps = r['throughput_rps'] / base['throughput_rps'] - 1 if base['throughput_rps'] else 0.0
+        worse = p95 > tolerance or rps < -tolerance or r['errors'] > base['errors']
+        if worse:
+            regressed.append(name)
+        print(f"{name:<10} p95 {base['p95_ms']:.2f} -> {r['p95_ms']:.2f} ms ({p95:+.1%}), "
+              f"rps {base['throughput_rps']:.1f} -> {r['throughput_rps']:.1f} ({rps:+.1%})"
+              + ('  REGRESSION' if worse else ''))
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the backend API.')
+    parser.add_argument('--url', default=os.environ.get('BENCH_URL', 'http://127.0.0.1:5000'))
+    parser.add_argument('--scenarios', help='comma separated (default: all that --allow-mutation permits)')
+    parser.add_argument('--allow-mutation', action='store_true',
+                        help='allow upload (overwrites roster rows) and train (replaces the serving model)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--train-runs', type=int, default=2, help='training jobs (always sequential)')
+    parser.add_argument('--upload-rows', type=int, default=100)
+    parser.add_argument('--output', help='write this run as JSON')
+    parser.add_argument('--save-baseline', help='write this run as a baseline JSON file')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.scenarios:
+        scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    else:
+        scenarios = [s for s in SCENARIOS if args.allow_mutation or s not in MUTATING]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f'unknown scenarios: {unknown} (choose from {SCENARIOS})')
+    mutating = [s for s in scenarios if s in MUTATING]
+    if mutating and not args.allow_mutation:
+        parser.error(f'scenario(s) {", ".join(mutating)} modify the server\'s roster or model; '
+                     f'pass --allow-mutation (against a scratch deployment) to run them')
+
+    client = Client(args.url)
+    client.login()
+    workload = Workload(client, upload_rows=args.upload_rows)
+    workload.setup()
+
+    results = {}
+    for name in scenarios:
+        if name == 'train':
+            requests, concurrency = args.train_runs, 1
+        else:
+            requests, concurrency = args.requests, args.concurrency
+        print(f"Running {name}: {requests} requests at concurrency {concurrency}...", flush=True)
+        results[name] = run_scenario(workload, name, requests, concurrency)
+
+    print()
+    print_report(results)
+    if 'upload' in mutating:
+        print(f"\nWARNING: upload overwrote {len(workload.student_ids[:args.upload_rows])} roster rows on {args.url} "
+              f"with synthetic features; restore the roster before relying on it")
+    if 'train' in mutating:
+        print(f"WARNING: train replaced the serving model on {args.url} {results['train']['requests']} time(s)")
+    run = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'url': args.url, 'mutated': mutating, 'results': results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(run, f, indent=2, sort_keys=True)
+            print(f"Results written to {path}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f), args.tolerance)
+        if regressed and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+from locks import FileLock
+
+# the pre-catalog roster file is the shard named 'default'
+DEFAULT_SHARD = 'default'
+DEFAULT_FILE = 'students.csv'
+CATALOG_DIR = 'catalog'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_LOCK = '.manifest.lock'
+# per shard: sorted 64-bit hashes of its student ids, the catalog's id -> shard index
+ID_INDEX_SUFFIX = '.ids.npy'
+_SHARD_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$')
+
+
+class CatalogError(ValueError):
+    """Invalid shard names or shard selections."""
+
+
+def validate_shard_name(name):
+    if not name or not _SHARD_RE.match(name) or name.endswith('.'):
+        raise CatalogError(f"Invalid shard name '{name}': use letters, digits, '.', '_' or '-' (at most 64)")
+    return name
+
+
+def _id_key(value):
+    key = str(value).strip()
+    try:
+        number = float(key)
+    except ValueError:
+        return key
+    return key if number != number else repr(number)
+
+
+def id_hashes(ids):
+    """64-bit hashes of student ids for the id index.
+
+    Numbers hash by value ('007', '7' and '7.0' alike), since a CSV round
+    trip may rewrite them; anything else hashes as the stripped string. A
+    matching hash only makes a shard a candidate, its own index decides.
+    """
+    return np.fromiter((int.from_bytes(hashlib.blake2b(_id_key(value).encode(), digest_size=8).digest(), 'little')
+                        for value in ids), dtype=np.uint64, count=len(ids))
+
+
+def _contains_any(index, hashes):
+    if not len(index) or not len(hashes):
+        return False
+    positions = np.minimum(np.searchsorted(index, hashes), len(index) - 1)
+    return bool((index[positions] == hashes).any())
+
+
+class ShardStats:
+    """Manifest entry of a shard, accumulated over the frames or chunks written to it."""
+
+    def __init__(self):
+        self.rows = 0
+        self.pass_count = 0
+        self.schema = None
+        self.id_min = self.id_max = None
+        self.numeric_ids = True
+        self._id_hashes = []
+
+    def add(self, df):
+        if self.schema is None:
+            self.schema = {col: str(dtype) for col, dtype in df.dtypes.items()}
+        self.rows += len(df)
+        if 'result' in df.columns:
+            self.pass_count += int((df['result'].astype(str) == 'Pass').sum())
+        if 'student_id' in df.columns and len(df):
+            self._id_hashes.append(id_hashes(df['student_id']))
+        if 'student_id' in df.columns and len(df) and self.numeric_ids:
+            ids = pd.to_numeric(df['student_id'], errors='coerce')
+            if ids.isna().any():
+                # the range is informational; routing goes through the id index
+                self.numeric_ids = False
+                self.id_min = self.id_max = None
+            else:
+                lo, hi = ids.min().item(), ids.max().item()
+                self.id_min = lo if self.id_min is None else min(self.id_min, lo)
+                self.id_max = hi if self.id_max is None else max(self.id_max, hi)
+
+    def id_index(self):
+        """Sorted unique id hashes of every row added."""
+        if not self._id_hashes:
+            return np.empty(0, dtype=np.uint64)
+        return np.unique(np.concatenate(self._id_hashes))
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'pass_count': self.pass_count,
+            'fail_count': self.rows - self.pass_count,
+            'schema': self.schema or {},
+            'id_min': self.id_min,
+            'id_max': self.id_max,
+            'updated_at': time.time(),
+        }
+
+
+class DatasetCatalog:
+    """Shards of the student dataset, one file per class or term, plus a manifest.
+
+    Shards live in ``data/catalog/<name>.csv`` (with their columnar copy);
+    ``data/students.csv`` is the ``default`` shard, so a deployment that never
+    names a shard keeps its single roster. The manifest records each shard's
+    row count, schema, pass/fail counts and ``student_id`` range. Next to
+    every shard, ``<name>.ids.npy`` holds the sorted hashes of its ids, so
+    an id lookup opens only the shards that hold the id, whatever the ids
+    look like. Writers update one shard, its index and its manifest entry;
+    the other shards are not read or rewritten.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.directory = os.path.join(data_dir, CATALOG_DIR)
+        # manifest updates are read-modify-write; gunicorn workers share the file
+        self._lock = FileLock(os.path.join(self.directory, MANIFEST_LOCK))
+        self._manifest = None
+        self._manifest_signature = None
+        self._id_indexes = {}
+
+    def shard_path(self, name):
+        if name == DEFAULT_SHARD:
+            return os.path.join(self.data_dir, DEFAULT_FILE)
+        return os.path.join(self.directory, validate_shard_name(name) + '.csv')
+
+    def id_index_path(self, name):
+        return os.path.join(self.directory, validate_shard_name(name) + ID_INDEX_SUFFIX)
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def manifest(self):
+        """``{name: entry}`` of recorded shards; re-read only when the file changes."""
+        path = self._manifest_path()
+        try:
+            st = os.stat(path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return {}
+        if signature != self._manifest_signature:
+            try:
+                with open(path) as f:
+                    manifest = json.load(f).get('shards', {})
+            except (OSError, ValueError):
+                manifest = {}
+            self._manifest, self._manifest_signature = manifest, signature
+        return self._manifest
+
+    def shards(self):
+        """Names of shards whose file exists; ``default`` first, then by name."""
+        names = sorted(name for name in self.manifest()
+                       if name != DEFAULT_SHARD and os.path.exists(self.shard_path(name)))
+        if os.path.exists(self.shard_path(DEFAULT_SHARD)):
+            names.insert(0, DEFAULT_SHARD)
+        return names
+
+    def select(self, names=None):
+        """``[(name, path)]`` for ``names`` (default: every shard); unknown names raise CatalogError."""
+        available = self.shards()
+        if names is None:
+            names = available
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise CatalogError(f"Unknown shard(s): {', '.join(unknown)}. Available: {', '.join(available) or 'none'}")
+        return [(name, self.shard_path(name)) for name in names]
+
+    def route(self, student_id, names):
+        """The shards among ``names`` that may hold ``student_id``."""
+        return self.locate(names, [student_id])
+
+    def locate(self, names, ids):
+        """The shards among ``names`` that may hold any of ``ids``.
+
+        A shard with a current id index is a candidate only when one of the
+        ids is in it. Shards without one (recorded before the index existed,
+        or whose file changed outside the catalog) are always candidates.
+        """
+        hashes = id_hashes(ids)
+        manifest = self.manifest()
+        out = []
+        for name in names:
+            entry = manifest.get(name)
+            index = self._id_index(entry) if entry and self._entry_current(name, entry) else None
+            if index is None or _contains_any(index, hashes):
+                out.append(name)
+        return out
+
+    def _id_index(self, entry):
+        """The memory-mapped id index of a manifest entry, re-read only when the file changes."""
+        if not entry.get('id_index'):
+            return None
+        path = os.path.join(self.data_dir, entry['id_index'])
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        signature = (st.st_mtime_ns, st.st_size)
+        cached = self._id_indexes.get(path)
+        if cached is None or cached[0] != signature:
+            try:
+                cached = (signature, np.load(path, mmap_mode='r') if st.st_size else None)
+            except (OSError, ValueError):
+                cached = (signature, None)
+            self._id_indexes[path] = cached
+        return cached[1]
+
+    def _entry_current(self, name, entry):
+        try:
+            st = os.stat(self.shard_path(name))
+        except OSError:
+            return False
+        return [st.st_mtime_ns, st.st_size] == entry.get('file_signature')
+
+    def record(self, name, stats):
+        """Store the manifest entry of shard ``name`` (a ShardStats) after it was written."""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            path = self._manifest_path()
+            try:
+                with open(path) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {'shards': {}}
+            # written before the entry that points to it
+            index_path = self.id_index_path(name)
+            with open(index_path + '.tmp', 'wb') as f:
+                np.save(f, stats.id_index())
+            os.replace(index_path + '.tmp', index_path)
+            st = os.stat(self.shard_path(name))
+            # hand-edited or older manifests may lack the 'shards' key
+            manifest.setdefault('shards', {})[name] = {
+                'file': os.path.relpath(self.shard_path(name), self.data_dir),
+                'file_signature': [st.st_mtime_ns, st.st_size],
+                'id_index': os.path.relpath(index_path, self.data_dir), **stats.to_dict()}
+            with open(path + '.tmp', 'w') as f:
+                json.dump(manifest, f, indent=1, default=lambda v: v.item() if isinstance(v, np.generic) else str(v))
+            os.replace(path + '.tmp', path)
@@ -0,0 +1,227 @@
+"""Export the trained pipeline as a compact forest for compact_runtime.py.
+
+    python compact_model.py                          # model/model.pkl -> model/model.compact.npz
+    python compact_model.py --max-depth 12 --min-node-samples 20 --values float16
+
+Every tree is flattened into node arrays (split feature, threshold, child
+id, class probabilities) concatenated over the forest, together with
+the ColumnTransformer's scaler means/scales and one-hot tables. Thresholds
+are stored as float32 rounded down, which decides every split exactly like
+the original float64 threshold on sklearn's float32 inputs. Trees can be cut
+at a depth or where a node saw too few training samples; the cut node
+becomes a leaf with its own class distribution. Each export writes a parity
+report comparing it with the pipeline on rows from the training data.
+"""
+import argparse
+import json
+import os
+import time
+import joblib
+import numpy as np
+from compact_runtime import COMPACT_FORMAT, CompactModel
+from fast_encoder import compile_encoder
+from features import FEATURES, CATEGORICAL_DEFAULTS, outcome_from_proba
+
+BASE = os.path.dirname(__file__)
+MODEL_PATH = os.path.join(BASE, 'model', 'model.pkl')
+COMPACT_PATH = os.path.join(BASE, 'model', 'model.compact.npz')
+# training rows scored by both models for the parity report
+PARITY_ROWS = int(os.environ.get('COMPACT_PARITY_ROWS', 20000))
+
+VALUE_DTYPES = {'float64': np.float64, 'float32': np.float32, 'float16': np.float16}
+
+
+class ExportError(Exception):
+    """Raised when a pipeline cannot be represented as a compact forest."""
+
+
+def _float32_floor(threshold):
+    # largest float32 <= threshold: for float32 x, x <= t and x <= t32 agree exactly
+    t32 = threshold.astype(np.float32)
+    over = t32.astype(np.float64) > threshold
+    t32[over] = np.nextafter(t32[over], np.float32(-np.inf))
+    return t32
+
+
+def _flatten_tree(tree, max_depth=None, min_node_samples=0):
+    """Reachable nodes of one tree after pruning, breadth-first with siblings adjacent."""
+    left, right = tree.children_left, tree.children_right
+    is_leaf = left < 0
+    order, frontier, depth = [], np.array([0]), 0
+    while frontier.size:
+        cut = is_leaf[frontier] | (tree.n_node_samples[frontier] < min_node_samples)
+        if max_depth is not None and depth >= max_depth:
+            cut[:] = True
+        is_leaf[frontier] = cut
+        order.append(frontier)
+        internal = frontier[~cut]
+        frontier = np.stack([left[internal], right[internal]], axis=1).ravel()
+        depth += 1
+    nodes = np.concatenate(order)
+    new_id = np.full(tree.node_count, -1, dtype=np.int64)
+    new_id[nodes] = np.arange(len(nodes))
+    leaf = is_leaf[nodes]
+    value = tree.value[nodes, 0, :]
+    return {
+        'feature': np.where(leaf, 0, tree.feature[nodes]),
+        'threshold': np.where(leaf, np.inf, tree.threshold[nodes]),
+        # leaves loop back to themselves; the right child is always children + 1
+        'children': np.where(leaf, np.arange(len(nodes)), new_id[np.where(leaf, 0, left[nodes])]),
+        'value': value / value.sum(axis=1, keepdims=True),
+        'depth': len(order) - 1,
+    }
+
+
+def export_arrays(pipeline, max_depth=None, min_node_samples=0, value_dtype='float32'):
+    """Flatten ``pipeline`` into ``(arrays, meta)``; raises ExportError for unsupported layouts."""
+    encoder = compile_encoder(pipeline)
+    if encoder is None:
+        raise ExportError('only a scaler + one-hot ColumnTransformer followed by a random forest can be exported')
+    forest = pipeline.named_steps['clf']
+    trees = [_flatten_tree(est.tree_, max_depth, min_node_samples) for est in forest.estimators_]
+    sizes = np.array([len(t['children']) for t in trees])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    n_nodes = int(sizes.sum())
+    index_dtype = np.int32 if n_nodes < 2**31 else np.int64
+
+    arrays = {
+        'feature': np.concatenate([t['feature'] for t in trees]).astype(np.int16 if encoder.width < 2**15 else np.int32),
+        'threshold': _float32_floor(np.concatenate([t['threshold'] for t in trees])),
+        'children': np.concatenate([t['children'] + off for t, off in zip(trees, offsets)]).astype(index_dtype),
+        'value': np.concatenate([t['value'] for t in trees]).astype(VALUE_DTYPES[value_dtype]),
+        'roots': offsets.astype(index_dtype),
+    }
+    categorical = []
+    for field, table in encoder.categorical:
+        if not all(isinstance(value, (str, int, float, bool)) for value in table):
+            raise ExportError(f'categories of {field} are not JSON scalars')
+        categorical.append([field, [[value, idx] for value, idx in table.items()]])
+    meta = {
+        'format': COMPACT_FORMAT,
+        'classes': np.asarray(forest.classes_).tolist(),
+        'features': FEATURES,
+        'categorical_defaults': CATEGORICAL_DEFAULTS,
+        'width': encoder.width,
+        'numeric': [list(entry) for entry in encoder.numeric],
+        'categorical': categorical,
+        'n_trees': len(trees),
+        'max_depth': max_depth,
+        'min_node_samples': min_node_samples,
+        'value_dtype': value_dtype,
+        'original_nodes': int(sum(est.tree_.node_count for est in forest.estimators_)),
+        'depth': int(max(t['depth'] for t in trees)),
+        'exported_at': time.time(),
+    }
+    return arrays, meta
+
+
+def save_compact(arrays, meta, path=COMPACT_PATH):
+    # temp file + rename, like the pickle, so a watcher never loads a partial file
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+
+
+def parity_report(pipeline, compact, X, y=None):
+    """Compare the compact model with ``pipeline`` on prepared features ``X``."""
+    start = time.perf_counter()
+    expected = np.asarray(pipeline.predict_proba(X))
+    pipeline_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    got = compact.predict_proba(X)
+    compact_seconds = time.perf_counter() - start
+    passed_expected, prob_expected = outcome_from_proba(pipeline, expected)
+    passed_got, prob_got = outcome_from_proba(compact, got)
+    diff = np.abs(prob_got - prob_expected)
+    report = {
+        'rows': len(X),
+        'label_agreement': round(float((passed_got == passed_expected).mean()), 6),
+        'labels_changed': int((passed_got != passed_expected).sum()),
+        'max_abs_probability_diff': float(diff.max()) if len(diff) else 0.0,
+        'mean_abs_probability_diff': float(diff.mean()) if len(diff) else 0.0,
+        'pipeline_predict_seconds': round(pipeline_seconds, 4),
+        'compact_predict_seconds': round(compact_seconds, 4),
+    }
+    if y is not None:
+        y = np.asarray(y) == 1
+        report['pipeline_accuracy'] = round(float((passed_expected == y).mean()), 6)
+        report['compact_accuracy'] = round(float((passed_got == y).mean()), 6)
+    return report
+
+
+def export_model(pipeline, X=None, y=None, path=COMPACT_PATH, model_path=None, **options):
+    """Export ``pipeline`` to ``path`` and write ``<path>.report.json``; returns the report."""
+    start = time.perf_counter()
+    arrays, meta = export_arrays(pipeline, **options)
+    save_compact(arrays, meta, path)
+    export_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compact = CompactModel.load(path)
+    report = {
+        'path': path,
+        'export_seconds': round(export_seconds, 3),
+        'compact_load_seconds': round(time.perf_counter() - start, 4),
+        'compact_file_bytes': os.path.getsize(path),
+        'compact_array_bytes': compact.nbytes,
+        'nodes': compact.n_nodes,
+        **{k: meta[k] for k in ('n_trees', 'original_nodes', 'depth', 'max_depth',
+                                'min_node_samples', 'value_dtype')},
+    }
+    if model_path and os.path.exists(model_path):
+        start = time.perf_counter()
+        joblib.load(model_path)
+        report['pickle_load_seconds'] = round(time.perf_counter() - start, 4)
+        report['pickle_file_bytes'] = os.path.getsize(model_path)
+    if X is not None:
+        report['parity'] = parity_report(pipeline, compact, X, y)
+    with open(path + '.report.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def parity_sample(X, y, rows=PARITY_ROWS):
+    # fixed seed so successive exports are compared on the same rows
+    if len(X) > rows:
+        keep = np.random.default_rng(0).choice(len(X), rows, replace=False)
+        X, y = X.iloc[keep], y.iloc[keep]
+    return X, y
+
+
+def load_parity_sample(data_file, rows=PARITY_ROWS):
+    # imported here: train_model imports this module
+    from train_model import load_training_frame, prepare_training_data
+    _, X, y = prepare_training_data(load_training_frame(data_file))
+    return parity_sample(X, y, rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the trained pipeline as a compact flat-array forest.')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--output', default=COMPACT_PATH)
+    parser.add_argument('--max-depth', type=int, default=None, help='cut every tree at this depth')
+    parser.add_argument('--min-node-samples', type=int, default=0,
+                        help='turn nodes that saw fewer training samples into leaves')
+    parser.add_argument('--values', choices=sorted(VALUE_DTYPES), default='float32',
+                        help='precision of the stored class probabilities')
+    parser.add_argument('--data', help='data file for the parity report (default: the one train_model.py would use)')
+    parser.add_argument('--parity-rows', type=int, default=PARITY_ROWS)
+    args = parser.parse_args(argv)
+
+    pipeline = joblib.load(args.model)
+    X = y = None
+    if args.parity_rows > 0:
+        from train_model import find_data_file
+        data_file = args.data or find_data_file()
+        if data_file:
+            X, y = load_parity_sample(data_file, args.parity_rows)
+    try:
+        report = export_model(pipeline, X, y, path=args.output, model_path=args.model, max_depth=args.max_depth,
+                              min_node_samples=args.min_node_samples, value_dtype=args.values)
+    except ExportError as e:
+        raise SystemExit(f'Cannot export {args.model}: {e}')
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Scoring over an exported compact forest (see compact_model.py).
+
+Only NumPy is imported here: a process that serves a ``model.compact.npz``
+never loads scikit-learn or unpickles a pipeline.
+"""
+import json
+import math
+import struct
+import zipfile
+import numpy as np
+
+COMPACT_FORMAT = 1
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+class CompactModel:
+    """A random forest and its input encoding as flat arrays.
+
+    Nodes of all trees are stored back to back, each tree breadth-first with
+    the two children of a split next to each other: ``children`` is the id
+    of the left child (the right one follows it), ``feature``/``threshold``
+    the split and ``value`` the node's class probabilities. Leaves point to
+    themselves with an infinite threshold, so every (row, tree) pair can take
+    the same ``depth`` steps without branching. ``roots`` holds the first
+    node of every tree. Rows are encoded exactly like the pipeline's
+    ColumnTransformer (scaled numerics, one-hot categoricals) and cast to
+    float32 like sklearn's trees do.
+    """
+
+    # drop pairs that reached a leaf every few steps; compacting on every step costs more than it saves
+    COMPACT_EVERY = 4
+    # bytes of the arrays memory-mapped from the file rather than held in private memory
+    mapped_bytes = 0
+
+    def __init__(self, arrays, meta):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.children = arrays['children']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.meta = meta
+        self.depth = meta['depth']
+        self.classes_ = np.asarray(meta['classes'])
+        self.features = meta['features']
+        self.width = meta['width']
+        self.defaults = meta['categorical_defaults']
+        self.numeric = [(f, i, mean, scale) for f, i, mean, scale in meta['numeric']]
+        self.categorical = [(f, {value: i for value, i in pairs}) for f, pairs in meta['categorical']]
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Load an export; with ``mmap_mode='r'`` the node arrays are mapped from the file.
+
+        np.savez stores every array uncompressed, so each one can be mapped
+        in place. Mapped pages come from the page cache and are shared by
+        every process that maps the same file, instead of each worker
+        holding its own copy of the forest.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            names = [name for name in data.files if name != 'meta']
+            meta = json.loads(str(data['meta']))
+            mapped = _map_members(path, names, mmap_mode) if mmap_mode else {}
+            arrays = {name: mapped[name] if name in mapped else data[name] for name in names}
+        if meta.get('format') != COMPACT_FORMAT:
+            raise ValueError(f"Unsupported compact model format {meta.get('format')!r} in {path}")
+        model = cls(arrays, meta)
+        model.mapped_bytes = sum(arrays[name].nbytes for name in mapped)
+        return model
+
+    @property
+    def n_nodes(self):
+        return len(self.children)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.children, self.value, self.roots))
+
+    def encode(self, X):
+        """Encode prepared features (a DataFrame or any mapping of column -> values)."""
+        n = len(X[self.features[0]])
+        out = np.zeros((n, self.width), dtype=np.float64)
+        for field, idx, mean, scale in self.numeric:
+            col = np.asarray(X[field], dtype=np.float64)
+            col = np.where(np.isnan(col), 0.0, col)
+            if mean is not None:
+                col = col - mean
+            if scale is not None:
+                col = col / scale
+            out[:, idx] = col
+        rows = np.arange(n)
+        for field, table in self.categorical:
+            # unknown levels stay all zeros (handle_unknown='ignore')
+            idx = np.fromiter((table.get(v, -1) for v in np.asarray(X[field], dtype=object)), np.intp, n)
+            known = idx >= 0
+            out[rows[known], idx[known]] = 1.0
+        return out
+
+    def encode_record(self, payload):
+        """Encode one raw JSON payload the way prepare_features() would; None when it needs the pandas path."""
+        row = np.zeros((1, self.width), dtype=np.float64)
+        for field, idx, mean, scale in self.numeric:
+            value = payload.get(field)
+            # strings need pandas' to_numeric rules; the caller falls back to the prepared-frame path
+            if not isinstance(value, _SCALARS) or isinstance(value, str):
+                return None
+            x = 0.0 if value is None else float(value)
+            if math.isnan(x):
+                x = 0.0
+            if mean is not None:
+                x -= mean
+            if scale is not None:
+                x /= scale
+            row[0, idx] = x
+        for field, table in self.categorical:
+            value = payload.get(field)
+            if not isinstance(value, _SCALARS):
+                return None
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                value = self.defaults.get(field, 'Unknown')
+            idx = table.get(value)
+            if idx is not None:
+                row[0, idx] = 1.0
+        return row
+
+    def leaves(self, encoded):
+        """Leaf node of every (tree, row) pair, shape (n_trees, n_rows)."""
+        X32 = np.ascontiguousarray(encoded, dtype=np.float32)
+        n, width = X32.shape
+        flat = X32.ravel()
+        offsets = np.tile(np.arange(n) * width, len(self.roots))
+        nodes = np.repeat(self.roots, n)
+        active = np.arange(len(nodes))
+        for step in range(self.depth):
+            current = nodes[active]
+            # x > threshold goes right (children + 1); never true at a leaf
+            moved = self.children[current] + (flat[offsets[active] + self.feature[current]] > self.threshold[current])
+            nodes[active] = moved
+            if step % self.COMPACT_EVERY == self.COMPACT_EVERY - 1:
+                active = active[moved != current]
+                if not active.size:
+                    break
+        return nodes.reshape(len(self.roots), n)
+
+    def predict_proba_encoded(self, encoded):
+        leaves = self.leaves(encoded)
+        proba = np.zeros((leaves.shape[1], self.value.shape[1]), dtype=np.float64)
+        for tree_leaves in leaves:
+            proba += self.value[tree_leaves]
+        return proba / len(leaves)
+
+    def predict_proba(self, X):
+        """Class probabilities for prepared features, like ``pipeline.predict_proba``."""
+        return self.predict_proba_encoded(self.encode(X))
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def record_scorer(self):
+        """Single-payload scorer with the CompiledEncoder interface used by /api/predict."""
+        return _RecordScorer(self)
+
+
+def _map_members(path, names, mode):
+    """Memory-map the stored ``.npy`` members of an npz; members that cannot be mapped are left out."""
+    mapped = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for name in names:
+            info = archive.getinfo(name + '.npy')
+            if info.compress_type != zipfile.ZIP_STORED:
+                continue
+            # the member's data starts after its local header (30 bytes plus name and extra field)
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            else:
+                continue
+            if dtype.hasobject or not np.prod(shape, dtype=np.int64):
+                continue
+            array = np.memmap(path, dtype=dtype, mode=mode, offset=f.tell(), shape=shape,
+                              order='F' if fortran_order else 'C')
+            # a plain ndarray view keeps the mapping alive without memmap's per-operation overhead
+            mapped[name] = array.view(np.ndarray)
+    return mapped
+
+
+class _RecordScorer:
+    def __init__(self, model):
+        self.model = model
+
+    def predict_proba(self, payload):
+        row = self.model.encode_record(payload)
+        return None if row is None else self.model.predict_proba_encoded(row)
@@ -0,0 +1,384 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+from features import FEATURES, NUMERIC_FIELDS, prepare_features
+from locks import FileLock
+
+BASE = os.path.dirname(__file__)
+# written by train_model.py next to the model it describes
+DRIFT_REFERENCE_PATH = os.path.join(BASE, 'model', 'model.drift.json')
+# quantile bins per numeric feature and most frequent levels kept per categorical one
+DRIFT_BINS = int(os.environ.get('DRIFT_BINS', 10))
+DRIFT_MAX_LEVELS = int(os.environ.get('DRIFT_MAX_LEVELS', 50))
+# rolling window: DRIFT_WINDOW_BLOCKS blocks of DRIFT_BLOCK_ROWS rows per source
+DRIFT_BLOCK_ROWS = int(os.environ.get('DRIFT_BLOCK_ROWS', 1000))
+DRIFT_WINDOW_BLOCKS = int(os.environ.get('DRIFT_WINDOW_BLOCKS', 20))
+# PSI above which a feature counts as drifted, and the rows a window needs before it is judged
+DRIFT_PSI_ALERT = float(os.environ.get('DRIFT_PSI_ALERT', 0.25))
+DRIFT_MIN_ROWS = int(os.environ.get('DRIFT_MIN_ROWS', 500))
+# the windows every gunicorn worker adds to; predictions are buffered per worker and
+# written at most every DRIFT_FLUSH_SECONDS, uploads right away
+DRIFT_WINDOWS_PATH = os.environ.get('DRIFT_WINDOWS_PATH', os.path.join(BASE, 'model', 'drift.windows.npz'))
+DRIFT_FLUSH_SECONDS = float(os.environ.get('DRIFT_FLUSH_SECONDS', 2))
+
+SOURCES = ('upload', 'predict')
+# usual PSI reading: below 0.1 stable, up to 0.25 moderate shift, above that significant
+PSI_STABLE = 0.1
+
+logger = logging.getLogger(__name__)
+
+
+def build_reference(X):
+    """Reference sketches of prepared training features ``X``.
+
+    Numeric features get quantile bin edges with the training count per bin,
+    categoricals the counts of their most frequent levels plus one bucket for
+    everything else. The result is plain JSON, a few KB for the 13 features.
+    """
+    features = {}
+    for field in FEATURES:
+        if field in NUMERIC_FIELDS:
+            values = pd.to_numeric(X[field], errors='coerce').fillna(0).to_numpy(np.float64)
+            edges = np.unique(np.quantile(values, np.linspace(0, 1, DRIFT_BINS + 1)[1:-1])) if len(values) else []
+            sketch = {'type': 'numeric', 'edges': [float(e) for e in edges]}
+        else:
+            levels = X[field].astype(str).value_counts().index[:DRIFT_MAX_LEVELS]
+            sketch = {'type': 'categorical', 'levels': [str(level) for level in levels]}
+        features[field] = sketch
+    reference = {'rows': len(X), 'created_at': time.time(), 'features': features}
+    binner = Binner(reference)
+    counts = binner.counts(X)
+    for field, (start, stop) in binner.slices.items():
+        features[field]['counts'] = counts[start:stop].tolist()
+    return reference
+
+
+def save_reference(reference, path=DRIFT_REFERENCE_PATH):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(reference, f)
+    os.replace(tmp_path, path)
+
+
+class Binner:
+    """Maps feature values onto the reference bins, all features in one flat count vector."""
+
+    def __init__(self, reference):
+        self.fields = []
+        self.slices = {}
+        width = 0
+        for field in FEATURES:
+            sketch = reference['features'][field]
+            if sketch['type'] == 'numeric':
+                edges = np.asarray(sketch['edges'], dtype=np.float64)
+                size = len(edges) + 1
+                self.fields.append((field, width, edges, None))
+            else:
+                table = {level: i for i, level in enumerate(sketch['levels'])}
+                size = len(table) + 1  # last bucket: levels not seen in training
+                self.fields.append((field, width, None, table))
+            self.slices[field] = (width, width + size)
+            width += size
+        self.width = width
+
+    def bins(self, X):
+        """Flat bin index of every (row, feature), shape (n_rows, 13)."""
+        out = np.empty((len(X), len(self.fields)), dtype=np.intp)
+        for j, (field, offset, edges, table) in enumerate(self.fields):
+            if edges is not None:
+                values = pd.to_numeric(X[field], errors='coerce').fillna(0).to_numpy(np.float64)
+                out[:, j] = offset + np.searchsorted(edges, values, side='right')
+            else:
+                out[:, j] = offset + X[field].astype(str).map(table).fillna(len(table)).to_numpy(np.intp)
+        return out
+
+    def key_bins(self, key):
+        """Bins of one normalized payload (features.normalize_payload order)."""
+        out = np.empty((1, len(self.fields)), dtype=np.intp)
+        for j, ((field, offset, edges, table), value) in enumerate(zip(self.fields, key)):
+            if edges is not None:
+                out[0, j] = offset + int(np.searchsorted(edges, value, side='right'))
+            else:
+                out[0, j] = offset + table.get(str(value), len(table))
+        return out
+
+    def counts(self, X):
+        return np.bincount(self.bins(X).ravel(), minlength=self.width)
+
+
+class RollingSketch:
+    """Bin counts over the most recent rows, in fixed-size blocks.
+
+    Memory is bounded by ``max_blocks`` count vectors; when the window is
+    full the oldest block is dropped whole, so the window covers between
+    ``(max_blocks - 1) * block_rows`` and ``max_blocks * block_rows`` rows.
+    """
+
+    def __init__(self, width, block_rows=DRIFT_BLOCK_ROWS, max_blocks=DRIFT_WINDOW_BLOCKS):
+        self.width = width
+        self.block_rows = block_rows
+        self.blocks = deque(maxlen=max_blocks)
+        self.total = np.zeros(width, dtype=np.int64)
+        self.rows = 0
+        self.observed = 0
+        self._new_block()
+
+    def _new_block(self):
+        if len(self.blocks) == self.blocks.maxlen:
+            counts, rows = self.blocks[0]
+            self.total -= counts
+            self.rows -= rows
+        self.blocks.append([np.zeros(self.width, dtype=np.int64), 0])
+
+    def add(self, bins):
+        start = 0
+        while start < len(bins):
+            block = self.blocks[-1]
+            take = min(self.block_rows - block[1], len(bins) - start)
+            counts = np.bincount(bins[start:start + take].ravel(), minlength=self.width)
+            block[0] += counts
+            block[1] += take
+            self.total += counts
+            self.rows += take
+            self.observed += take
+            start += take
+            if block[1] >= self.block_rows:
+                self._new_block()
+
+    def arrays(self):
+        counts = np.stack([counts for counts, _ in self.blocks])
+        rows = np.array([rows for _, rows in self.blocks], dtype=np.int64)
+        return counts, rows
+
+    @classmethod
+    def from_arrays(cls, width, counts, rows, observed):
+        sketch = cls(width)
+        sketch.blocks.clear()
+        for block_counts, block_rows in zip(counts[-sketch.blocks.maxlen:], rows[-sketch.blocks.maxlen:]):
+            sketch.blocks.append([block_counts.astype(np.int64), int(block_rows)])
+        if not sketch.blocks:
+            sketch._new_block()
+        sketch.total = sum((counts for counts, _ in sketch.blocks), np.zeros(width, dtype=np.int64))
+        sketch.rows = sum(rows for _, rows in sketch.blocks)
+        sketch.observed = int(observed)
+        return sketch
+
+
+class PendingRows:
+    """Bins observed by this process but not yet added to the shared windows.
+
+    Only the last ``capacity`` rows can still end up in a window, so older
+    ones are dropped and only counted towards ``observed_rows``.
+    """
+
+    def __init__(self, capacity=DRIFT_BLOCK_ROWS * DRIFT_WINDOW_BLOCKS):
+        self.capacity = capacity
+        self.parts = deque()
+        self.rows = 0
+        self.dropped = 0
+
+    def add(self, bins):
+        if len(bins) > self.capacity:
+            self.dropped += len(bins) - self.capacity
+            bins = bins[-self.capacity:]
+        if not len(bins):
+            return
+        self.parts.append(bins)
+        self.rows += len(bins)
+        while self.rows - len(self.parts[0]) >= self.capacity:
+            self.rows -= len(self.parts[0])
+            self.dropped += len(self.parts.popleft())
+
+    def extend(self, other):
+        self.dropped += other.dropped
+        for bins in other.parts:
+            self.add(bins)
+
+    def add_to(self, window):
+        window.observed += self.dropped
+        for bins in self.parts:
+            window.add(bins)
+
+
+def psi(expected, actual):
+    """Population stability index between two count vectors over the same bins."""
+    e = np.maximum(expected / max(expected.sum(), 1), 1e-4)
+    a = np.maximum(actual / max(actual.sum(), 1), 1e-4)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def binned_ks(expected, actual):
+    """KS statistic on binned counts (a lower bound of the exact two-sample KS)."""
+    e = np.cumsum(expected) / max(expected.sum(), 1)
+    a = np.cumsum(actual) / max(actual.sum(), 1)
+    return float(np.max(np.abs(a - e)))
+
+
+class StagedRows:
+    """Binned rows held back from the windows until ``DriftMonitor.commit``."""
+
+    def __init__(self, binner):
+        self.binner = binner
+        self.pending = PendingRows()
+
+    def observe(self, df, prepared=False):
+        if self.binner is not None and len(df):
+            self.pending.add(self.binner.bins(df if prepared else prepare_features(df)))
+
+
+class DriftMonitor:
+    """Rolling sketches of uploaded and predicted data, scored against the training reference.
+
+    ``load`` is called whenever a model is (re)loaded; a reference from a
+    different training resets the windows. ``observe`` takes raw frames (or
+    prepare_features() output with ``prepared=True``), ``observe_key`` one
+    normalized prediction payload. Scores are computed from the bin counts
+    when asked for, so the cost per request is only binning the new rows.
+
+    The windows live in ``windows_path`` so every gunicorn worker adds to and
+    reports the same ones. Like JobStore, the file is read and rewritten under
+    an flock; each worker buffers its rows and ``flush`` merges them in.
+    """
+
+    def __init__(self, path=DRIFT_REFERENCE_PATH, windows_path=DRIFT_WINDOWS_PATH):
+        self.path = path
+        self.windows_path = windows_path
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(windows_path + '.lock')
+        self.reference = None
+        self._binner = None
+        self._expected = None
+        self._pending = {}
+        self._flushed = time.monotonic()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                reference = json.load(f)
+        except (OSError, ValueError):
+            reference = None
+        with self._lock:
+            if reference is not None and self.reference is not None \
+                    and reference['created_at'] == self.reference['created_at']:
+                return
+            self.reference = reference
+            if reference is None:
+                self._binner = self._expected = None
+                self._pending = {}
+                return
+            self._binner = Binner(reference)
+            self._expected = np.concatenate([reference['features'][f]['counts'] for f in FEATURES])
+            self._pending = {source: PendingRows() for source in SOURCES}
+        logger.info("Drift reference loaded (%d training rows)", reference['rows'])
+
+    def staged(self):
+        """Rows to be binned now and added by ``commit`` later, e.g. once an upload is written."""
+        return StagedRows(self._binner)
+
+    def commit(self, source, staged, flush=True):
+        self.merge(source, staged.binner, staged.pending, flush)
+
+    def observe(self, source, df, prepared=False, flush=False):
+        staged = self.staged()
+        staged.observe(df, prepared)
+        self.commit(source, staged, flush)
+
+    def observe_key(self, source, key):
+        binner = self._binner
+        if binner is None or key is None:
+            return
+        pending = PendingRows()
+        pending.add(binner.key_bins(key))
+        self.merge(source, binner, pending)
+
+    def merge(self, source, binner, pending, flush=False):
+        """Queue rows binned by ``binner``; written now with ``flush`` or once the buffer is due."""
+        with self._lock:
+            if binner is None or binner is not self._binner:
+                return
+            self._pending[source].extend(pending)
+            flush = flush or time.monotonic() - self._flushed >= DRIFT_FLUSH_SECONDS
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Add this worker's buffered rows to the shared windows and return them."""
+        return self._flush()[-1]
+
+    def _flush(self):
+        with self._lock:
+            reference, expected, binner = self.reference, self._expected, self._binner
+            if binner is None:
+                return None, None, None, None
+            pending, self._pending = self._pending, {source: PendingRows() for source in SOURCES}
+            self._flushed = time.monotonic()
+        with self._file_lock:
+            windows = self._read_windows(reference, binner.width)
+            if any(rows.parts or rows.dropped for rows in pending.values()):
+                for source, rows in pending.items():
+                    rows.add_to(windows[source])
+                self._write_windows(reference, binner.width, windows)
+        return reference, expected, binner, windows
+
+    def _read_windows(self, reference, width):
+        try:
+            with np.load(self.windows_path) as saved:
+                # windows of an older (or newer) training start over
+                if float(saved['created_at']) == reference['created_at'] and int(saved['width']) == width:
+                    return {source: RollingSketch.from_arrays(width, saved[source + '_counts'], saved[source + '_rows'],
+                                                              saved[source + '_observed'])
+                            for source in SOURCES}
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(self.windows_path):
+                logger.warning("Ignoring unreadable drift windows %s: %s", self.windows_path, e)
+        return {source: RollingSketch(width) for source in SOURCES}
+
+    def _write_windows(self, reference, width, windows):
+        arrays = {'created_at': np.float64(reference['created_at']), 'width': np.int64(width)}
+        for source, window in windows.items():
+            arrays[source + '_counts'], arrays[source + '_rows'] = window.arrays()
+            arrays[source + '_observed'] = np.int64(window.observed)
+        tmp_path = self.windows_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self.windows_path)
+
+    def _score(self, window, reference, expected, binner):
+        features, drifted = {}, []
+        for field in FEATURES:
+            start, stop = binner.slices[field]
+            expected_counts, actual = expected[start:stop], window.total[start:stop]
+            if not window.rows:
+                features[field] = {'psi': None, 'status': 'insufficient_data'}
+                continue
+            score = {'psi': round(psi(expected_counts, actual), 4)}
+            if reference['features'][field]['type'] == 'numeric':
+                score['ks'] = round(binned_ks(expected_counts, actual), 4)
+            if window.rows < DRIFT_MIN_ROWS:
+                score['status'] = 'insufficient_data'
+            elif score['psi'] > DRIFT_PSI_ALERT:
+                score['status'] = 'drift'
+                drifted.append(field)
+            else:
+                score['status'] = 'moderate' if score['psi'] > PSI_STABLE else 'stable'
+            features[field] = score
+        return {'window_rows': window.rows, 'observed_rows': window.observed, 'features': features, 'drifted': drifted}
+
+    def report(self):
+        # other workers' predictions arrive within DRIFT_FLUSH_SECONDS of their next request
+        reference, expected, binner, windows = self._flush()
+        if reference is None:
+            return {'reference': None, 'sources': {}, 'retrain_recommended': False}
+        sources = {source: self._score(window, reference, expected, binner) for source, window in windows.items()}
+        return {
+            'reference': {'rows': reference['rows'], 'created_at': reference['created_at']},
+            'sources': sources,
+            'psi_alert': DRIFT_PSI_ALERT,
+            'min_rows': DRIFT_MIN_ROWS,
+            'retrain_recommended': any(s['drifted'] for s in sources.values()),
+        }
@@ -0,0 +1,134 @@
+import logging
+import numpy as np
+from features import FEATURES
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+
+def _unwrap(transformer, kind):
+    # accept a bare transformer or a Pipeline ending in it
+    steps = getattr(transformer, 'steps', None)
+    if steps is not None:
+        transformer = steps[-1][1]
+    return transformer if type(transformer).__name__ == kind else None
+
+
+def encoded_feature_index(pre):
+    """Map every ColumnTransformer output column to its position in ``FEATURES``.
+
+    Numeric columns map one to one; each one-hot block maps back to the
+    categorical field it was expanded from. Returns None for layouts that
+    cannot be traced back to the 13 inputs.
+    """
+    index = []
+    for name, transformer, columns in pre.transformers_:
+        if name == 'remainder' or transformer == 'drop' or len(columns) == 0:
+            if name == 'remainder' and transformer != 'drop':
+                return None
+            continue
+        if any(col not in FEATURES for col in columns):
+            return None
+        onehot = _unwrap(transformer, 'OneHotEncoder')
+        if onehot is not None:
+            if getattr(onehot, 'drop_idx_', None) is not None \
+                    or getattr(onehot, 'infrequent_categories_', None) is not None:
+                return None
+            for col, cats in zip(columns, onehot.categories_):
+                index += [FEATURES.index(col)] * len(cats)
+        else:
+            index += [FEATURES.index(col) for col in columns]
+    return np.asarray(index, dtype=np.intp)
+
+
+class ForestExplainer:
+    """Per-prediction feature contributions for a fitted RandomForest pipeline.
+
+    Uses the tree-path decomposition: in every tree, the Pass probability at
+    a leaf equals the root value plus the change in node value at each split
+    on the way down, and each change is credited to the split's feature.
+    Averaged over the forest this gives ``probability = baseline +
+    sum(contributions)`` exactly.
+
+    All per-node deltas are precomputed once into a sparse
+    ``(total_nodes, 13)`` matrix, with one-hot columns already folded into
+    their original feature. Explaining a batch is then one
+    ``decision_path`` call and one sparse product, instead of re-scoring
+    perturbed copies of every row.
+    """
+
+    def __init__(self, pre, forest, feature_index, pass_col):
+        # imported here: processes serving the compact format never build an explainer
+        from scipy import sparse
+        self.pre = pre
+        self.forest = forest
+        n_trees = len(forest.estimators_)
+        rows, cols, deltas = [], [], []
+        offset, baseline = 0, 0.0
+        for est in forest.estimators_:
+            tree = est.tree_
+            value = tree.value[:, 0, :]
+            prob = value[:, pass_col] / value.sum(axis=1)
+            internal = np.flatnonzero(tree.children_left >= 0)
+            credited = feature_index[tree.feature[internal]]
+            for child in (tree.children_left[internal], tree.children_right[internal]):
+                rows.append(child + offset)
+                cols.append(credited)
+                deltas.append(prob[child] - prob[internal])
+            baseline += prob[0]
+            offset += tree.node_count
+        # duplicate (node, feature) entries cannot occur; averaging over trees is folded in here
+        self.deltas = sparse.csr_matrix(
+            (np.concatenate(deltas) / n_trees, (np.concatenate(rows), np.concatenate(cols))),
+            shape=(offset, len(FEATURES)))
+        self.baseline = float(baseline / n_trees)
+
+    def explain(self, X):
+        """Contributions for prepared features ``X`` (rows in ``FEATURES`` order).
+
+        Returns ``(baseline, contributions)`` where ``contributions`` has
+        shape ``(n_rows, 13)`` in Pass-probability units.
+        """
+        with stage('explain'):
+            encoded = self.pre.transform(X)
+            paths, _ = self.forest.decision_path(encoded)
+            return self.baseline, np.asarray((paths @ self.deltas).todense())
+
+
+def build_explainer(pipeline):
+    """ForestExplainer for ``pipeline``; None when its layout is not supported."""
+    named = getattr(pipeline, 'named_steps', None)
+    if not named or 'pre' not in named or 'clf' not in named:
+        return None
+    pre, forest = named['pre'], named['clf']
+    if not hasattr(pre, 'transformers_') or not hasattr(forest, 'estimators_'):
+        return None
+    try:
+        feature_index = encoded_feature_index(pre)
+        if feature_index is None or len(feature_index) != getattr(forest, 'n_features_in_', len(feature_index)):
+            return None
+        pass_col = np.flatnonzero(np.asarray(forest.classes_) == 1)
+        if pass_col.size == 0:
+            return None
+        return ForestExplainer(pre, forest, feature_index, int(pass_col[0]))
+    except Exception as e:
+        logger.warning("Could not build explainer: %s", e)
+        return None
+
+
+def top_contributions(contributions, features=FEATURES):
+    """One row of contributions as a list ordered by absolute effect."""
+    order = np.argsort(-np.abs(contributions), kind='stable')
+    return [{'feature': features[i], 'contribution': round(float(contributions[i]), 6)} for i in order]
+
+
+def global_importances(pipeline):
+    """``feature_importances_`` summed back onto the 13 inputs, or None."""
+    named = getattr(pipeline, 'named_steps', None) or {}
+    forest, pre = named.get('clf'), named.get('pre')
+    if not hasattr(forest, 'feature_importances_') or not hasattr(pre, 'transformers_'):
+        return None
+    feature_index = encoded_feature_index(pre)
+    if feature_index is None or len(feature_index) != len(forest.feature_importances_):
+        return None
+    return np.bincount(feature_index, weights=forest.feature_importances_, minlength=len(FEATURES))
@@ -0,0 +1,186 @@
+import logging
+import math
+import threading
+import numpy as np
+import pandas as pd
+from features import FEATURES, NUMERIC_FIELDS, CATEGORICAL_DEFAULTS, prepare_features
+
+_SCALARS = (str, int, float, bool, type(None))
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledEncoder:
+    """Single-row scoring without pandas or the ColumnTransformer.
+
+    Built once from a fitted ``Pipeline([('pre', ColumnTransformer), ('clf', forest)])``:
+    numeric columns keep the scaler's mean/scale, categorical columns become
+    ``value -> output column`` lookup tables. A JSON payload is written straight
+    into a preallocated float vector and scored tree by tree, matching
+    ``pipeline.predict_proba`` exactly.
+    """
+
+    def __init__(self, numeric, categorical, width, forest):
+        # numeric: [(field, out_index, mean, scale)], categorical: [(field, {value: out_index})]
+        self.numeric = numeric
+        self.categorical = categorical
+        self.width = width
+        self.estimators = list(forest.estimators_)
+        self.n_classes = len(forest.classes_)
+        self._local = threading.local()
+
+    def _buffer(self):
+        buf = getattr(self._local, 'buf', None)
+        if buf is None:
+            buf = self._local.buf = np.zeros((1, self.width), dtype=np.float64)
+        return buf
+
+    def encode(self, payload):
+        """Return the transformed feature row for ``payload``, or None if it needs the pandas path."""
+        buf = self._buffer()
+        buf.fill(0.0)
+        row = buf[0]
+        for field, idx, mean, scale in self.numeric:
+            value = payload.get(field)
+            if not isinstance(value, _SCALARS):
+                return None
+            if value is None:
+                x = 0.0
+            else:
+                # strings go through to_numeric so they parse exactly like the pandas path
+                x = float(pd.to_numeric(value, errors='coerce')) if isinstance(value, str) else float(value)
+                if math.isnan(x):
+                    x = 0.0
+            if mean is not None:
+                x -= mean
+            if scale is not None:
+                x /= scale
+            row[idx] = x
+        for field, table in self.categorical:
+            value = payload.get(field)
+            if not isinstance(value, _SCALARS):
+                return None
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                value = CATEGORICAL_DEFAULTS.get(field, 'Unknown')
+            elif not isinstance(value, str):
+                return None
+            idx = table.get(value)
+            if idx is not None:  # unknown levels encode as all zeros (handle_unknown='ignore')
+                row[idx] = 1.0
+        return buf
+
+    def predict_proba(self, payload):
+        """Class probabilities for one payload, shape (1, n_classes), or None."""
+        X = self.encode(payload)
+        if X is None:
+            return None
+        # trees split on float32, exactly like the forest's own input validation
+        X32 = np.ascontiguousarray(X, dtype=np.float32)
+        proba = np.zeros((1, self.n_classes), dtype=np.float64)
+        for est in self.estimators:
+            proba += est.predict_proba(X32, check_input=False)
+        proba /= len(self.estimators)
+        return proba
+
+
+def _unwrap(transformer, kind):
+    # accept a bare transformer or a one-step Pipeline around it
+    steps = getattr(transformer, 'steps', None)
+    if steps is not None:
+        if len(steps) != 1:
+            return None
+        transformer = steps[0][1]
+    return transformer if type(transformer).__name__ == kind else None
+
+
+def compile_encoder(pipeline):
+    """Build a CompiledEncoder for ``pipeline``; None when its layout is not supported."""
+    named = getattr(pipeline, 'named_steps', None)
+    if not named or 'pre' not in named or 'clf' not in named or len(named) != 2:
+        return None
+    pre, forest = named['pre'], named['clf']
+    if not hasattr(pre, 'transformers_') or not hasattr(forest, 'estimators_'):
+        return None
+    numeric, categorical, width = [], [], 0
+    for name, transformer, columns in pre.transformers_:
+        if name == 'remainder':
+            if transformer != 'drop':
+                return None
+            continue
+        if transformer == 'drop' or len(columns) == 0:
+            continue
+        if name == 'num':
+            scaler = _unwrap(transformer, 'StandardScaler')
+            if scaler is None:
+                return None
+            means = scaler.mean_ if scaler.with_mean else [None] * len(columns)
+            scales = scaler.scale_ if scaler.with_std else [None] * len(columns)
+            for field, mean, scale in zip(columns, means, scales):
+                if field not in NUMERIC_FIELDS:
+                    return None
+                numeric.append((field, width, None if mean is None else float(mean),
+                                None if scale is None else float(scale)))
+                width += 1
+        elif name == 'cat':
+            onehot = _unwrap(transformer, 'OneHotEncoder')
+            if onehot is None or getattr(onehot, 'drop_idx_', None) is not None \
+                    or getattr(onehot, 'infrequent_categories_', None) is not None \
+                    or onehot.handle_unknown != 'ignore':
+                return None
+            for field, cats in zip(columns, onehot.categories_):
+                table = {}
+                for offset, value in enumerate(cats):
+                    table.setdefault(value.item() if hasattr(value, 'item') else value, width + offset)
+                categorical.append((field, table))
+                width += len(cats)
+        else:
+            return None
+    if width != getattr(forest, 'n_features_in_', width):
+        return None
+    return CompiledEncoder(numeric, categorical, width, forest)
+
+
+def _probe_payloads(encoder):
+    # rows covering every known category plus unknown/missing values and odd numerics
+    longest = max((len(t) for _, t in encoder.categorical), default=1)
+    probes = []
+    for i in range(longest + 2):
+        payload = {}
+        for j, (field, _, mean, scale) in enumerate(encoder.numeric):
+            base = mean if mean is not None else 0.0
+            spread = scale if scale is not None else 1.0
+            payload[field] = [base, base + spread * (i % 3 - 1), str(round(base, 2)), None, 'n/a'][(i + j) % 5]
+        for field, table in encoder.categorical:
+            levels = list(table)
+            payload[field] = (levels + ['__unknown__', None])[i % (len(levels) + 2)]
+        probes.append(payload)
+    return probes
+
+
+def build_verified_encoder(pipeline, score_with_pipeline):
+    """Compile an encoder and check it against the pipeline on probe rows.
+
+    ``score_with_pipeline(payloads)`` must return the pipeline's probabilities
+    for a list of payloads. Returns None (keep the pandas path) on any mismatch.
+    """
+    try:
+        encoder = compile_encoder(pipeline)
+        if encoder is None:
+            return None
+        probes = _probe_payloads(encoder)
+        expected = score_with_pipeline(probes)
+        got = np.vstack([encoder.predict_proba(p) for p in probes])
+        if got.shape != expected.shape or not np.allclose(got, expected, rtol=0, atol=1e-12):
+            logger.warning("Compiled encoder disagrees with the pipeline; using the pandas path")
+            return None
+        return encoder
+    except Exception as e:
+        logger.warning("Could not compile fast encoder: %s", e)
+        return None
+
+
+def pipeline_proba(pipeline):
+    """Reference scorer used to verify the compiled encoder."""
+    def score(payloads):
+        return np.asarray(pipeline.predict_proba(prepare_features(pd.DataFrame(payloads))[FEATURES]))
+    return score
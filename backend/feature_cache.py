@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import joblib
+import numpy as np
+
+BASE = os.path.dirname(__file__)
+FEATURE_CACHE_DIR = os.environ.get('FEATURE_CACHE_DIR', os.path.join(BASE, 'model', 'feature_cache'))
+# encoded datasets kept on disk (most recently used first); 0 disables the cache
+FEATURE_CACHE_ENTRIES = int(os.environ.get('FEATURE_CACHE_ENTRIES', 3))
+# bump when prepare_training_data() or the preprocessor changes in a way the config hash cannot see
+FEATURE_CACHE_FORMAT = 2
+
+_INDEX = 'digests.json'
+
+logger = logging.getLogger(__name__)
+
+
+class EncodedDataset:
+    """A training set after parsing, default-filling and ColumnTransformer encoding.
+
+    ``X`` and ``y`` are memory-mapped from the cache directory (plain arrays
+    when freshly built); ``preprocessor`` is the fitted ColumnTransformer that
+    produced ``X``; ``row_hashes`` are train_model's per-row feature+label
+    hashes and ``meta`` holds the record count, label distribution and the
+    drift reference sketches of the raw features.
+    """
+
+    def __init__(self, key, X, y, row_hashes, preprocessor, meta, hit):
+        self.key = key
+        self.X = X
+        self.y = y
+        self.row_hashes = row_hashes
+        self.preprocessor = preprocessor
+        self.meta = meta
+        self.hit = hit
+
+
+class FeatureCache:
+    """Content-addressed store of encoded training matrices.
+
+    The key is a SHA-256 over the source file's bytes and the preprocessing
+    configuration, so unchanged data under an unchanged config maps to the
+    same entry. File digests are memoized by (size, mtime) to avoid re-reading
+    large files just to find out they did not change.
+    """
+
+    def __init__(self, directory=FEATURE_CACHE_DIR, max_entries=FEATURE_CACHE_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.directory, _INDEX)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        path = os.path.join(self.directory, _INDEX)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(index, f)
+        os.replace(path + '.tmp', path)
+
+    def file_digest(self, path):
+        st = os.stat(path)
+        signature = [st.st_size, st.st_mtime_ns]
+        index = self._read_index()
+        entry = index.get(os.path.abspath(path))
+        if entry and entry['signature'] == signature:
+            return entry['digest']
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        digest = h.hexdigest()
+        os.makedirs(self.directory, exist_ok=True)
+        index[os.path.abspath(path)] = {'signature': signature, 'digest': digest}
+        self._write_index(index)
+        return digest
+
+    def key(self, data_file, config):
+        # ``data_file`` may be a list of shard files; the key covers each one's content in order
+        h = hashlib.sha256()
+        for path in data_file if isinstance(data_file, (list, tuple)) else [data_file]:
+            h.update(self.file_digest(path).encode())
+        h.update(json.dumps({'format': FEATURE_CACHE_FORMAT, **config}, sort_keys=True, default=str).encode())
+        return h.hexdigest()[:24]
+
+    def load(self, key):
+        """Return the cached EncodedDataset for ``key`` or None."""
+        path = os.path.join(self.directory, key)
+        if not self.enabled or not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+            X = np.load(os.path.join(path, 'X.npy'), mmap_mode='r')
+            y = np.load(os.path.join(path, 'y.npy'), mmap_mode='r')
+            hashes = np.load(os.path.join(path, 'row_hashes.npy'), mmap_mode='r')
+            preprocessor = joblib.load(os.path.join(path, 'preprocessor.joblib'))
+        except Exception as e:
+            logger.warning("Ignoring unreadable feature cache entry %s: %s", key, e)
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        os.utime(path)  # LRU order
+        return EncodedDataset(key, X, y, hashes, preprocessor, meta, hit=True)
+
+    def store(self, dataset):
+        """Persist ``dataset``; an interrupted write never leaves a readable partial entry."""
+        if not self.enabled:
+            return
+        path = os.path.join(self.directory, dataset.key)
+        tmp = f'{path}.tmp-{os.getpid()}'
+        try:
+            os.makedirs(tmp, exist_ok=True)
+            np.save(os.path.join(tmp, 'X.npy'), np.ascontiguousarray(dataset.X))
+            np.save(os.path.join(tmp, 'y.npy'), np.ascontiguousarray(dataset.y))
+            np.save(os.path.join(tmp, 'row_hashes.npy'), np.ascontiguousarray(dataset.row_hashes))
+            joblib.dump(dataset.preprocessor, os.path.join(tmp, 'preprocessor.joblib'))
+            # meta.json last: its presence marks a complete entry
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump({**dataset.meta, 'created_at': time.time()}, f)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning("Could not store feature cache entry %s: %s", dataset.key, e)
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self._prune()
+
+    def _prune(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path) and '.tmp-' not in name:
+                entries.append((os.stat(path).st_mtime, path))
+        for _, path in sorted(entries, reverse=True)[self.max_entries:]:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+from metrics import stage
+
+# the 13 model inputs, in training order (Student_Name is not used for prediction)
+FEATURES = [
+    'Hours_Studied', 'Attendance', 'Parental_Involvement', 'Access_to_Resources',
+    'Previous_Scores', 'Internet_Access', 'Tutoring_Sessions', 'Family_Income',
+    'Peer_Influence', 'Learning_Disabilities', 'Parental_Education_Level',
+    'Distance_from_Home', 'Gender'
+]
+NUMERIC_FIELDS = ['Hours_Studied', 'Attendance', 'Previous_Scores', 'Tutoring_Sessions', 'Family_Income', 'Distance_from_Home']
+CATEGORICAL_FIELDS = ['Parental_Involvement', 'Access_to_Resources', 'Internet_Access', 'Peer_Influence', 'Learning_Disabilities', 'Parental_Education_Level', 'Gender']
+
+# values used when a categorical field is missing entirely
+CATEGORICAL_DEFAULTS = {
+    'Parental_Involvement': 'Medium',
+    'Access_to_Resources': 'Yes',
+    'Internet_Access': 'Yes',
+    'Peer_Influence': 'Neutral',
+    'Learning_Disabilities': 'No',
+    'Parental_Education_Level': 'Secondary',
+    'Gender': 'Other',
+}
+
+
+def missing_features(columns):
+    return [col for col in FEATURES if col not in columns]
+
+
+def prepare_features(df, categorical_fill='default'):
+    """Return the 13 model features of ``df``, cleaned and in training order.
+
+    Numeric fields are coerced with ``to_numeric`` and missing values become 0.
+    Missing categorical values are filled with the per-field default, or with
+    the column mode when ``categorical_fill='mode'`` (the upload behaviour).
+    All work is column-wise, so the cost does not depend on Python loops over rows.
+    """
+    with stage('preprocess'):
+        cols = {}
+        for col in NUMERIC_FIELDS:
+            if col in df.columns:
+                cols[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+            else:
+                cols[col] = pd.Series(0, index=df.index)
+        for col in CATEGORICAL_FIELDS:
+            if col not in df.columns:
+                cols[col] = pd.Series(CATEGORICAL_DEFAULTS[col], index=df.index, dtype=object)
+                continue
+            values = df[col]
+            if categorical_fill == 'mode':
+                fill = values.mode().iloc[0] if not values.isna().all() else 'Unknown'
+            else:
+                fill = CATEGORICAL_DEFAULTS[col]
+            cols[col] = values.fillna(fill) if values.isna().any() else values
+        return pd.DataFrame(cols, index=df.index)[FEATURES]
+
+
+def score_features(model, X):
+    """Score prepared features with one ``predict_proba`` call.
+
+    Returns ``(passed, probability)``: a boolean array of Pass predictions and
+    the Pass-class probability for each row. Labels are taken from the
+    probabilities, so the forest is traversed only once.
+    """
+    if not hasattr(model, 'predict_proba'):
+        with stage('predict'):
+            passed = np.asarray(model.predict(X)) == 1
+        return passed, passed.astype(np.float64)
+    with stage('predict_proba'):
+        proba = model.predict_proba(X)
+    return outcome_from_proba(model, proba)
+
+
+def outcome_from_proba(model, proba):
+    """Turn ``predict_proba`` output into ``(passed, probability)`` arrays."""
+    proba = np.asarray(proba)
+    if proba.ndim == 1:
+        proba = proba.reshape(-1, 1)
+    classes = np.asarray(getattr(model, 'classes_', np.arange(proba.shape[1])))
+    passed = classes[proba.argmax(axis=1)] == 1
+    pass_col = np.flatnonzero(classes == 1)
+    if pass_col.size:
+        probability = proba[:, pass_col[0]].astype(np.float64)
+    else:
+        probability = np.zeros(len(proba))
+    return passed, probability
+
+
+def normalize_payload(payload):
+    """Canonical tuple of the 13 features of one JSON payload.
+
+    Values are normalised the way prepare_features() treats them (numeric
+    coercion with 0 for missing/invalid, per-field defaults for missing
+    categoricals), so payloads that score identically share one key.
+    Returns None when a value cannot be normalised safely.
+    """
+    key = []
+    for col in FEATURES:
+        value = payload.get(col)
+        if col in NUMERIC_FIELDS:
+            if value is None:
+                key.append(0.0)
+                continue
+            if not isinstance(value, (str, int, float)):
+                return None
+            x = float(pd.to_numeric(value, errors='coerce')) if isinstance(value, str) else float(value)
+            key.append(0.0 if x != x else x)
+        elif value is None or (isinstance(value, float) and value != value):
+            key.append(CATEGORICAL_DEFAULTS[col])
+        elif isinstance(value, str):
+            key.append(value)
+        else:
+            return None
+    return tuple(key)
@@ -0,0 +1,45 @@
+# gunicorn settings for `gunicorn -c gunicorn.conf.py wsgi:app`; every value can be set from the environment
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+# WEB_CONCURRENCY is the conventional gunicorn/PaaS variable for the worker count. Workers coordinate
+# uploads, manifest writes and training through flock files under data/ and model/jobs/
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+# load app.py (model + roster) once in the master; workers share the pages copy-on-write
+# until a hot reload, which loads a private copy of the new model in every worker
+preload_app = True
+# uploads and large /api/students responses can take a while
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+# on SIGTERM, workers finish in-flight requests for up to this long
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# recycle workers now and then to bound memory growth; jitter avoids restarting them all at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', None)
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def on_starting(server):
+    # metrics snapshots of the workers of a previous run
+    from metrics import metrics
+    metrics.reset_directory()
+
+
+def post_fork(server, worker):
+    # threads do not survive fork: each worker runs its own model watcher
+    import app
+    app.model_registry.after_fork()
+    # writes this worker's metrics snapshot for scrapes served by the others
+    app.metrics.start_flusher()
+
+
+def worker_exit(server, worker):
+    import app
+    app.training_queue.shutdown()
+    # its request counts stay in the merged totals
+    app.metrics.flush(force=True)
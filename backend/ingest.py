@@ -0,0 +1,256 @@
+import os
+import numpy as np
+import pandas as pd
+from features import FEATURES, NUMERIC_FIELDS, prepare_features, score_features, missing_features
+from storage import ColumnarWriter, write_columnar
+
+# rows per chunk when streaming a CSV upload; bounds peak memory independently of file size
+UPLOAD_CHUNK_ROWS = int(os.environ.get('UPLOAD_CHUNK_ROWS', 50000))
+
+
+class IngestError(ValueError):
+    """Raised when an uploaded file cannot be ingested (e.g. missing columns)."""
+
+
+class IngestResult:
+    def __init__(self, rows=0, pass_count=0):
+        self.rows = rows
+        self.pass_count = pass_count
+        # upsert only: how the upload touched the stored roster
+        self.inserted = self.updated = self.unchanged = self.rescored = None
+        # upsert only: stored rows the upload replaced and the rows it wrote in their place (plus new ones)
+        self.replaced_rows = self.written_rows = None
+
+    @property
+    def fail_count(self):
+        return self.rows - self.pass_count
+
+    def add(self, rows, pass_count):
+        self.rows += rows
+        self.pass_count += pass_count
+
+
+def check_columns(columns):
+    missing = missing_features(columns)
+    if missing:
+        raise IngestError(f'Missing required columns: {", ".join(missing)}')
+
+
+def process_frame(df, model, start=0):
+    """Clean and score one block of uploaded rows.
+
+    ``start`` is the position of the first row in the whole upload, so that
+    generated student ids and placeholder names stay sequential across chunks.
+    Returns the processed frame and its number of Pass results.
+    """
+    # Add student_id if it doesn't exist
+    if 'student_id' not in df.columns:
+        df.insert(0, 'student_id', range(1001 + start, 1001 + start + len(df)))
+    # Add Student_Name if it doesn't exist
+    if 'Student_Name' not in df.columns:
+        df.insert(1, 'Student_Name', [f'Student_{i}' for i in range(start, start + len(df))])
+
+    if model is not None:
+        # Clean the 13 features in place (numeric coercion, mode fill for categoricals)
+        X_pred = prepare_features(df, categorical_fill='mode')
+        df[FEATURES] = X_pred
+        # One transform + one forest traversal; labels are derived from the probabilities
+        passed, probabilities = score_features(model, X_pred)
+        df['result'] = np.where(passed, 'Pass', 'Fail')
+        df['prediction_probability'] = probabilities
+    elif 'result' not in df.columns:
+        # If no model exists yet, generate default results based on scores and hours
+        scores = pd.to_numeric(df['Previous_Scores'], errors='coerce')
+        hours = pd.to_numeric(df['Hours_Studied'], errors='coerce')
+        df['result'] = np.where((scores >= 50) | (hours >= 5), 'Pass', 'Fail')
+    return df, int((df['result'] == 'Pass').sum())
+
+
+def ingest_csv_stream(path, output_path, model, chunk_rows=UPLOAD_CHUNK_ROWS, on_chunk=None, validate=None):
+    """Stream a CSV upload into ``output_path`` chunk by chunk.
+
+    Required columns are validated from the header alone. Each chunk is
+    cleaned, scored and appended to a temporary file that replaces
+    ``output_path`` atomically once every chunk has been written, so readers
+    never see a half-written roster. The categorical mode fill is computed per
+    chunk, which matches the whole-file behaviour for uploads that fit in one chunk.
+    The binary columnar copy is written from the same chunks, and
+    ``on_chunk(chunk)`` is called with every processed chunk; it should only
+    collect, because a later chunk can still reject the upload, and the
+    caller applies what it collected once this returns.
+    ``validate(chunk)`` runs before a chunk is written and may raise
+    IngestError, which leaves ``output_path`` as it was.
+    """
+    check_columns(pd.read_csv(path, nrows=0).columns)
+    tmp_path = output_path + '.tmp'
+    columnar = ColumnarWriter(output_path)
+    result = IngestResult()
+    try:
+        for i, chunk in enumerate(pd.read_csv(path, chunksize=chunk_rows)):
+            chunk, n_pass = process_frame(chunk, model, start=result.rows)
+            if validate is not None:
+                validate(chunk)
+            chunk.to_csv(tmp_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            columnar.write(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+            result.add(len(chunk), n_pass)
+        if result.rows == 0:
+            empty, _ = process_frame(pd.read_csv(path, nrows=0), None)
+            empty.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, output_path)
+        # written after the CSV so its mtime marks it as the fresher copy
+        columnar.close()
+    except Exception:
+        columnar.abort(keep_existing=True)
+        raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return result
+
+
+class UploadIds:
+    """``validate`` hook rejecting student ids repeated within one upload, across chunks too.
+
+    Ids seen so far are kept as a sorted array of 64-bit hashes, 8 bytes per row.
+    """
+
+    def __init__(self):
+        self.seen = np.empty(0, dtype=np.uint64)
+
+    def check(self, rows):
+        if 'student_id' not in rows.columns:
+            return
+        keys = _student_keys(rows['student_id'])
+        hashes = pd.util.hash_array(keys.to_numpy(dtype=object))
+        repeated = keys.duplicated().to_numpy() | np.isin(hashes, self.seen)
+        if repeated.any():
+            ids = keys[repeated].unique().tolist()
+            more = f' (+{len(ids) - 5} more)' if len(ids) > 5 else ''
+            raise IngestError(f"student_id {', '.join(ids[:5])}{more} appears more than once in the upload")
+        self.seen = np.union1d(self.seen, hashes)
+
+
+def ingest_frame(df, output_path, model, validate=None):
+    """Non-streaming path for formats that cannot be read in chunks (Excel)."""
+    check_columns(df.columns)
+    df, n_pass = process_frame(df, model)
+    if validate is not None:
+        validate(df)
+    write_roster(df, output_path)
+    return df, IngestResult(len(df), n_pass)
+
+
+def feature_hashes(df):
+    """Per-row hash of the 13 model features, independent of column dtypes."""
+    norm = pd.DataFrame({
+        col: (pd.to_numeric(df[col], errors='coerce').astype(np.float64) if col in NUMERIC_FIELDS
+              else df[col].astype(object).where(df[col].notna(), None).astype(str))
+        for col in FEATURES
+    })
+    return pd.util.hash_pandas_object(norm, index=False).to_numpy()
+
+
+def _student_keys(ids):
+    return ids.astype(str).str.strip()
+
+
+def _restore_integers(df, columns):
+    # realigning rows upcasts int columns to float; undo it where nothing is fractional/missing
+    for col in columns:
+        if col in df.columns and df[col].dtype.kind == 'f':
+            values = df[col]
+            if values.notna().all() and bool(np.all(np.mod(values, 1) == 0)):
+                df[col] = values.astype(np.int64)
+    return df
+
+
+def write_roster(df, output_path):
+    """Atomically replace the canonical CSV (and its columnar copy) with ``df``."""
+    tmp_path = output_path + '.tmp'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    write_columnar(df, output_path)
+
+
+def ingest_upsert(upload, existing, output_path, model, validate=None):
+    """Merge ``upload`` into the ``existing`` roster keyed by ``student_id``.
+
+    Uploaded rows replace the stored values of the same student and unknown
+    ids are appended. Only rows whose 13 feature values actually changed (by
+    per-row hash), new rows, and rows that were never scored go through the
+    model; every other row keeps its stored prediction. Returns the merged
+    frame and an IngestResult whose ``rescored``/``inserted``/``updated``/
+    ``unchanged`` counts describe the delta. ``validate(rows)`` is called with the
+    inserted rows before anything is written.
+    """
+    check_columns(upload.columns)
+    if 'student_id' not in upload.columns:
+        raise IngestError('Upsert uploads need a student_id column')
+    upload = upload.copy()
+    upload[FEATURES] = prepare_features(upload, categorical_fill='mode')
+    upload['_key'] = _student_keys(upload['student_id'])
+    upload = upload.drop_duplicates('_key', keep='last').set_index('_key')
+
+    existing = existing.copy()
+    # plain object columns so new levels/labels can be written into them
+    for col in existing.columns:
+        if isinstance(existing[col].dtype, pd.CategoricalDtype):
+            existing[col] = existing[col].astype(object)
+    existing['_key'] = _student_keys(existing['student_id'])
+    if existing['_key'].duplicated().any():
+        raise IngestError('Upsert needs unique student_id values in the stored roster')
+    existing = existing.set_index('_key')
+
+    matched = upload.index.intersection(existing.index)
+    inserted = upload.index.difference(existing.index, sort=False)
+    updated = matched[feature_hashes(upload.loc[matched]) != feature_hashes(existing.loc[matched])]
+    # stored rows that were never scored are scored now as well
+    if 'result' in existing.columns:
+        unscored = existing.index[existing['result'].isna().to_numpy()]
+    else:
+        unscored = existing.index
+    changed = updated.union(unscored, sort=False)
+
+    # uploaded values win; columns the upload does not carry keep their stored values
+    upload_cols = [c for c in upload.columns if c not in ('result', 'prediction_probability')]
+    merged = upload[upload_cols].combine_first(existing)
+    merged = merged.reindex(existing.index.append(inserted))
+    if 'Student_Name' in merged.columns:
+        missing_names = merged['Student_Name'].isna()
+        merged.loc[missing_names, 'Student_Name'] = 'Student_' + merged.index[missing_names.to_numpy()]
+    merged = merged[[c for c in existing.columns] + [c for c in merged.columns if c not in existing.columns]]
+
+    rescore = changed.append(inserted)
+    if model is not None and len(rescore):
+        # uploaded rows are already clean; stored rows that were never scored may not be
+        X_pred = prepare_features(merged.loc[rescore], categorical_fill='mode')
+        merged.loc[rescore, FEATURES] = X_pred
+        passed, probabilities = score_features(model, X_pred)
+        merged.loc[rescore, 'result'] = np.where(passed, 'Pass', 'Fail')
+        merged.loc[rescore, 'prediction_probability'] = probabilities
+    elif model is None:
+        # keep uploaded results; default rule for rows that have none
+        if 'result' in upload.columns:
+            merged.loc[upload.index, 'result'] = upload['result']
+        needs = merged['result'].isna() if 'result' in merged.columns else pd.Series(True, index=merged.index)
+        scores = pd.to_numeric(merged['Previous_Scores'], errors='coerce')
+        hours = pd.to_numeric(merged['Hours_Studied'], errors='coerce')
+        merged.loc[needs, 'result'] = np.where((scores >= 50) | (hours >= 5), 'Pass', 'Fail')[needs.to_numpy()]
+    touched = matched.union(changed, sort=False)
+    replaced_rows, written_rows = existing.loc[touched], merged.loc[touched.append(inserted)]
+
+    if validate is not None:
+        validate(merged.loc[inserted])
+    merged = _restore_integers(merged.reset_index(drop=True), NUMERIC_FIELDS + ['student_id'])
+    write_roster(merged, output_path)
+
+    result = IngestResult(len(merged), int((merged['result'] == 'Pass').sum()))
+    result.inserted = len(inserted)
+    result.updated = len(updated)
+    result.unchanged = len(matched) - len(updated)
+    result.rescored = len(rescore) if model is not None else 0
+    result.replaced_rows = replaced_rows.reset_index(drop=True)
+    result.written_rows = written_rows.reset_index(drop=True)
+    return merged, result
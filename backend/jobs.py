@@ -0,0 +1,348 @@
+import io
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from locks import FileLock
+
+# finished jobs kept around for GET /api/train/<id>
+MAX_FINISHED_JOBS = 20
+# job records shared by all gunicorn workers, and how often a running job's log is written there
+JOBS_DIR = os.environ.get('TRAINING_JOBS_DIR', os.path.join(os.path.dirname(__file__), 'model', 'jobs'))
+LOG_FLUSH_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+_log_queue = None
+
+
+class _QueueWriter(io.TextIOBase):
+    # line-buffered stdout/stderr replacement that forwards lines to the parent
+    def __init__(self, q):
+        self._q = q
+        self._buf = ''
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        self._buf += s
+        while '\n' in self._buf:
+            line, self._buf = self._buf.split('\n', 1)
+            self._q.put(line)
+        return len(s)
+
+    def flush(self):
+        if self._buf:
+            self._q.put(self._buf)
+            self._buf = ''
+
+
+def _init_worker(log_queue):
+    global _log_queue
+    _log_queue = log_queue
+    # pay the sklearn/pandas import cost once per worker process, not once per job
+    import train_model  # noqa: F401
+
+
+def _run_training(mode=None, shards=None):
+    # runs inside the pool process
+    import train_model
+    writer = _QueueWriter(_log_queue)
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = writer
+    try:
+        return train_model.train_model(mode, shards)
+    finally:
+        writer.flush()
+        sys.stdout, sys.stderr = stdout, stderr
+        _log_queue.put(None)  # end-of-job marker
+
+
+def _pid_alive(pid):
+    if os.name != 'posix':
+        return True  # os.kill(pid, 0) would terminate the process on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class TrainingJob:
+    def __init__(self, mode=None, shards=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.shards = shards
+        # the process that owns (runs) the job
+        self.pid = os.getpid()
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.log = []
+        self.metrics = None
+        self.error = None
+        self.done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    @classmethod
+    def from_record(cls, record):
+        """Read-only snapshot of a job stored by another worker."""
+        job = cls(record['mode'], record.get('shards'))
+        job.id = record['id']
+        job.pid = record['pid']
+        job.status = record['status']
+        for key in ('created_at', 'started_at', 'finished_at', 'metrics', 'error'):
+            setattr(job, key, record.get(key))
+        job.log = record['stdout'].split('\n') if record.get('stdout') else []
+        if not job.finished and not _pid_alive(job.pid):
+            job.status, job.error = 'failed', 'the worker process running this job exited'
+        if job.finished:
+            job.done.set()
+        return job
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'mode': self.mode,
+            'shards': self.shards,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'stdout': '\n'.join(self.log),
+            'metrics': self.metrics,
+            'error': self.error,
+        }
+
+    def to_record(self):
+        return {**self.to_dict(), 'pid': self.pid}
+
+
+class JobStore:
+    """Job records as one JSON file per job, shared by the processes of a deployment.
+
+    ``lock`` (an flock) guards every decision that involves other workers'
+    jobs: finding the waiting job to merge into, and a job leaving the
+    queued state.
+    """
+
+    def __init__(self, directory=JOBS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock = FileLock(os.path.join(directory, '.lock'))
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, job_id + '.json')
+
+    def save(self, job):
+        path = self._path(job.id)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(job.to_record(), f, default=str)
+        os.replace(path + '.tmp', path)
+
+    def load(self, job_id):
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def records(self):
+        out = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                record = self.load(name[:-5])
+                if record is not None:
+                    out.append(record)
+        return out
+
+    def waiting(self):
+        """The record of the queued job whose owner is still alive, or None (call under ``lock``)."""
+        for record in self.records():
+            if record['status'] == 'queued' and _pid_alive(record['pid']):
+                return record
+        return None
+
+    def trim(self):
+        finished = sorted((r for r in self.records() if r['status'] in ('succeeded', 'failed')),
+                          key=lambda r: r.get('finished_at') or 0)
+        for record in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            try:
+                os.remove(self._path(record['id']))
+            except OSError:
+                pass
+
+
+class TrainingQueue:
+    """Runs training jobs one at a time, across all workers of a deployment.
+
+    Jobs execute in a long-lived one-process pool so interpreter start-up and
+    the sklearn import are paid once, not per training. Job records live in a
+    JobStore shared by the gunicorn workers, so any worker can answer
+    GET /api/train/<id>. Submitting while a job is already waiting (in any
+    worker) returns that job instead of queueing a duplicate (a full refit
+    request upgrades a waiting incremental job and the shard selections are
+    merged); a request that arrives while a job is running queues one
+    follow-up run so data uploaded in the meantime is still trained on. An
+    flock on the store's ``.train.lock`` lets only one worker train at a
+    time; a job waiting for it stays queued and keeps absorbing requests.
+    """
+
+    def __init__(self, on_success=None, store=None):
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pending = queue.Queue()
+        self._thread = None
+        self._executor = None
+        self._log_queue = None
+        self._on_success = on_success
+        self._store = store or JobStore()
+        self._train_lock = FileLock(os.path.join(self._store.directory, '.train.lock'))
+
+    @staticmethod
+    def _merge(target, mode, shards):
+        if mode == 'full':
+            target['mode'] = mode
+        # None means every shard, so it absorbs any selection
+        if target['shards'] is not None:
+            target['shards'] = None if shards is None else \
+                target['shards'] + [name for name in shards if name not in target['shards']]
+
+    def submit(self, mode=None, shards=None):
+        """Queue a training run (``mode``/``shards`` as for train_model); returns ``(job, created)``."""
+        with self._lock, self._store.lock:
+            record = self._store.waiting()
+            if record is not None:
+                job = self._jobs.get(record['id'])
+                if job is None:
+                    # waiting in another worker, which reads the merged request when it starts the job
+                    self._merge(record, mode, shards)
+                    job = TrainingJob.from_record(record)
+                else:
+                    state = {'mode': job.mode, 'shards': job.shards}
+                    self._merge(state, mode, shards)
+                    job.mode, job.shards = state['mode'], state['shards']
+                self._store.save(job)
+                return job, False
+            job = TrainingJob(mode, shards)
+            self._jobs[job.id] = job
+            self._store.save(job)
+            self._trim()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name='training-queue', daemon=True)
+                self._thread.start()
+        self._pending.put(job)
+        return job, True
+
+    def get(self, job_id):
+        """The job (a snapshot when another worker owns it), or None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        record = self._store.load(job_id)
+        return TrainingJob.from_record(record) if record is not None else None
+
+    def is_local(self, job):
+        return self._jobs.get(job.id) is job
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if j.finished]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+        self._store.trim()
+
+    def _ensure_executor(self):
+        if self._executor is None:
+            ctx = multiprocessing.get_context('spawn')
+            self._log_queue = ctx.Queue()
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=ctx,
+                                                 initializer=_init_worker, initargs=(self._log_queue,))
+        return self._executor
+
+    def _worker(self):
+        while True:
+            job = self._pending.get()
+            # another worker may be training; the job stays queued (and mergeable) meanwhile
+            self._train_lock.acquire()
+            try:
+                self._run(job)
+            finally:
+                self._train_lock.release()
+
+    def _run(self, job):
+        with self._lock, self._store.lock:
+            record = self._store.load(job.id)
+            if record is not None:
+                # requests merged into the job by other workers
+                job.mode, job.shards = record['mode'], record['shards']
+            job.status = 'running'
+            job.started_at = time.time()
+            self._store.save(job)
+        try:
+            job.metrics = self._execute(job)
+            job.status = 'succeeded'
+        except Exception as e:
+            job.error = str(e) or e.__class__.__name__
+            job.status = 'failed'
+            if isinstance(e, BrokenProcessPool):
+                self._executor = None
+            else:
+                job.log.extend(l.rstrip('\n') for l in traceback.format_exception_only(type(e), e))
+        if job.status == 'succeeded' and self._on_success is not None:
+            try:
+                self._on_success(job)
+            except Exception as e:
+                logger.exception("Post-training hook failed: %s", e)
+        job.finished_at = time.time()
+        self._save(job)
+        job.done.set()
+
+    def _save(self, job):
+        try:
+            self._store.save(job)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Could not store training job %s: %s", job.id, e)
+
+    def _execute(self, job):
+        future = self._ensure_executor().submit(_run_training, job.mode, job.shards)
+        # forward the worker's output into the job log while it trains; other workers read it from the store
+        deadline = None
+        flushed = time.time()
+        while True:
+            if time.time() - flushed > LOG_FLUSH_SECONDS:
+                self._save(job)
+                flushed = time.time()
+            try:
+                line = self._log_queue.get(timeout=0.2)
+            except queue.Empty:
+                if future.done():
+                    # give the queue feeder a moment to deliver the tail of the log
+                    deadline = deadline or time.time() + 2
+                    if time.time() > deadline:
+                        break
+                continue
+            if line is None:
+                break
+            job.log.append(line)
+        return future.result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,49 @@
+import os
+import threading
+
+# fcntl is POSIX only; elsewhere (the Windows dev server) locks are per process
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the platform
+    fcntl = None
+
+
+class FileLock:
+    """Mutual exclusion across threads and processes (gunicorn workers).
+
+    A thread lock orders the threads of one process, and an exclusive
+    ``flock`` on ``path`` orders the processes that share the directory.
+    The lock file itself is left in place; only the lock on it matters.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = None
+
+    def acquire(self):
+        self._lock.acquire()
+        if fcntl is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            self._lock.release()
+            raise
+        self._fd = fd
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            # closing the descriptor drops the flock
+            os.close(fd)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
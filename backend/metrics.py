@@ -0,0 +1,264 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds; wide enough for a cached predict (~0.1 ms) and a full roster load
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# every process (gunicorn worker) writes a snapshot here and a scrape merges them all; '' keeps
+# the numbers of the scraped process only
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(os.path.dirname(__file__), 'model', 'metrics'))
+# a process rewrites its snapshot this often, and whenever it serves a scrape
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+
+logger = logging.getLogger(__name__)
+
+_request = threading.local()
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _pid_alive(pid):
+    if os.name != 'posix':
+        return True  # os.kill(pid, 0) would terminate the process on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set, safe to share between threads."""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(counts), total] for labels, (counts, total) in self._series.items()]
+
+    def merge(self, snapshot):
+        """Add the series of another process's ``snapshot()``."""
+        with self._lock:
+            for labels, counts, total in snapshot:
+                series = self._series.setdefault(tuple(labels), [[0] * (len(self.buckets) + 1), 0.0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket'
+                             f'{_format_labels(self.labelnames + ("le",), labels + (_format_value(bound),))} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class Metrics:
+    """Request/stage timings plus values collected from other components at scrape time.
+
+    ``observe_request`` is called once per HTTP request; ``stage`` times a
+    block (CSV load, preprocessing, predict_proba, serialization, ...) and
+    also records it for the request in progress, so the app can report a
+    per-request breakdown. Collectors are callables returning
+    ``[(name, type, help, [(labels_dict, value), ...]), ...]``.
+
+    Under gunicorn every worker keeps its own numbers, so each one writes
+    them to ``<directory>/<pid>.json`` (see ``flush``) and ``render`` merges
+    the files of all workers: histograms and counters are summed, also over
+    workers that have exited, and the gauges of per-worker collectors get a
+    ``pid`` label (live workers only). Other collectors describe shared
+    state and are sampled once by the scraped worker.
+    """
+
+    def __init__(self, prefix='student_app', directory=METRICS_DIR):
+        self.prefix = prefix
+        self.directory = directory or None
+        self.requests, self.stages = self._histograms()
+        self._collectors = []
+        self._worker_collectors = []
+        self._flush_lock = threading.Lock()
+        self._flushed = 0.0
+
+    def _histograms(self):
+        prefix = self.prefix
+        return (Histogram(f'{prefix}_request_duration_seconds', 'HTTP request latency by endpoint.',
+                          ('endpoint', 'method', 'status')),
+                Histogram(f'{prefix}_stage_duration_seconds', 'Time spent in internal stages.', ('stage',)))
+
+    def add_collector(self, collector, per_worker=False):
+        """``per_worker`` collectors report this process's own state (caches, loaded model)."""
+        (self._worker_collectors if per_worker else self._collectors).append(collector)
+
+    def observe_request(self, endpoint, method, status, seconds):
+        self.requests.observe(seconds, endpoint, method, str(status))
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages.observe(elapsed, name)
+            timings = getattr(_request, 'timings', None)
+            if timings is not None:
+                timings.append((name, elapsed))
+
+    def begin_request(self):
+        _request.timings = []
+
+    def end_request(self):
+        """Stage timings recorded since begin_request() on this thread."""
+        timings = getattr(_request, 'timings', None) or []
+        _request.timings = None
+        return timings
+
+    @staticmethod
+    def _collect(collectors):
+        families = []
+        for collector in collectors:
+            try:
+                families += collector()
+            except Exception:
+                continue
+        return families
+
+    def _snapshot(self):
+        return {'pid': os.getpid(), 'requests': self.requests.snapshot(), 'stages': self.stages.snapshot(),
+                'families': self._collect(self._worker_collectors)}
+
+    def flush(self, force=False):
+        """Write this process's snapshot for scrapes served by other workers; throttled unless ``force``."""
+        if self.directory is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._flushed < METRICS_FLUSH_SECONDS:
+            return
+        if not self._flush_lock.acquire(blocking=force):
+            return
+        try:
+            self._flushed = now
+            snapshot = self._snapshot()
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{snapshot['pid']}.json")
+            with open(path + '.tmp', 'w') as f:
+                json.dump(snapshot, f, default=float)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            logger.warning("Could not write metrics snapshot to %s: %s", self.directory, e)
+        finally:
+            self._flush_lock.release()
+
+    def start_flusher(self):
+        """Write the snapshot every METRICS_FLUSH_SECONDS from a daemon thread (one per worker, after fork)."""
+        if self.directory is None:
+            return
+        threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_SECONDS)
+            self.flush()
+
+    def reset_directory(self):
+        """Drop the snapshots of a previous run; called once before the workers start."""
+        for path in glob.glob(os.path.join(self.directory, '*.json')) if self.directory else []:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _snapshots(self):
+        if self.directory is None:
+            return [self._snapshot()]
+        self.flush(force=True)
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        requests, stages = self._histograms()
+        merged = {}
+        for snapshot in self._snapshots():
+            requests.merge(snapshot['requests'])
+            stages.merge(snapshot['stages'])
+            pid = snapshot['pid']
+            alive = pid == os.getpid() or _pid_alive(pid)
+            for name, kind, help, samples in snapshot['families']:
+                family = merged.setdefault(name, (kind, help, {}))
+                for labels, value in samples:
+                    if kind == 'counter':
+                        key = tuple(sorted(labels.items()))
+                        family[2][key] = family[2].get(key, 0) + value
+                    elif alive:
+                        if self.directory is not None:
+                            labels = {**labels, 'pid': str(pid)}
+                        family[2][tuple(labels.items())] = value
+        families = [(name, kind, help, [(dict(labels), value) for labels, value in samples.items()])
+                    for name, (kind, help, samples) in merged.items()]
+        lines = requests.render() + stages.render()
+        for name, kind, help, samples in families + self._collect(self._collectors):
+            name = f'{self.prefix}_{name}'
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(tuple(labels), tuple(labels.values()))} '
+                             f'{_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# process-wide instance shared by the app and the modules it calls into
+metrics = Metrics()
+stage = metrics.stage
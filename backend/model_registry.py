@@ -0,0 +1,218 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import joblib
+from fast_encoder import build_verified_encoder, pipeline_proba
+from explain import build_explainer
+from compact_runtime import CompactModel
+
+# seconds between checks of model.pkl for a new version
+MODEL_POLL_SECONDS = float(os.environ.get('MODEL_POLL_SECONDS', 2))
+# mmap mode for the compact export's arrays: 'r' maps them from the file so all workers share one copy
+# through the page cache ('' reads them into private memory). The pickle is never mapped: sklearn copies
+# every tree's node arrays when unpickling, so each process holds a private copy of that format anyway
+MODEL_MMAP_MODE = os.environ.get('MODEL_MMAP_MODE', 'r') or None
+# 'pickle' serves the sklearn pipeline; 'compact' serves the flat-array export without loading sklearn
+MODEL_FORMAT = os.environ.get('MODEL_FORMAT', 'pickle')
+
+logger = logging.getLogger(__name__)
+
+
+def process_rss():
+    """Resident set size of this process in bytes (0 when unknown)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # peak rather than current RSS, but the best portable approximation
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return 0
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class LoadedModel:
+    """An immutable snapshot of one loaded model version."""
+
+    def __init__(self, pipeline, version, path, signature, load_seconds, rss_delta=0, mmap_mode=None):
+        self.pipeline = pipeline
+        self.version = version
+        self.path = path
+        self.signature = signature
+        self.load_seconds = load_seconds
+        self.rss_delta = rss_delta
+        self.mmap_mode = mmap_mode
+        self.loaded_at = time.time()
+        # precompiled single-row encoder, None when only the pandas path is safe
+        if isinstance(pipeline, CompactModel):
+            self.encoder = pipeline.record_scorer()
+        else:
+            self.encoder = build_verified_encoder(pipeline, pipeline_proba(pipeline))
+        self._explainer = None
+        self._explainer_built = False
+        self._explainer_lock = threading.Lock()
+
+    @property
+    def explainer(self):
+        # built on first use: it walks every node of every tree once
+        if not self._explainer_built:
+            with self._explainer_lock:
+                if not self._explainer_built:
+                    self._explainer = build_explainer(self.pipeline)
+                    self._explainer_built = True
+        return self._explainer
+
+    def info(self):
+        info = {
+            'version': self.version,
+            'path': self.path,
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 4),
+            'rss_delta_bytes': self.rss_delta,
+            'file_bytes': self.signature[1],
+            'fast_encoder': self.encoder is not None,
+        }
+        if isinstance(self.pipeline, CompactModel):
+            info.update({'format': 'compact', 'loader': 'compact_runtime.CompactModel.load (numpy)',
+                         'mmap_mode': self.mmap_mode, 'shared_bytes': self.pipeline.mapped_bytes})
+        else:
+            # unpickled trees own their node arrays: nothing is shared after a reload
+            info.update({'format': 'pickle', 'loader': 'joblib.load', 'shared_bytes': 0})
+        return info
+
+
+class ModelRegistry:
+    """Keeps the serving model in sync with ``model/model.pkl``.
+
+    A background thread watches the file's mtime/size, hashes it when they
+    change and, if the content is new, unpickles it off the serving path and
+    swaps the reference in one assignment. A compact export is mapped with
+    ``MODEL_MMAP_MODE`` and shared by every worker; an unpickled pipeline
+    copies its tree nodes, so a reloaded pickle is private to each worker
+    (only the model loaded before a preloading server forks is shared,
+    copy-on-write). Request handlers call
+    :meth:`current` once and keep using that snapshot, so in-flight requests
+    finish on the model they started with.
+    """
+
+    def __init__(self, path, poll_seconds=MODEL_POLL_SECONDS, mmap_mode=MODEL_MMAP_MODE, model_format='pickle'):
+        self.path = path
+        self.model_format = model_format
+        self.poll_seconds = poll_seconds
+        self.mmap_mode = mmap_mode
+        self._current = None
+        self._signature = None
+        self._load_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self.last_error = None
+
+    def current(self):
+        """Return the active LoadedModel (or None). Never blocks."""
+        return self._current
+
+    def info(self):
+        current = self._current
+        return {
+            'loaded': current is not None,
+            'model': current.info() if current is not None else None,
+            'last_error': self.last_error,
+            'process_rss_bytes': process_rss(),
+            'pid': os.getpid(),
+        }
+
+    def add_listener(self, callback):
+        """Call ``callback(new_model)`` after every swap."""
+        self._listeners.append(callback)
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def refresh(self):
+        """Load the model file if it changed; returns True when a new version was swapped in."""
+        with self._load_lock:
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                return False
+            try:
+                version = file_digest(self.path)[:12]
+                current = self._current
+                if current is not None and current.version == version:
+                    # touched but identical content: nothing to load
+                    self._signature = signature
+                    return False
+                rss_before = process_rss()
+                start = time.perf_counter()
+                if self.model_format == 'compact':
+                    pipeline, mmap_mode = CompactModel.load(self.path, self.mmap_mode), self.mmap_mode
+                else:
+                    pipeline, mmap_mode = joblib.load(self.path), None
+                # training progress output (verbose=1) would otherwise be written on every prediction
+                steps = getattr(pipeline, 'named_steps', {})
+                if hasattr(steps.get('clf'), 'verbose'):
+                    steps['clf'].verbose = 0
+                loaded = LoadedModel(pipeline, version, self.path, signature, time.perf_counter() - start,
+                                     rss_delta=process_rss() - rss_before, mmap_mode=mmap_mode)
+            except Exception as e:
+                # keep serving the previous model; retry on the next change
+                self.last_error = str(e)
+                self._signature = signature
+                logger.error("Could not load model: %s", e)
+                return False
+            self._current = loaded
+            self._signature = signature
+            self.last_error = None
+        how = f'compact format, mmap_mode={mmap_mode}' if self.model_format == 'compact' else 'pickle'
+        logger.info("Model %s loaded in %.2fs (+%.1f MB RSS, %s) from %s", loaded.version,
+                    loaded.load_seconds, loaded.rss_delta / 2**20, how, self.path)
+        for callback in list(self._listeners):
+            try:
+                callback(loaded)
+            except Exception as e:
+                logger.exception("Model listener failed: %s", e)
+        return True
+
+    def start(self):
+        """Start the background watcher (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        """Re-arm the registry in a forked worker: fresh locks and a watcher thread of its own."""
+        # the parent's watcher thread does not exist in the child and may have held these
+        self._load_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.start()
+
+    def wake(self):
+        """Ask the watcher to check the file now instead of at the next poll."""
+        self._wake.set()
+
+    def _watch(self):
+        while True:
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.exception("Model watcher error: %s", e)
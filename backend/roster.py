@@ -0,0 +1,351 @@
+import base64
+import operator
+import os
+import re
+import threading
+import logging
+import numpy as np
+import pandas as pd
+from catalog import DatasetCatalog, DEFAULT_FILE, DEFAULT_SHARD
+from metrics import stage
+from storage import read_frame
+
+logger = logging.getLogger(__name__)
+
+CANONICAL_FILE = DEFAULT_FILE
+
+
+def find_data_files(data_dir):
+    # canonical students.csv (written by /api/upload) first, then any other CSV
+    try:
+        names = sorted(f for f in os.listdir(data_dir) if f.lower().endswith('.csv'))
+    except FileNotFoundError:
+        return []
+    if CANONICAL_FILE in names:
+        names.remove(CANONICAL_FILE)
+        names.insert(0, CANONICAL_FILE)
+    return [os.path.join(data_dir, f) for f in names]
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def normalize_roster(df):
+    # assume student_id column exists or assign by index
+    if 'student_id' not in df.columns:
+        df = df.copy()
+        df.insert(0, 'student_id', range(1001, 1001 + len(df)))
+    return df
+
+
+class _Shard:
+    def __init__(self, name, path, signature, frame, index):
+        self.name = name
+        self.path = path
+        self.signature = signature
+        self.frame = frame
+        self.index = index
+
+
+class RosterStore:
+    """Process-wide cache of the student roster, one entry per catalog shard.
+
+    Each shard is parsed once and kept in memory with a hash index from
+    ``student_id`` (as a stripped string) to row position; a shard is
+    re-read only when its own file's mtime or size changed. Id lookups go
+    through the catalog's id index to the shards that hold the id and
+    then through those shards' indexes, so a login does not load the other
+    shards. ``frame()`` is the concatenation of all shards, rebuilt only
+    when one of them changed.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.catalog = DatasetCatalog(data_dir)
+        self._lock = threading.Lock()
+        self._shards = {}
+        self._frame = None
+        self._frame_signature = None
+        self._orders = {}
+        self.version = 0
+
+    def _sources(self):
+        sources = self.catalog.select()
+        if sources:
+            return sources
+        # no catalog and no students.csv: the first other CSV in data/, as before the catalog
+        return [(DEFAULT_SHARD, path) for path in find_data_files(self.data_dir)[:1]]
+
+    @staticmethod
+    def _signatures(sources):
+        signatures = []
+        for name, path in sources:
+            try:
+                signatures.append((name,) + file_signature(path))
+            except OSError:
+                continue
+        return tuple(signatures)
+
+    @staticmethod
+    def _build_index(df):
+        index = {}
+        # keep the first occurrence of duplicated ids, like the old linear scan
+        for pos, key in enumerate(df['student_id'].astype(str).str.strip()):
+            index.setdefault(key, pos)
+        return index
+
+    def _shard(self, name, path):
+        """The loaded shard, re-read only when its file changed; None when it cannot be read."""
+        try:
+            signature = file_signature(path)
+        except OSError:
+            return None
+        shard = self._shards.get(name)
+        if shard is not None and shard.signature == signature:
+            return shard
+        with self._lock:
+            shard = self._shards.get(name)
+            if shard is not None and shard.signature == signature:
+                return shard
+            try:
+                with stage('roster_load'):
+                    df = normalize_roster(read_frame(path))
+            except Exception as e:
+                logger.warning("Error reading file %s: %s", path, e)
+                return None
+            shard = self._shards[name] = _Shard(name, path, signature, df, self._build_index(df))
+        logger.info("Loaded roster shard %s (%s) with %d records", name, path, len(df))
+        return shard
+
+    def frame(self):
+        """Return the current roster DataFrame (all shards), or None when no data exists."""
+        sources = self._sources()
+        signature = self._signatures(sources)
+        if signature == self._frame_signature:
+            return self._frame
+        frames = [shard.frame for shard in (self._shard(name, path) for name, path in sources) if shard is not None]
+        if not frames:
+            frame = None
+        elif len(frames) == 1:
+            frame = frames[0]
+        else:
+            frame = pd.concat(frames, ignore_index=True)
+        with self._lock:
+            self._frame, self._frame_signature = frame, signature
+            self._orders = {}
+            self.version += 1
+        return frame
+
+    def shard_frame(self, name):
+        """The rows of one shard, or None when it does not exist."""
+        # the legacy fallback file stands in for 'default' until something is uploaded
+        path = dict(self._sources()).get(name) or self.catalog.shard_path(name)
+        shard = self._shard(name, path)
+        return shard.frame if shard is not None else None
+
+    def lookup(self, student_id):
+        """Return the roster row for ``student_id`` as a dict, or None."""
+        key = str(student_id).strip()
+        sources = dict(self._sources())
+        for name in self.catalog.route(key, list(sources)):
+            shard = self._shard(name, sources[name])
+            pos = shard.index.get(key) if shard is not None else None
+            if pos is not None:
+                return shard.frame.iloc[pos].to_dict()
+        return None
+
+    def sorted_positions(self, frame, column, descending=False):
+        """Row positions of ``frame`` ordered by ``column``; cached until the roster changes."""
+        orders = self._orders
+        key = (id(frame), column, descending)
+        order = orders.get(key)
+        if order is None:
+            values = frame[column]
+            # stable sort, missing values last in both directions
+            order = values.reset_index(drop=True).sort_values(
+                ascending=not descending, kind='stable', na_position='last').index.to_numpy()
+            orders[key] = order
+        return order
+
+    def signature(self):
+        """``(shard, path, mtime_ns, size)`` of every shard file, or None without data; only stats files."""
+        return self._signatures(self._sources()) or None
+
+    def find_ids(self, ids, exclude=None):
+        """``{shard: [ids]}`` of ``ids`` already stored in shards other than ``exclude``.
+
+        Only shards whose id index holds one of ``ids`` are opened, so an
+        upload of new ids does not load the other shards.
+        """
+        keys = pd.Series(ids).astype(str).str.strip()
+        if keys.empty:
+            return {}
+        sources = dict(self._sources())
+        found = {}
+        for name in self.catalog.locate([n for n in sources if n != exclude], keys):
+            shard = self._shard(name, sources[name])
+            if shard is None:
+                continue
+            index = shard.index
+            hits = keys[np.fromiter((key in index for key in keys), bool, len(keys))]
+            if len(hits):
+                found[name] = hits.tolist()
+        return found
+
+    def __contains__(self, student_id):
+        return self.lookup(student_id) is not None
+
+    def replace(self, df, path, name=DEFAULT_SHARD):
+        """Install a freshly written shard without re-reading it from disk."""
+        df = normalize_roster(df)
+        shard = _Shard(name, path, file_signature(path), df, self._build_index(df))
+        with self._lock:
+            self._shards[name] = shard
+            self._frame_signature = None
+
+    def invalidate(self, name=None):
+        """Forget one shard (or all of them) so it is re-read on next access."""
+        with self._lock:
+            if name is None:
+                self._shards = {}
+            else:
+                self._shards.pop(name, None)
+            self._frame_signature = None
+
+
+# ---------------------------------------------------------------------------
+# teacher-side queries: filter / sort / project / paginate
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+QUERY_PARAMS = {'limit', 'offset', 'cursor', 'sort', 'filter', 'fields'}
+# response options that are not part of the query itself
+RESPONSE_PARAMS = {'format'}
+_FILTER_RE = re.compile(r'^\s*(\w+)\s*(>=|<=|!=|==|=|<|>)\s*(.*?)\s*$')
+_OPS = {
+    '=': operator.eq, '==': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+class QueryError(ValueError):
+    """Invalid filter/sort/fields/paging parameters."""
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(f'o:{offset}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        kind, value = raw.split(':', 1)
+        if kind != 'o':
+            raise ValueError(kind)
+        return int(value)
+    except Exception:
+        raise QueryError('Invalid cursor')
+
+
+class RosterQuery:
+    """Parsed ``/api/students`` query parameters.
+
+    ``filter`` takes expressions such as ``result=Fail`` or
+    ``prediction_probability<0.4`` (repeatable); any other parameter named
+    after a column is an equality filter. ``sort`` is a column name,
+    prefixed with ``-`` for descending. ``fields`` is a comma-separated
+    projection. Paging uses ``limit`` with ``offset`` or an opaque ``cursor``.
+    """
+
+    def __init__(self, filters=(), sort=None, descending=False, fields=None,
+                 offset=0, limit=DEFAULT_PAGE_SIZE):
+        self.filters = list(filters)
+        self.sort = sort
+        self.descending = descending
+        self.fields = fields
+        self.offset = offset
+        self.limit = limit
+
+    @staticmethod
+    def is_paged(args, columns):
+        return any(k in QUERY_PARAMS or k in columns for k in args.keys())
+
+    @classmethod
+    def from_args(cls, args, columns):
+        columns = set(columns)
+        filters = []
+        for expr in args.getlist('filter'):
+            m = _FILTER_RE.match(expr)
+            if not m:
+                raise QueryError(f'Invalid filter: {expr}')
+            filters.append((m.group(1), m.group(2), m.group(3)))
+        for key in args.keys():
+            if key not in QUERY_PARAMS and key not in RESPONSE_PARAMS:
+                filters.extend((key, '=', value) for value in args.getlist(key))
+        for col, _, _ in filters:
+            if col not in columns:
+                raise QueryError(f'Unknown filter column: {col}')
+
+        sort = args.get('sort') or None
+        descending = False
+        if sort and sort.startswith('-'):
+            sort, descending = sort[1:], True
+        if sort and sort not in columns:
+            raise QueryError(f'Unknown sort column: {sort}')
+
+        fields = None
+        if args.get('fields'):
+            fields = [f.strip() for f in args['fields'].split(',') if f.strip()]
+            unknown = [f for f in fields if f not in columns]
+            if unknown:
+                raise QueryError(f'Unknown fields: {", ".join(unknown)}')
+
+        try:
+            limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+            offset = decode_cursor(args['cursor']) if args.get('cursor') else int(args.get('offset', 0))
+        except ValueError:
+            raise QueryError('limit and offset must be integers')
+        if limit < 1 or offset < 0:
+            raise QueryError('limit must be positive and offset non-negative')
+        return cls(filters, sort, descending, fields, offset, min(limit, MAX_PAGE_SIZE))
+
+
+def _filter_mask(df, col, op, raw):
+    series = df[col]
+    if series.dtype.kind in 'biuf':
+        try:
+            value = float(raw)
+        except ValueError:
+            raise QueryError(f'Filter value for {col} must be numeric')
+        return _OPS[op](series, value).to_numpy()
+    if op not in ('=', '==', '!='):
+        raise QueryError(f'Only = and != are supported for text column {col}')
+    mask = (series.astype(str) == raw).to_numpy()
+    return mask if op != '!=' else ~mask
+
+
+def run_query(store, query):
+    """Apply ``query`` to the roster; returns ``(page_frame, total_matches)``."""
+    df = store.frame()
+    if df is None:
+        return None, 0
+    order = store.sorted_positions(df, query.sort, query.descending) if query.sort else None
+    mask = None
+    for col, op, raw in query.filters:
+        m = _filter_mask(df, col, op, raw)
+        mask = m if mask is None else mask & m
+    if order is None:
+        positions = np.flatnonzero(mask) if mask is not None else None
+    else:
+        positions = order[mask[order]] if mask is not None else order
+    total = len(df) if positions is None else len(positions)
+    stop = query.offset + query.limit
+    if positions is None:
+        page = df.iloc[query.offset:stop]
+    else:
+        page = df.iloc[positions[query.offset:stop]]
+    if query.fields:
+        page = page[query.fields]
+    return page, total
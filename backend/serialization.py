@@ -0,0 +1,47 @@
+import json
+from flask import Response
+from metrics import stage
+
+# rows per NDJSON block when streaming a frame
+NDJSON_CHUNK_ROWS = 10000
+
+
+def frame_json(df):
+    """Serialize ``df`` as a JSON array of records using pandas' C encoder.
+
+    Works column-wise on the underlying arrays, so no per-row Python dicts are
+    built. NaN/None become ``null`` and NumPy scalars are handled natively.
+    """
+    with stage('serialize'):
+        return df.to_json(orient='records', double_precision=15, date_format='iso', default_handler=str)
+
+
+def frame_response(df, status=200):
+    """JSON array response for a DataFrame, same shape as ``jsonify(df.to_dict('records'))``."""
+    return Response(frame_json(df), status=status, mimetype='application/json')
+
+
+def envelope_response(fields, frames, status=200):
+    """JSON object response mixing plain values and DataFrame-valued keys.
+
+    ``fields`` are dumped with the stdlib encoder; each entry of ``frames``
+    is spliced in as an already-serialized records array.
+    """
+    parts = [f'{json.dumps(k)}:{frame_json(v)}' for k, v in frames.items()]
+    parts += [f'{json.dumps(k)}:{json.dumps(v)}' for k, v in fields.items()]
+    return Response('{' + ','.join(parts) + '}', status=status, mimetype='application/json')
+
+
+def ndjson_response(df, chunk_rows=NDJSON_CHUNK_ROWS):
+    """Stream ``df`` as newline-delimited JSON, one record per line.
+
+    Rows are serialized in blocks so peak memory is bounded by the block
+    size rather than the whole response.
+    """
+    def generate():
+        for start in range(0, len(df), chunk_rows):
+            with stage('serialize'):
+                block = df.iloc[start:start + chunk_rows].to_json(
+                    orient='records', lines=True, double_precision=15, date_format='iso', default_handler=str)
+            yield block if block.endswith('\n') else block + '\n'
+    return Response(generate(), mimetype='application/x-ndjson')
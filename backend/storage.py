@@ -0,0 +1,149 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+from features import NUMERIC_FIELDS, CATEGORICAL_FIELDS
+
+# pyarrow is optional: without it every reader falls back to the CSV
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the deployment
+    pa = pq = None
+
+COLUMNAR_EXT = '.parquet'
+# low-cardinality text columns stored dictionary-encoded
+DICTIONARY_COLUMNS = CATEGORICAL_FIELDS + ['result']
+
+logger = logging.getLogger(__name__)
+
+
+def columnar_available():
+    return pq is not None
+
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + COLUMNAR_EXT
+
+
+def columnar_is_fresh(csv_path):
+    """True when a binary copy exists and is at least as new as the CSV."""
+    path = columnar_path(csv_path)
+    if pq is None or not os.path.exists(path):
+        return False
+    try:
+        return os.stat(path).st_mtime_ns >= os.stat(csv_path).st_mtime_ns
+    except FileNotFoundError:
+        return True
+
+
+def to_columnar_frame(df):
+    """Convert a roster frame to compact dtypes before writing it out.
+
+    Categorical fields become pandas categories (dictionary-encoded in
+    Parquet), integral numeric fields become int32 and other numerics stay
+    float64 so that values read back exactly as they were uploaded.
+    """
+    df = df.copy()
+    for col in NUMERIC_FIELDS:
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors='coerce')
+        integral = values.notna().all() and bool(np.all(np.mod(values, 1) == 0))
+        if integral and (values.empty or values.abs().max() < 2**31):
+            df[col] = values.astype(np.int32)
+        else:
+            df[col] = values.astype(np.float64)
+    for col in DICTIONARY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def _schema_for(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            # fixed index width so chunks with different cardinalities share one schema
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        fields.append(field)
+    return pa.schema(fields)
+
+
+class ColumnarWriter:
+    """Writes the binary copy of a roster chunk by chunk next to its CSV.
+
+    The schema is fixed by the first chunk. If a later chunk does not fit it
+    (e.g. a column that was integral becomes fractional) the binary copy is
+    abandoned and readers keep using the CSV.
+    """
+
+    def __init__(self, csv_path):
+        self.path = columnar_path(csv_path)
+        self.tmp_path = self.path + '.tmp'
+        self._writer = None
+        self._schema = None
+        self.failed = pq is None
+
+    def write(self, df):
+        if self.failed:
+            return
+        try:
+            df = to_columnar_frame(df)
+            if self._writer is None:
+                self._schema = _schema_for(df)
+                self._writer = pq.ParquetWriter(self.tmp_path, self._schema)
+            self._writer.write_table(pa.Table.from_pandas(df, schema=self._schema, preserve_index=False))
+        except Exception as e:
+            logger.warning("Columnar copy disabled for %s: %s", self.path, e)
+            self.abort()
+
+    def close(self):
+        if self.failed or self._writer is None:
+            self.abort()
+            return False
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+        return True
+
+    def abort(self, keep_existing=False):
+        # keep_existing: the CSV is not replaced either, so its current binary copy stays valid
+        self.failed = True
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+        for path in (self.tmp_path,) if keep_existing else (self.tmp_path, self.path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def write_columnar(df, csv_path):
+    """Store ``df`` as the binary copy of ``csv_path``; returns True on success."""
+    writer = ColumnarWriter(csv_path)
+    writer.write(df)
+    return writer.close()
+
+
+def read_frame(csv_path, columns=None):
+    """Read a roster, preferring its binary copy when that is up to date.
+
+    ``columns`` restricts the load to the listed columns; names that are not
+    present in the file are ignored.
+    """
+    if columnar_is_fresh(csv_path):
+        path = columnar_path(csv_path)
+        try:
+            if columns is not None:
+                available = set(pq.read_schema(path).names)
+                columns = [c for c in columns if c in available]
+            return pq.read_table(path, columns=columns).to_pandas()
+        except Exception as e:
+            logger.warning("Could not read %s, falling back to CSV: %s", path, e)
+    if columns is not None:
+        wanted = set(columns)
+        return pd.read_csv(csv_path, usecols=lambda c: c in wanted)
+    return pd.read_csv(csv_path)
@@ -0,0 +1,182 @@
+"""Cross-validated benchmark / hyperparameter sweep for the pass/fail forest.
+
+    python sweep.py                                  # default grid, 5 folds
+    python sweep.py --trees 25,50,100 --depth none,8 --max-features sqrt,0.5
+    python sweep.py --target-accuracy 0.9 --output model/sweep.csv
+
+Features come encoded from the training feature cache, so repeated sweeps on
+unchanged data skip parsing and encoding; folds only fit forests (the
+preprocessor is fitted once on all rows, which trees are insensitive to
+apart from the set of one-hot levels). Every (configuration, fold) pair is
+fitted in its own task on a process pool sized to the available cores; each
+forest is single-threaded so the pool does not oversubscribe the CPU. The table reports mean accuracy, ROC AUC, fit
+time, predict latency per 1k rows and the uncompressed model size, and the
+smallest then fastest configuration that reaches ``--target-accuracy`` is
+suggested.
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import Pipeline
+from train_model import TrainingError, build_forest, encode_training_data, find_data_file
+
+DEFAULT_TREES = [25, 50, 100, 200]
+DEFAULT_DEPTHS = [None, 8, 16]
+DEFAULT_MAX_FEATURES = ['sqrt', 0.5, None]
+
+_X = _y = _pre = None
+
+
+def _init_worker(X, y, preprocessor):
+    # the encoded training data is shipped once per worker, not once per task
+    global _X, _y, _pre
+    _X, _y, _pre = X, y, preprocessor
+
+
+def _fit_fold(params, train_idx, test_idx):
+    clf = build_forest(params['n_estimators'])
+    clf.set_params(max_depth=params['max_depth'], max_features=params['max_features'], n_jobs=1, verbose=0)
+    start = time.perf_counter()
+    clf.fit(_X[train_idx], _y[train_idx])
+    fit_seconds = time.perf_counter() - start
+
+    X_test, y_test = _X[test_idx], _y[test_idx]
+    start = time.perf_counter()
+    proba = clf.predict_proba(X_test)
+    predict_seconds = time.perf_counter() - start
+    classes = list(clf.classes_)
+    pass_proba = proba[:, classes.index(1)] if 1 in classes else np.zeros(len(X_test))
+    predicted = np.asarray(classes)[proba.argmax(axis=1)]
+
+    fd, path = tempfile.mkstemp(suffix='.pkl')
+    os.close(fd)
+    try:
+        # the full pipeline in the format train_model.py ships
+        joblib.dump(Pipeline([('pre', _pre), ('clf', clf)]), path, compress=0)
+        size = os.path.getsize(path)
+    finally:
+        os.remove(path)
+    return {
+        'accuracy': accuracy_score(y_test, predicted),
+        'auc': roc_auc_score(y_test, pass_proba) if len(np.unique(y_test)) == 2 else np.nan,
+        'fit_seconds': fit_seconds,
+        'predict_ms_per_1k': predict_seconds * 1000 * 1000 / max(len(X_test), 1),
+        'model_bytes': size,
+    }
+
+
+def grid(trees, depths, max_features):
+    return [{'n_estimators': t, 'max_depth': d, 'max_features': m}
+            for t, d, m in itertools.product(trees, depths, max_features)]
+
+
+def run_sweep(X, y, preprocessor, configs, folds=5, workers=None):
+    """Cross-validate every config on encoded ``X``; returns one row of mean metrics per config."""
+    X, y = np.asarray(X), np.asarray(y)
+    # never ask for more folds than the rarest class has rows
+    folds = max(2, min(folds, int(np.bincount(y).min())))
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=42).split(X, y))
+    workers = workers or os.cpu_count() or 1
+    tasks = [(i, params, train_idx, test_idx)
+             for i, params in enumerate(configs) for train_idx, test_idx in splits]
+    print(f"Running {len(configs)} configurations x {folds} folds on {workers} processes...")
+    results = [[] for _ in configs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y, preprocessor)) as pool:
+        futures = [(i, pool.submit(_fit_fold, params, train_idx, test_idx))
+                   for i, params, train_idx, test_idx in tasks]
+        for i, future in futures:
+            results[i].append(future.result())
+
+    rows = []
+    for params, fold_results in zip(configs, results):
+        scores = pd.DataFrame(fold_results)
+        rows.append({
+            **{key: 'none' if value is None else value for key, value in params.items()},
+            'accuracy': scores['accuracy'].mean(),
+            'accuracy_std': scores['accuracy'].std(ddof=0),
+            'auc': scores['auc'].mean(),
+            'fit_seconds': scores['fit_seconds'].mean(),
+            'predict_ms_per_1k': scores['predict_ms_per_1k'].mean(),
+            'model_bytes': int(scores['model_bytes'].mean()),
+        })
+    return pd.DataFrame(rows)
+
+
+def pick(table, target_accuracy):
+    """Smallest, then fastest-predicting, configuration reaching ``target_accuracy``."""
+    ok = table[table['accuracy'] >= target_accuracy]
+    if ok.empty:
+        return None
+    return ok.sort_values(['model_bytes', 'predict_ms_per_1k']).iloc[0]
+
+
+def _parse_list(text, cast):
+    values = []
+    for item in text.split(','):
+        item = item.strip()
+        values.append(None if item.lower() == 'none' else cast(item))
+    return values
+
+
+def _max_features(value):
+    try:
+        number = float(value)
+    except ValueError:
+        return value  # 'sqrt' / 'log2'
+    return int(number) if number.is_integer() and number > 1 else number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cross-validated sweep over random forest settings.')
+    parser.add_argument('--data', help='data file (default: the one train_model.py would use)')
+    parser.add_argument('--shards', help='comma separated catalog shards to sweep on (default: all)')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--trees', default=','.join(map(str, DEFAULT_TREES)))
+    parser.add_argument('--depth', default=','.join(str(d) for d in DEFAULT_DEPTHS))
+    parser.add_argument('--max-features', default=','.join(str(m) for m in DEFAULT_MAX_FEATURES))
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: all cores)')
+    parser.add_argument('--target-accuracy', type=float, default=None)
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'model', 'sweep.csv'))
+    args = parser.parse_args(argv)
+
+    try:
+        data_file = args.data or find_data_file(args.shards.split(',') if args.shards else None)
+        if data_file is None:
+            print('No data file (CSV or Excel) found in data/ to benchmark on.')
+            sys.exit(1)
+        dataset = encode_training_data(data_file)
+    except TrainingError as e:
+        print(str(e))
+        sys.exit(1)
+
+    configs = grid(_parse_list(args.trees, int), _parse_list(args.depth, int),
+                   _parse_list(args.max_features, _max_features))
+    table = run_sweep(dataset.X, dataset.y, dataset.preprocessor, configs, folds=args.folds, workers=args.workers)
+    table = table.sort_values(['accuracy', 'model_bytes'], ascending=[False, True])
+    table.to_csv(args.output, index=False)
+
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(table.to_string(index=False, float_format=lambda v: f'{v:.4f}'))
+    print(f"\nResults written to {args.output}")
+    if args.target_accuracy is not None:
+        best = pick(table, args.target_accuracy)
+        if best is None:
+            print(f"No configuration reached accuracy {args.target_accuracy}")
+        else:
+            print(f"Smallest configuration with accuracy >= {args.target_accuracy}: "
+                  f"n_estimators={best['n_estimators']}, max_depth={best['max_depth']}, "
+                  f"max_features={best['max_features']} ({best['model_bytes'] / 2**20:.2f} MB, "
+                  f"{best['predict_ms_per_1k']:.2f} ms per 1k rows)")
+
+
+if __name__ == '__main__':
+    main()
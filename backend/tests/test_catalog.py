@@ -0,0 +1,109 @@
+import os
+import pandas as pd
+import pytest
+from catalog import ShardStats
+from ingest import IngestError, UploadIds, ingest_csv_stream
+from roster import RosterStore
+
+
+def student_rows(ids):
+    n = len(ids)
+    return pd.DataFrame({
+        'student_id': ids,
+        'Hours_Studied': [6] * n, 'Attendance': [80] * n, 'Parental_Involvement': ['High'] * n,
+        'Access_to_Resources': ['High'] * n, 'Previous_Scores': [70] * n, 'Internet_Access': ['Yes'] * n,
+        'Tutoring_Sessions': [1] * n, 'Family_Income': [50000] * n, 'Peer_Influence': ['Positive'] * n,
+        'Learning_Disabilities': ['No'] * n, 'Parental_Education_Level': ['College'] * n,
+        'Distance_from_Home': [5] * n, 'Gender': ['Female'] * n, 'result': ['Pass'] * n,
+    })
+
+
+def write_shard(store, name, df):
+    path = store.catalog.shard_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_csv(path, index=False)
+    stats = ShardStats()
+    stats.add(df)
+    store.catalog.record(name, stats)
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = RosterStore(str(tmp_path))
+    write_shard(store, 'class-a', student_rows(list(range(5001, 5011))))
+    write_shard(store, 'class-b', student_rows(list(range(9001, 9011))))
+    return store
+
+
+def test_find_ids_reports_ids_stored_in_other_shards(store):
+    assert store.find_ids([5003, 7000, 5004], exclude='class-b') == {'class-a': ['5003', '5004']}
+    # a shard's own ids are not conflicts
+    assert store.find_ids([5003], exclude='class-a') == {}
+
+
+def test_find_ids_skips_shards_that_do_not_hold_the_ids(store):
+    assert store.find_ids([7000, 7001], exclude='class-b') == {}
+    # the id index rules class-a out, so it was never loaded
+    assert 'class-a' not in store._shards
+
+
+def test_lookup_routes_interleaved_and_text_ids_through_the_index(tmp_path):
+    store = RosterStore(str(tmp_path))
+    write_shard(store, 'odd', student_rows([1, 3, 5, 'S-7']))
+    write_shard(store, 'even', student_rows([2, 4, 6, 'S-8']))
+    assert store.catalog.route('4', ['odd', 'even']) == ['even']
+    assert store.catalog.route(' S-7', ['odd', 'even']) == ['odd']
+    assert store.lookup('S-8')['student_id'] == 'S-8'
+    assert store.find_ids(['3', 'S-9'], exclude='even') == {'odd': ['3']}
+    # neither shard holds these, so neither was loaded
+    store.invalidate()
+    assert store.lookup('S-9') is None and store.find_ids([7, 'x'], exclude='odd') == {}
+    assert store._shards == {}
+
+
+def test_record_accepts_a_manifest_without_shards(tmp_path):
+    store = RosterStore(str(tmp_path))
+    os.makedirs(store.catalog.directory)
+    with open(os.path.join(store.catalog.directory, 'manifest.json'), 'w') as f:
+        f.write('{}')
+    write_shard(store, 'class-a', student_rows([5001]))
+    assert store.catalog.manifest()['class-a']['rows'] == 1
+
+
+def test_find_ids_searches_shards_edited_outside_the_catalog(store):
+    # the manifest range of class-a no longer matches its file
+    student_rows(list(range(5001, 5011)) + [7000]).to_csv(store.catalog.shard_path('class-a'), index=False)
+    assert store.find_ids([7000], exclude='class-b') == {'class-a': ['7000']}
+
+
+def test_rejected_stream_leaves_the_shard_unchanged(store, tmp_path):
+    upload = tmp_path / 'upload.csv'
+    student_rows([9001, 5005]).to_csv(upload, index=False)
+    output_path = store.catalog.shard_path('class-b')
+    before = open(output_path).read()
+
+    def check_ids(rows):
+        if store.find_ids(rows['student_id'], exclude='class-b'):
+            raise IngestError('duplicate ids')
+
+    with pytest.raises(IngestError):
+        ingest_csv_stream(str(upload), output_path, None, validate=check_ids)
+    assert open(output_path).read() == before
+    assert not os.path.exists(output_path + '.tmp')
+    assert store.lookup('5005')['student_id'] == 5005
+
+
+def test_stream_rejects_ids_repeated_in_a_later_chunk(store, tmp_path):
+    upload = tmp_path / 'upload.csv'
+    student_rows([7001, 7002, 7003, 7001]).to_csv(upload, index=False)
+    output_path = store.catalog.shard_path('class-b')
+    before = open(output_path).read()
+    collected = []
+
+    with pytest.raises(IngestError, match='7001'):
+        ingest_csv_stream(str(upload), output_path, None, chunk_rows=2,
+                          on_chunk=collected.append, validate=UploadIds().check)
+    assert open(output_path).read() == before
+    # the first chunk was collected before the second one was rejected; the caller discards it
+    assert len(collected) == 1
@@ -0,0 +1,35 @@
+import numpy as np
+from compact_model import export_arrays, save_compact
+from compact_runtime import CompactModel
+from fast_encoder import pipeline_proba
+from features import prepare_features
+from test_fast_encoder import fitted_pipeline, json_payloads
+
+
+def exported(tmp_path, **options):
+    pipeline, X = fitted_pipeline()
+    path = str(tmp_path / 'model.compact.npz')
+    save_compact(*export_arrays(pipeline, **options), path=path)
+    return pipeline, X, path
+
+
+def test_compact_runtime_matches_the_pipeline(tmp_path):
+    pipeline, X, path = exported(tmp_path)
+    X = prepare_features(X)
+    expected = pipeline.predict_proba(X)
+    for mmap_mode in (None, 'r'):
+        compact = CompactModel.load(path, mmap_mode)
+        np.testing.assert_array_equal(compact.predict_proba(X), expected)
+        np.testing.assert_array_equal(compact.predict(X), pipeline.predict(X))
+    # the mapped model shares every node array with the file
+    assert compact.mapped_bytes == compact.nbytes
+
+
+def test_compact_record_scorer_matches_the_pipeline(tmp_path):
+    pipeline, X, path = exported(tmp_path)
+    scorer = CompactModel.load(path).record_scorer()
+    payloads = json_payloads(X.head(30)) + [{**json_payloads(X.head(1))[0], 'Gender': None, 'Attendance': None}]
+    got = np.vstack([scorer.predict_proba(payload) for payload in payloads])
+    np.testing.assert_array_equal(got, pipeline_proba(pipeline)(payloads))
+    # numeric strings need pandas' parsing rules
+    assert scorer.predict_proba({**payloads[0], 'Hours_Studied': '6'}) is None
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+import drift
+from drift import DriftMonitor, build_reference, save_reference
+from features import CATEGORICAL_FIELDS, FEATURES
+
+
+def feature_rows(n, seed, shift=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({field: rng.choice(['Low', 'Medium', 'High'], n) if field in CATEGORICAL_FIELDS
+                         else rng.integers(0, 100, n) + shift for field in FEATURES})
+
+
+@pytest.fixture
+def workers(tmp_path):
+    # two gunicorn workers: separate monitors over the same model directory
+    reference_path = str(tmp_path / 'model.drift.json')
+    save_reference(build_reference(feature_rows(2000, 0)), reference_path)
+    monitors = [DriftMonitor(reference_path, str(tmp_path / 'drift.windows.npz')) for _ in range(2)]
+    for monitor in monitors:
+        monitor.load()
+    return monitors
+
+
+def test_upload_drift_is_reported_by_every_worker(workers):
+    first, second = workers
+    first.observe('upload', feature_rows(1000, 1, shift=60), prepared=True, flush=True)
+    report = second.report()
+    assert report['sources']['upload']['window_rows'] == 1000
+    assert report['retrain_recommended']
+    assert first.report()['sources'] == report['sources']
+
+
+def test_buffered_predictions_reach_the_shared_windows(workers, monkeypatch):
+    first, second = workers
+    monkeypatch.setattr(drift, 'DRIFT_FLUSH_SECONDS', 3600)
+    first.observe('predict', feature_rows(300, 2), prepared=True)
+    second.observe('predict', feature_rows(200, 3), prepared=True)
+    # still buffered in the first worker
+    assert second.report()['sources']['predict']['window_rows'] == 200
+    first.flush()
+    report = second.report()
+    assert report['sources']['predict']['window_rows'] == 500
+    assert not report['retrain_recommended']
+
+
+def test_staged_upload_rows_wait_for_commit(workers):
+    first, second = workers
+    staged = first.staged()
+    staged.observe(feature_rows(600, 4, shift=60), prepared=True)
+    assert second.report()['sources']['upload']['window_rows'] == 0
+    first.commit('upload', staged)
+    assert second.report()['sources']['upload']['window_rows'] == 600
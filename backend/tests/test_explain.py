@@ -0,0 +1,22 @@
+import numpy as np
+from explain import build_explainer, top_contributions
+from features import FEATURES, prepare_features
+from test_fast_encoder import fitted_pipeline
+
+
+def test_baseline_plus_contributions_is_the_pass_probability():
+    pipeline, X = fitted_pipeline()
+    explainer = build_explainer(pipeline)
+    assert explainer is not None
+    X = prepare_features(X.head(40))
+    baseline, contributions = explainer.explain(X)
+    assert contributions.shape == (40, len(FEATURES))
+    pass_col = list(pipeline.classes_).index(1)
+    np.testing.assert_allclose(baseline + contributions.sum(axis=1), pipeline.predict_proba(X)[:, pass_col],
+                               rtol=0, atol=1e-9)
+
+
+def test_top_contributions_are_ordered_by_absolute_effect():
+    ranked = top_contributions(np.array([0.1, -0.3] + [0.0] * (len(FEATURES) - 2)))
+    assert [item['feature'] for item in ranked[:2]] == [FEATURES[1], FEATURES[0]]
+    assert ranked[0]['contribution'] == -0.3
@@ -0,0 +1,39 @@
+import json
+import numpy as np
+import train_model
+from fast_encoder import build_verified_encoder, pipeline_proba
+from test_incremental import training_rows
+
+
+def fitted_pipeline(n_estimators=10, rows=300, seed=0):
+    X, y = training_rows(rows, seed)
+    clf = train_model.build_pipeline(X, n_estimators=n_estimators)
+    clf.named_steps['clf'].set_params(n_jobs=1, verbose=0)
+    clf.fit(X, y)
+    return clf, X
+
+
+def json_payloads(X):
+    # plain JSON types, as /api/predict receives them
+    return json.loads(X.to_json(orient='records'))
+
+
+def test_compiled_encoder_matches_the_pipeline():
+    pipeline, X = fitted_pipeline()
+    encoder = build_verified_encoder(pipeline, pipeline_proba(pipeline))
+    assert encoder is not None
+    payloads = json_payloads(X.head(50)) + [
+        {**json_payloads(X.head(1))[0], 'Hours_Studied': '7', 'Attendance': None, 'Gender': None},
+        {**json_payloads(X.head(1))[0], 'Previous_Scores': 'n/a', 'Parental_Involvement': 'Unseen level'},
+        {'Hours_Studied': 3},
+    ]
+    got = np.vstack([encoder.predict_proba(payload) for payload in payloads])
+    np.testing.assert_array_equal(got, pipeline_proba(pipeline)(payloads))
+
+
+def test_payloads_the_encoder_cannot_encode_use_the_pandas_path():
+    pipeline, X = fitted_pipeline()
+    encoder = build_verified_encoder(pipeline, pipeline_proba(pipeline))
+    payload = json_payloads(X.head(1))[0]
+    assert encoder.predict_proba({**payload, 'Hours_Studied': [6]}) is None
+    assert encoder.predict_proba({**payload, 'Gender': 1}) is None
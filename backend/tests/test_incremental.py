@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import train_model
+from features import CATEGORICAL_FIELDS, FEATURES
+
+
+def training_rows(n, seed):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({field: rng.choice(['Low', 'Medium', 'High'], n) if field in CATEGORICAL_FIELDS
+                      else rng.integers(0, 100, n) for field in FEATURES})
+    y = pd.Series((X['Previous_Scores'] + rng.integers(-20, 20, n) > 50).astype(int))
+    return X, y
+
+
+def test_retired_windows_keep_tree_seeds_unique(monkeypatch):
+    monkeypatch.setattr(train_model, 'INCREMENT_TREES', 4)
+    monkeypatch.setattr(train_model, 'MAX_TREES', 10)
+    X, y = training_rows(200, 0)
+    clf = train_model.build_pipeline(X, n_estimators=10)
+    clf.named_steps['clf'].set_params(n_jobs=1, verbose=0)
+    clf.fit(X, y)
+    state = {'batches': [10], 'seed': train_model.RANDOM_STATE,
+             'row_hashes': train_model.row_hashes(X, y)}
+
+    for step in range(1, 4):
+        more_X, more_y = training_rows(20, step)
+        X, y = pd.concat([X, more_X], ignore_index=True), pd.concat([y, more_y], ignore_index=True)
+        hashes = train_model.row_hashes(X, y)
+        stats, reason = train_model.train_incremental(clf, state, X, y, hashes)
+        assert reason is None and stats['trees_added'] == 4 and stats['trees_retired'] == 4
+        state['row_hashes'] = hashes
+
+    seeds = [est.random_state for est in clf.named_steps['clf'].estimators_]
+    assert len(seeds) == 10
+    assert len(set(seeds)) == len(seeds)
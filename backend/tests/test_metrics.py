@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+from metrics import Metrics
+
+
+def worker_metrics(directory, hits, entries):
+    metrics = Metrics(directory=str(directory))
+    metrics.add_collector(lambda: [('cache_hits_total', 'counter', 'Hits.', [({}, hits)]),
+                                   ('cache_entries', 'gauge', 'Entries.', [({}, entries)])], per_worker=True)
+    metrics.add_collector(lambda: [('roster_rows', 'gauge', 'Rows.', [({}, 7)])])
+    metrics.requests.observe(0.003, '/api/predict', 'POST', '200')
+    return metrics
+
+
+def write_as(metrics, pid):
+    # the snapshot another worker process would have written
+    snapshot = metrics._snapshot()
+    snapshot['pid'] = pid
+    with open(os.path.join(metrics.directory, f'{pid}.json'), 'w') as f:
+        json.dump(snapshot, f)
+
+
+def test_scrape_merges_every_worker(tmp_path):
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    write_as(worker_metrics(tmp_path, hits=4, entries=40), os.getppid())
+    write_as(worker_metrics(tmp_path, hits=2, entries=20), exited.pid)
+    text = worker_metrics(tmp_path, hits=1, entries=10).render()
+
+    # histograms and counters add up over all workers, including the one that exited
+    assert 'student_app_request_duration_seconds_count{endpoint="/api/predict",method="POST",status="200"} 3' in text
+    assert 'student_app_cache_hits_total 7' in text
+    # gauges are per live worker
+    assert f'student_app_cache_entries{{pid="{os.getppid()}"}} 40' in text
+    assert f'student_app_cache_entries{{pid="{os.getpid()}"}} 10' in text
+    assert f'pid="{exited.pid}"' not in text
+    # shared collectors are sampled once
+    assert text.count('student_app_roster_rows 7') == 1
+
+
+def test_without_a_directory_only_this_process_is_reported():
+    text = worker_metrics('', hits=1, entries=10).render()
+    assert 'student_app_cache_entries 10' in text
+    assert 'student_app_request_duration_seconds_count{endpoint="/api/predict",method="POST",status="200"} 1' in text
@@ -0,0 +1,46 @@
+import os
+import joblib
+from features import normalize_payload
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache
+from test_fast_encoder import fitted_pipeline, json_payloads
+
+
+def test_payloads_that_score_alike_share_a_key():
+    _, X = fitted_pipeline(n_estimators=2)
+    payload = json_payloads(X.head(1))[0]
+    key = normalize_payload(payload)
+    assert normalize_payload({**payload, 'Hours_Studied': str(payload['Hours_Studied']),
+                              'Attendance': float(payload['Attendance'])}) == key
+    # missing values normalize like prepare_features() fills them
+    assert normalize_payload({**payload, 'Tutoring_Sessions': None}) == \
+        normalize_payload({**payload, 'Tutoring_Sessions': 'not a number'}) == \
+        normalize_payload({**payload, 'Tutoring_Sessions': 0})
+    assert normalize_payload({**payload, 'Gender': None}) == normalize_payload({**payload, 'Gender': float('nan')})
+    assert normalize_payload({**payload, 'Gender': 'Other'}) != key
+    # values that cannot be normalized safely are not cached
+    assert normalize_payload({**payload, 'Hours_Studied': [6]}) is None
+    assert normalize_payload({**payload, 'Gender': 1}) is None
+
+
+def test_new_model_version_empties_the_cache(tmp_path):
+    path = str(tmp_path / 'model.pkl')
+    cache = PredictionCache()
+    registry = ModelRegistry(path)
+    registry.add_listener(lambda loaded: cache.clear())
+
+    first, X = fitted_pipeline(n_estimators=2, seed=0)
+    joblib.dump(first, path)
+    assert registry.refresh()
+    key = (registry.current().version, normalize_payload(json_payloads(X.head(1))[0]))
+    cache.put(key, (1, 0.9))
+    assert cache.get(key) == (1, 0.9)
+
+    invalidations = cache.stats()['invalidations']
+    second, _ = fitted_pipeline(n_estimators=3, seed=1)
+    joblib.dump(second, path)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert registry.refresh()
+    assert registry.current().version != key[0]
+    assert cache.stats()['size'] == 0 and cache.stats()['invalidations'] == invalidations + 1
+    assert cache.get(key) is None
@@ -0,0 +1,57 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+from roster import QueryError, RosterQuery, RosterStore, encode_cursor, run_query
+from test_catalog import student_rows, write_shard
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = RosterStore(str(tmp_path))
+    df = student_rows(list(range(1, 21)))
+    df['Previous_Scores'] = [55, 90, 40, 72, 90, 38, 61, 84, 47, 90, 66, 59, 95, 42, 70, 81, 35, 90, 50, 77]
+    df['result'] = ['Fail' if i % 3 else 'Pass' for i in range(20)]
+    write_shard(store, 'default', df)
+    return store
+
+
+def query(store, **args):
+    return RosterQuery.from_args(MultiDict(args), store.frame().columns)
+
+
+def test_cursor_pages_cover_the_filtered_sorted_rows_once(store):
+    df = store.frame()
+    expected = df[(df['result'] == 'Fail') & (df['Previous_Scores'] >= 45)] \
+        .sort_values('Previous_Scores', ascending=False, kind='stable')['student_id'].tolist()
+    args = MultiDict([('filter', 'Previous_Scores>=45'), ('result', 'Fail'), ('sort', '-Previous_Scores'),
+                      ('fields', 'student_id,Previous_Scores'), ('limit', '3')])
+    seen, cursor = [], None
+    while True:
+        if cursor is not None:
+            args['cursor'] = cursor
+        q = RosterQuery.from_args(args, df.columns)
+        page, total = run_query(store, q)
+        assert total == len(expected)
+        assert list(page.columns) == ['student_id', 'Previous_Scores'] and len(page) <= 3
+        seen += page['student_id'].tolist()
+        next_offset = q.offset + len(page)
+        if next_offset >= total:
+            break
+        cursor = encode_cursor(next_offset)
+    assert seen == expected
+    # ties keep roster order
+    assert seen[:3] == [2, 5, 18]
+
+
+def test_cursor_and_offset_address_the_same_page(store):
+    by_cursor, _ = run_query(store, query(store, sort='Previous_Scores', limit='4', cursor=encode_cursor(8)))
+    by_offset, _ = run_query(store, query(store, sort='Previous_Scores', limit='4', offset='8'))
+    assert by_cursor['student_id'].tolist() == by_offset['student_id'].tolist()
+
+
+@pytest.mark.parametrize('args', [
+    {'cursor': 'not-a-cursor'}, {'sort': 'nope'}, {'fields': 'student_id,nope'},
+    {'filter': 'Previous_Scores>>1'}, {'filter': 'result<Pass'}, {'limit': '0'},
+])
+def test_invalid_queries_raise(store, args):
+    with pytest.raises(QueryError):
+        run_query(store, query(store, **args))
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from ingest import ingest_upsert
+from test_catalog import student_rows
+
+
+class RecordingModel:
+    """Passes students with Previous_Scores >= 50 and remembers every row it scored."""
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self):
+        self.scored = []
+
+    def predict_proba(self, X):
+        self.scored.append(X.copy())
+        passed = X['Previous_Scores'].to_numpy(np.float64) >= 50
+        return np.column_stack([~passed, passed]).astype(np.float64)
+
+
+def stored_roster():
+    existing = student_rows([1, 2, 3, 4])
+    existing['prediction_probability'] = 1.0
+    existing['Previous_Scores'] = existing['Previous_Scores'].astype(object)
+    # a row written before any model existed: never scored, with a blank and a text value
+    existing.loc[3, ['result', 'prediction_probability', 'Gender', 'Previous_Scores']] = [None, None, None, '40']
+    return existing
+
+
+def test_upsert_rescores_only_changed_new_and_unscored_rows(tmp_path):
+    upload = student_rows([1, 2, 9])
+    upload.loc[1, 'Previous_Scores'] = 30
+    model = RecordingModel()
+    merged, result = ingest_upsert(upload, stored_roster(), str(tmp_path / 'students.csv'), model)
+
+    assert (result.updated, result.unchanged, result.inserted, result.rescored) == (1, 1, 1, 3)
+    scored = pd.concat(model.scored)
+    assert sorted(scored.index) == ['2', '4', '9']
+    # the never-scored stored row was cleaned like uploaded rows before scoring
+    assert scored.notna().all().all()
+    assert scored.loc['4', 'Previous_Scores'] == 40
+
+    by_id = merged.set_index(merged['student_id'].astype(str))
+    assert list(by_id.loc[['1', '2', '3', '4', '9'], 'result']) == ['Pass', 'Fail', 'Pass', 'Fail', 'Pass']
+    # rows the model did not see keep their stored probability
+    assert by_id.loc['1', 'prediction_probability'] == 1.0
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+# upper bound on how long a verified token is trusted without re-verifying it
+TOKEN_CACHE_TTL = float(os.environ.get('TOKEN_CACHE_TTL', 300))
+
+
+class TokenCache:
+    """Bounded LRU cache of verified JWT payloads.
+
+    Keys are SHA-256 digests of the raw token, so the tokens themselves are
+    not kept. An entry lives for at most ``ttl`` seconds and never past the
+    token's own ``exp``. Only successful verifications are cached. A lookup
+    made with a different signing secret than the cached entries were
+    verified with empties the cache first, so rotating ``JWT_SECRET``
+    invalidates every previously verified token.
+    """
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._secret = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8', 'surrogatepass')).digest()
+
+    def _check_secret(self, secret):
+        # caller holds the lock
+        if secret != self._secret:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+            self._secret = secret
+
+    def get(self, token, secret):
+        """Return the cached payload for ``token`` verified under ``secret``, or None."""
+        if not self.enabled:
+            return None
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            self._check_secret(secret)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, payload = entry
+            if expires <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return dict(payload)
+
+    def put(self, token, secret, payload):
+        """Remember a payload that was just verified with ``secret``."""
+        if not self.enabled:
+            return
+        expires = time.time() + self.ttl
+        exp = payload.get('exp')
+        if isinstance(exp, (int, float)):
+            expires = min(expires, exp)
+        key = self._key(token)
+        with self._lock:
+            self._check_secret(secret)
+            self._entries[key] = (expires, dict(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -3,11 +3,19 @@ import pandas as pd
 import numpy as np
 import joblib
 import time
+import sklearn
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
+from features import FEATURES, NUMERIC_FIELDS
+from feature_cache import EncodedDataset, FeatureCache
+from ingest import feature_hashes
+from model_registry import file_digest
+from drift import build_reference, save_reference
+from storage import read_frame, columnar_is_fresh
+from catalog import CatalogError, DatasetCatalog
 
 # Set pandas options for better memory usage
 pd.options.mode.chained_assignment = None  # default='warn'
@@ -15,153 +23,478 @@ pd.options.mode.chained_assignment = None  # default='warn'
 BASE = os.path.dirname(__file__)
 DATA_DIR = os.path.join(BASE, 'data')
 MODEL_PATH = os.path.join(BASE, 'model', 'model.pkl')
+# what the last training saw (row hashes, tree batches); needed for incremental runs
+STATE_PATH = os.path.join(BASE, 'model', 'model.state.joblib')
 
-print(f"[{time.strftime('%H:%M:%S')}] Starting model training...")
-
-# find a data file in data/ (either CSV or Excel)
-data_file = None
-for f in os.listdir(DATA_DIR):
-    if f.lower().endswith(('.csv', '.xlsx', '.xls')):
-        data_file = os.path.join(DATA_DIR, f)
-        break
-
-if data_file is None:
-    print('No data file (CSV or Excel) found in data/ to train on. Place a data file and retry.')
-    sys.exit(1)
-
-print(f"[{time.strftime('%H:%M:%S')}] Training on {data_file}")
-
-# Read data file based on extension
-file_ext = os.path.splitext(data_file)[1].lower()
-try:
-    if file_ext in ['.xlsx', '.xls']:
-        print(f"[{time.strftime('%H:%M:%S')}] Reading Excel file...")
-        df = pd.read_excel(data_file)
-    else:  # .csv
-        print(f"[{time.strftime('%H:%M:%S')}] Reading CSV file...")
-        df = pd.read_csv(data_file)
-    
-    print(f"[{time.strftime('%H:%M:%S')}] Successfully loaded dataset with {len(df)} records")
-except Exception as e:
-    print(f"Error loading data file: {str(e)}")
-    sys.exit(1)
-
-expected = [
-    'Hours_Studied', 'Attendance', 'Parental_Involvement', 'Access_to_Resources', 
-    'Previous_Scores', 'Internet_Access', 'Tutoring_Sessions', 'Family_Income', 
-    'Peer_Influence', 'Learning_Disabilities', 'Parental_Education_Level', 
-    'Distance_from_Home', 'Gender'
-]
-
-# Columns to exclude from training (like identifiers)
-exclude_columns = ['student_id', 'Student_Name']
-
-# Student_Name is not used for prediction, so we don't include it in expected columns
-
-print(f"[{time.strftime('%H:%M:%S')}] Preprocessing data...")
-
-# Ensure we have all the columns we need
-missing_columns = [col for col in expected if col not in df.columns]
-if missing_columns:
-    print(f"Warning: Missing expected columns: {missing_columns}")
-
-# Create a copy only if needed
-needs_copy = False
-if 'student_id' in df.columns or 'Student_Name' in df.columns:
-    needs_copy = True
-
-# Handle result column
-if 'result' not in df.columns:
-    if 'Result' in df.columns:
-        # Rename Result to result for consistency
-        df.rename(columns={'Result': 'result'}, inplace=True)
-    else:
-        print(f"[{time.strftime('%H:%M:%S')}] No result column found. Generating results based on previous scores and study hours...")
+# 'full' refits from scratch; 'incremental' adds trees to the saved forest when it can
+TRAIN_MODE = os.environ.get('TRAIN_MODE', 'full')
+FULL_TREES = 100
+# trees added per incremental run, and the most the forest keeps (oldest batches retire first)
+INCREMENT_TREES = int(os.environ.get('TRAIN_INCREMENT_TREES', 20))
+MAX_TREES = int(os.environ.get('TRAIN_MAX_TREES', 100))
+# most recent rows added to every incremental batch so small deltas still see both classes
+RECENT_ROWS = int(os.environ.get('TRAIN_RECENT_ROWS', 10000))
+# above this share of changed existing rows a full refit is cheaper and safer
+MAX_CHANGED_FRACTION = float(os.environ.get('TRAIN_MAX_CHANGED_FRACTION', 0.5))
+# random_state of full refits; incremental batch i is fitted with RANDOM_STATE + i
+RANDOM_STATE = 42
+# also write model/model.compact.npz (flat arrays for compact_runtime.py) after every training
+COMPACT_EXPORT = os.environ.get('COMPACT_EXPORT', '1') not in ('0', 'false')
+
+
+class TrainingError(Exception):
+    """Raised when training cannot run (no data file, unreadable data, ...)."""
+
+
+def log(message):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}")
+
+
+def find_data_file(shards=None):
+    """The training data: one path, or a list of paths when several catalog shards are used.
+
+    ``shards`` selects catalog shards by name (default: all of them). Without
+    a catalog the first data file in data/ (CSV or Excel) is used, preferring
+    the canonical students.csv. Returns None when there is nothing to train on.
+    """
+    try:
+        paths = [path for _, path in DatasetCatalog(DATA_DIR).select(shards)]
+    except CatalogError as e:
+        raise TrainingError(str(e))
+    if paths:
+        return paths[0] if len(paths) == 1 else paths
+    if shards:
+        return None
+    for f in sorted(os.listdir(DATA_DIR), key=lambda name: (name != 'students.csv', name)):
+        if f.lower().endswith(('.csv', '.xlsx', '.xls')):
+            return os.path.join(DATA_DIR, f)
+    return None
+
+
+def load_training_frame(data_file):
+    if isinstance(data_file, (list, tuple)):
+        # shards are read one by one with only the model columns, then stacked
+        frames = [load_training_frame(path) for path in data_file]
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    # Read data file based on extension
+    file_ext = os.path.splitext(data_file)[1].lower()
+    try:
+        if file_ext in ['.xlsx', '.xls']:
+            log("Reading Excel file...")
+            df = pd.read_excel(data_file)
+        else:  # .csv
+            # only the model inputs and the label are needed; use the binary copy when it is current
+            source = 'columnar copy' if columnar_is_fresh(data_file) else 'CSV file'
+            log(f"Reading {source}...")
+            df = read_frame(data_file, columns=FEATURES + ['result', 'Result'])
+    except Exception as e:
+        raise TrainingError(f"Error loading data file: {str(e)}")
+    log(f"Successfully loaded dataset with {len(df)} records")
+    return df
+
+
+def prepare_training_data(df):
+    """Fill missing columns/labels and return ``(df, X, y)`` ready for fitting."""
+    expected = FEATURES
+
+    # Columns to exclude from training (like identifiers)
+    exclude_columns = ['student_id', 'Student_Name']
+
+    # Student_Name is not used for prediction, so we don't include it in expected columns
+
+    log("Preprocessing data...")
+
+    # Ensure we have all the columns we need
+    missing_columns = [col for col in expected if col not in df.columns]
+    if missing_columns:
+        print(f"Warning: Missing expected columns: {missing_columns}")
+
+    # Create a copy only if needed
+    needs_copy = False
+    if 'student_id' in df.columns or 'Student_Name' in df.columns:
         needs_copy = True
 
-if needs_copy:
-    df = df.copy()
-
-# Generate result if it's still missing
-if 'result' not in df.columns:
-    # More efficient way to create result column (vectorized)
-    scores_mask = pd.notna(df.get('Previous_Scores', pd.Series([np.nan] * len(df)))) & (df.get('Previous_Scores', 0) >= 50)
-    hours_mask = pd.notna(df.get('Hours_Studied', pd.Series([np.nan] * len(df)))) & (df.get('Hours_Studied', 0) >= 5)
-    df['result'] = np.where(scores_mask | hours_mask, 'Pass', 'Fail')
-
-# Ensure expected columns exist with appropriate default values
-print(f"[{time.strftime('%H:%M:%S')}] Ensuring all required columns exist...")
-for c in expected:
-    if c not in df.columns:
-        if c in ['Hours_Studied', 'Attendance', 'Previous_Scores', 'Tutoring_Sessions', 'Family_Income', 'Distance_from_Home']:
-            df[c] = 0
+    # Handle result column
+    if 'result' not in df.columns:
+        if 'Result' in df.columns:
+            # Rename Result to result for consistency
+            df.rename(columns={'Result': 'result'}, inplace=True)
         else:
-            df[c] = 'Unknown'
-
-# Convert data types for better memory usage
-print(f"[{time.strftime('%H:%M:%S')}] Optimizing memory usage...")
-numeric_cols = ['Hours_Studied', 'Attendance', 'Previous_Scores', 'Tutoring_Sessions', 'Family_Income', 'Distance_from_Home']
-for col in numeric_cols:
-    if col in df.columns:
-        # Convert to appropriate numeric type
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-# Prepare X, y more efficiently
-print(f"[{time.strftime('%H:%M:%S')}] Preparing training data...")
-# Make sure we're only using expected columns for training
-X = df[expected].copy()
-y = (df['result'].astype(str).str.lower() == 'pass').astype(np.int8)  # Use int8 for memory efficiency
-
-# Log if we excluded any columns that were in the dataset but not used
-for col in df.columns:
-    if col not in expected and col != 'result' and col not in exclude_columns:
-        print(f"[{time.strftime('%H:%M:%S')}] Note: Column '{col}' present in data but not used for training")
-
-# Identify numeric vs categorical columns
-print(f"[{time.strftime('%H:%M:%S')}] Setting up model pipeline...")
-numeric = [c for c in expected if X[c].dtype.kind in 'biufc']
-categorical = [c for c in expected if c not in numeric]
-
-numeric_transformer = Pipeline([
-    ('scaler', StandardScaler())
-])
-
-categorical_transformer = Pipeline([
-    ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=False))  # Non-sparse for better compatibility
-])
-
-preprocessor = ColumnTransformer(
-    transformers=[
-        ('num', numeric_transformer, numeric),
-        ('cat', categorical_transformer, categorical)
-    ]
-)
-
-# Set n_jobs=-1 to use all cores for training
-print(f"[{time.strftime('%H:%M:%S')}] Training RandomForest model using all CPU cores...")
-clf = Pipeline([
-    ('pre', preprocessor),
-    ('clf', RandomForestClassifier(
-        n_estimators=100,
-        random_state=42,
+            log("No result column found. Generating results based on previous scores and study hours...")
+            needs_copy = True
+
+    if needs_copy:
+        df = df.copy()
+
+    # Generate result if it's still missing
+    if 'result' not in df.columns:
+        # More efficient way to create result column (vectorized)
+        scores_mask = pd.notna(df.get('Previous_Scores', pd.Series([np.nan] * len(df)))) & (df.get('Previous_Scores', 0) >= 50)
+        hours_mask = pd.notna(df.get('Hours_Studied', pd.Series([np.nan] * len(df)))) & (df.get('Hours_Studied', 0) >= 5)
+        df['result'] = np.where(scores_mask | hours_mask, 'Pass', 'Fail')
+
+    # Ensure expected columns exist with appropriate default values
+    log("Ensuring all required columns exist...")
+    for c in expected:
+        if c not in df.columns:
+            if c in NUMERIC_FIELDS:
+                df[c] = 0
+            else:
+                df[c] = 'Unknown'
+
+    # Convert data types for better memory usage
+    log("Optimizing memory usage...")
+    for col in NUMERIC_FIELDS:
+        if col in df.columns:
+            # Convert to appropriate numeric type
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    # Prepare X, y more efficiently
+    log("Preparing training data...")
+    # Make sure we're only using expected columns for training
+    X = df[expected].copy()
+    y = (df['result'].astype(str).str.lower() == 'pass').astype(np.int8)  # Use int8 for memory efficiency
+
+    # Log if we excluded any columns that were in the dataset but not used
+    for col in df.columns:
+        if col not in expected and col != 'result' and col not in exclude_columns:
+            log(f"Note: Column '{col}' present in data but not used for training")
+    return df, X, y
+
+
+def build_preprocessor(numeric, categorical):
+    numeric_transformer = Pipeline([
+        ('scaler', StandardScaler())
+    ])
+
+    categorical_transformer = Pipeline([
+        ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=False))  # Non-sparse for better compatibility
+    ])
+
+    return ColumnTransformer(
+        transformers=[
+            ('num', numeric_transformer, numeric),
+            ('cat', categorical_transformer, categorical)
+        ]
+    )
+
+
+def build_forest(n_estimators=100):
+    # Set n_jobs=-1 to use all cores for training
+    return RandomForestClassifier(
+        n_estimators=n_estimators,
+        random_state=RANDOM_STATE,
         n_jobs=-1,  # Use all available cores
         verbose=1    # Show progress
-    ))
-])
-
-# Train the model
-training_start = time.time()
-clf.fit(X, y)
-training_time = time.time() - training_start
-
-# Save the model
-print(f"[{time.strftime('%H:%M:%S')}] Training completed in {training_time:.2f} seconds. Saving model...")
-joblib.dump(clf, MODEL_PATH)
-print(f"[{time.strftime('%H:%M:%S')}] Model saved to {MODEL_PATH}")
-
-# Print some stats
-print(f"\nTraining Statistics:")
-print(f"- Records processed: {len(df)}")
-print(f"- Pass/Fail distribution: {df['result'].value_counts().to_dict()}")
-print(f"- Features used: {len(expected)}")
-print(f"- Training time: {training_time:.2f} seconds")
+    )
+
+
+def build_pipeline(X, n_estimators=100):
+    # Identify numeric vs categorical columns
+    numeric = [c for c in FEATURES if X[c].dtype.kind in 'biufc']
+    categorical = [c for c in FEATURES if c not in numeric]
+    return Pipeline([
+        ('pre', build_preprocessor(numeric, categorical)),
+        ('clf', build_forest(n_estimators))
+    ])
+
+
+def preprocessing_config():
+    # everything besides the data that decides the encoded matrix; part of the feature cache key
+    return {
+        'features': FEATURES,
+        'numeric_fields': NUMERIC_FIELDS,
+        'preprocessor': repr(build_preprocessor([], [])),
+        'sklearn': sklearn.__version__,
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def encode_training_data(data_file, prepared=None, cache=None):
+    """Return the EncodedDataset for ``data_file``, from the feature cache when possible.
+
+    On a miss the file is parsed and prepared (or ``prepared=(df, X, y)`` is
+    used), the preprocessor is fitted and the result is stored for the next
+    run on the same content.
+    """
+    cache = cache or FeatureCache()
+    key = cache.key(data_file, preprocessing_config()) if cache.enabled else None
+    if key is not None:
+        dataset = cache.load(key)
+        if dataset is not None:
+            log(f"Feature cache hit ({key}): skipping parsing and encoding of {dataset.meta['records']} records")
+            return dataset
+    df, X, y = prepared if prepared is not None else prepare_training_data(load_training_frame(data_file))
+    log("Encoding features...")
+    preprocessor = build_pipeline(X).named_steps['pre']
+    Xt = preprocessor.fit_transform(X)
+    meta = {
+        'data_file': data_file,
+        'records': len(df),
+        'distribution': {str(k): int(v) for k, v in df['result'].value_counts().items()},
+        # the raw features are not kept in the cache, so their drift sketches are
+        'drift_reference': build_reference(X),
+    }
+    dataset = EncodedDataset(key, Xt, y.to_numpy(), row_hashes(X, y), preprocessor, meta, hit=False)
+    if key is not None:
+        cache.store(dataset)
+        log(f"Stored encoded features in the feature cache ({key})")
+    return dataset
+
+
+def row_hashes(X, y):
+    # one hash per training row covering the 13 features and the label
+    return feature_hashes(X) ^ pd.util.hash_array(y.to_numpy().astype(np.int64))
+
+
+def save_model(clf, state):
+    # write to a temp file and rename so the serving app never loads a partial file
+    tmp_path = MODEL_PATH + '.tmp'
+    # sklearn copies the tree arrays when unpickling, so memory-mapping this file shares nothing;
+    # the compact export (model.compact.npz) is the format whose arrays workers share
+    joblib.dump(clf, tmp_path)
+    os.replace(tmp_path, MODEL_PATH)
+    log(f"Model saved to {MODEL_PATH}")
+    # the state is tied to this exact model file; a model written by anything else forces a full refit
+    state['model_digest'] = file_digest(MODEL_PATH)
+    tmp_path = STATE_PATH + '.tmp'
+    joblib.dump(state, tmp_path)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def export_compact(clf, data_file, prepared=None):
+    """Write the compact copy of ``clf`` and its parity report; returns a stats dict or None."""
+    if not COMPACT_EXPORT:
+        return None
+    import compact_model
+    try:
+        if prepared is not None:
+            X, y = compact_model.parity_sample(prepared[1], prepared[2])
+        else:
+            X, y = compact_model.load_parity_sample(data_file)
+        report = compact_model.export_model(clf, X, y)
+    except Exception as e:
+        # a stale compact model must not outlive the pickle it was exported from
+        if os.path.exists(compact_model.COMPACT_PATH):
+            os.remove(compact_model.COMPACT_PATH)
+        log(f"Compact export failed: {str(e)}")
+        return {'error': str(e)}
+    parity = report['parity']
+    log(f"Compact model saved to {report['path']} ({report['nodes']} nodes, {report['compact_file_bytes']} bytes); "
+        f"label agreement {parity['label_agreement']:.4%}, max probability diff {parity['max_abs_probability_diff']:.2e}")
+    return {'path': report['path'], 'nodes': report['nodes'], 'file_bytes': report['compact_file_bytes'],
+            'label_agreement': parity['label_agreement']}
+
+
+def load_previous(data_file):
+    """Return ``(pipeline, state)`` of the last training, or ``(None, reason)``."""
+    if not os.path.exists(MODEL_PATH) or not os.path.exists(STATE_PATH):
+        return None, 'no previous model/state'
+    try:
+        state = joblib.load(STATE_PATH)
+        if state.get('model_digest') != file_digest(MODEL_PATH):
+            return None, 'model file was replaced since the last training'
+        if state.get('data_file') != data_file:
+            return None, 'training data file changed'
+        clf = joblib.load(MODEL_PATH)
+    except Exception as e:
+        return None, f'could not load previous model: {str(e)}'
+    named = getattr(clf, 'named_steps', {})
+    if not isinstance(named.get('clf'), RandomForestClassifier) or 'pre' not in named:
+        return None, 'previous model is not a preprocessor + random forest pipeline'
+    return clf, state
+
+
+def schema_drift(pre, X):
+    """Why the fitted preprocessor no longer fits ``X`` (None when it does)."""
+    numeric = [c for c in FEATURES if X[c].dtype.kind in 'biufc']
+    fitted = {name: list(columns) for name, _, columns in pre.transformers_ if name != 'remainder'}
+    if fitted.get('num', []) != numeric or fitted.get('cat', []) != [c for c in FEATURES if c not in numeric]:
+        return 'numeric/categorical columns changed'
+    onehot = pre.named_transformers_['cat'].named_steps['onehot']
+    for col, levels in zip(fitted['cat'], onehot.categories_):
+        known = set(levels)
+        new = [v for v in X[col].dropna().unique() if v not in known]
+        if new:
+            return f"new {col} levels: {new[:5]}"
+    return None
+
+
+def plan_increment(X, y, hashes, state):
+    """Row positions to train new trees on, or ``(None, reason)`` when a full refit is needed."""
+    previous = state['row_hashes']
+    if len(X) < len(previous):
+        return None, 'rows were removed from the training data'
+    changed = np.flatnonzero(hashes[:len(previous)] != previous)
+    if len(previous) and len(changed) > MAX_CHANGED_FRACTION * len(previous):
+        return None, f'{len(changed)} of {len(previous)} existing rows changed'
+    appended = np.arange(len(previous), len(X))
+    if len(changed) + len(appended) == 0:
+        return np.array([], dtype=np.int64), None
+    recent = np.arange(max(0, len(X) - RECENT_ROWS), len(X))
+    rows = np.union1d(np.union1d(changed, appended), recent)
+    if y.iloc[rows].nunique() < 2:
+        return None, 'new data has a single class'
+    log(f"Incremental batch: {len(changed)} changed, {len(appended)} new, {len(rows)} rows with recent context")
+    return rows, None
+
+
+def train_incremental(clf, state, X, y, hashes):
+    """Add INCREMENT_TREES trees trained on new/changed rows to the saved forest.
+
+    The fitted preprocessor is reused unchanged, so its one-hot levels and
+    scaler statistics stay those of the last full refit. When the forest
+    would exceed MAX_TREES the oldest tree batches are retired first.
+    Returns ``(stats, reason)``; stats is None when a full refit is needed.
+    """
+    pre, forest = clf.named_steps['pre'], clf.named_steps['clf']
+    reason = schema_drift(pre, X)
+    if reason:
+        return None, reason
+    rows, reason = plan_increment(X, y, hashes, state)
+    if rows is None:
+        return None, reason
+    if len(rows) == 0:
+        log("No new or changed rows since the last training; keeping the current model")
+        return {'trees_added': 0, 'trees_retired': 0, 'batch_rows': 0, 'n_estimators': len(forest.estimators_)}, None
+
+    batches = list(state['batches'])
+    retired = 0
+    while batches and sum(batches) + INCREMENT_TREES > MAX_TREES:
+        retire = min(batches[0], sum(batches) + INCREMENT_TREES - MAX_TREES)
+        forest.estimators_ = forest.estimators_[retire:]
+        retired += retire
+        batches[0] -= retire
+        if batches[0] == 0:
+            batches.pop(0)
+    if retired:
+        log(f"Retired the {retired} oldest trees")
+
+    log(f"Training {INCREMENT_TREES} new trees on {len(rows)} rows (warm start)...")
+    # warm start seeds new trees by their position in the forest, and retirement shrinks the forest,
+    # so a batch fitted with the same random_state would repeat the seeds of surviving trees
+    seed = state.get('seed', RANDOM_STATE) + 1
+    # fit the forest on already-transformed rows: Pipeline.fit would refit the preprocessor
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + INCREMENT_TREES, random_state=seed)
+    forest.fit(pre.transform(X.iloc[rows]), y.iloc[rows])
+    forest.set_params(warm_start=False)
+    batches.append(INCREMENT_TREES)
+    state['batches'] = batches
+    state['seed'] = seed
+    return {'trees_added': INCREMENT_TREES, 'trees_retired': retired, 'batch_rows': len(rows),
+            'n_estimators': len(forest.estimators_)}, None
+
+
+def train_model(mode=None, shards=None):
+    """Train on the current data file(s) and save the pipeline to MODEL_PATH.
+
+    ``mode`` is 'full' (default, from TRAIN_MODE) or 'incremental'; an
+    incremental run falls back to a full refit when there is no usable
+    previous model or the data no longer fits its preprocessor. ``shards``
+    limits training to those catalog shards. Returns a dict of training
+    statistics. Raises TrainingError when there is nothing to train on.
+    """
+    mode = mode or TRAIN_MODE
+    if mode not in ('full', 'incremental'):
+        raise TrainingError(f"Unknown training mode '{mode}' (use 'full' or 'incremental')")
+    log(f"Starting model training ({mode})...")
+
+    data_file = find_data_file(shards)
+    if data_file is None:
+        raise TrainingError('No data file (CSV or Excel) found in data/ to train on. Place a data file and retry.')
+
+    log(f"Training on {', '.join(data_file) if isinstance(data_file, list) else data_file}")
+    increment, fallback, prepared = None, None, None
+    training_start = time.time()
+    if mode == 'incremental':
+        # incremental runs compare raw rows against the saved state, so they always parse
+        df, X, y = prepared = prepare_training_data(load_training_frame(data_file))
+        hashes = row_hashes(X, y)
+        clf, state = load_previous(data_file)
+        if clf is None:
+            fallback = state
+        else:
+            increment, fallback = train_incremental(clf, state, X, y, hashes)
+        if fallback:
+            log(f"Falling back to a full refit: {fallback}")
+        records = len(df)
+        distribution = {str(k): int(v) for k, v in df['result'].value_counts().items()}
+        reference = build_reference(X)
+
+    feature_cache = None
+    if increment is None:
+        # unchanged data is not parsed or encoded again: straight to fitting the forest
+        dataset = encode_training_data(data_file, prepared=prepared)
+        feature_cache = 'hit' if dataset.hit else 'miss'
+        hashes = dataset.row_hashes
+        records, distribution = dataset.meta['records'], dataset.meta['distribution']
+        reference = dataset.meta['drift_reference']
+
+        log("Setting up model pipeline...")
+        forest = build_forest(FULL_TREES)
+        clf = Pipeline([('pre', dataset.preprocessor), ('clf', forest)])
+        state = {'batches': [FULL_TREES], 'seed': RANDOM_STATE}
+
+        log("Training RandomForest model using all CPU cores...")
+        # Train the model on the already-encoded matrix (same result as clf.fit on the raw frame)
+        forest.fit(dataset.X, dataset.y)
+    training_time = time.time() - training_start
+
+    if increment is None or increment['trees_added']:
+        # Save the model
+        log(f"Training completed in {training_time:.2f} seconds. Saving model...")
+        state.update({'data_file': data_file, 'row_hashes': np.asarray(hashes)})
+        # what /api/drift compares new data with; written first so the app finds it when the new model loads
+        save_reference(reference)
+        save_model(clf, state)
+        compact = export_compact(clf, data_file, prepared)
+    else:
+        compact = None
+
+    stats = {
+        'mode': 'incremental' if increment is not None else 'full',
+        'fallback_reason': fallback,
+        'feature_cache': feature_cache,
+        'data_file': data_file,
+        'shards': shards,
+        'records': records,
+        'distribution': distribution,
+        'features': len(FEATURES),
+        'training_time': round(training_time, 3),
+        'model_path': MODEL_PATH,
+        'compact_model': compact,
+    }
+    if increment is not None:
+        stats.update(increment)
+    else:
+        stats['n_estimators'] = FULL_TREES
+
+    # Print some stats
+    print(f"\nTraining Statistics:")
+    print(f"- Mode: {stats['mode']}" + (f" (fallback: {fallback})" if fallback else ''))
+    if feature_cache:
+        print(f"- Feature cache: {feature_cache}")
+    print(f"- Records processed: {stats['records']}")
+    print(f"- Pass/Fail distribution: {stats['distribution']}")
+    print(f"- Features used: {stats['features']}")
+    print(f"- Trees in forest: {stats['n_estimators']}")
+    print(f"- Training time: {training_time:.2f} seconds")
+    return stats
+
+
+def main():
+    args = sys.argv[1:]
+    # --shards a,b trains on those catalog shards only
+    shards = None
+    if '--shards' in args and args.index('--shards') + 1 < len(args):
+        shards = [name for name in args[args.index('--shards') + 1].split(',') if name]
+    try:
+        train_model('incremental' if '--incremental' in args else None, shards)
+    except TrainingError as e:
+        print(str(e))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
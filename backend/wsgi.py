@@ -0,0 +1,14 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module loads the model and the roster, so with
+``preload_app`` both are loaded once in the gunicorn master and the forked
+workers share those pages copy-on-write.
+"""
+from app import app, roster
+
+# warm the roster cache before the workers are forked
+roster.frame()
+
+application = app
@@ -1,4 +1,4 @@
-import React, {useEffect, useState, useMemo} from 'react';
+import React, {useEffect, useState} from 'react';
 import axios from 'axios';
 import { Button, Card, CardContent, Typography, Grid, Box, TextField, CircularProgress, Tabs, Tab } from '@mui/material';
 import { PieChart, Pie, Cell, ResponsiveContainer, BarChart, Bar, XAxis, YAxis, Tooltip, Legend, ScatterChart, Scatter, LineChart, Line, CartesianGrid } from 'recharts';
@@ -12,32 +12,29 @@ export default function TeacherDashboard({token, onLogout}){
   const [dataAnalysis, setDataAnalysis] = useState(null);
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   
-  useEffect(()=>{ fetchStudents(); }, []);
+  useEffect(()=>{ fetchStudents(); analyzeData(); }, []);
   
-  // Generate data analysis whenever student data changes
-  useEffect(() => {
-    if (students.length > 0) {
-      analyzeData();
-    }
-  }, [students]);
-  
-  // Function to analyze the student data and generate insights
-  const analyzeData = () => {
+  // Fetch the server-side cohort aggregates and map them onto the chart data
+  const analyzeData = async () => {
     setIsAnalyzing(true);
     try {
-      // Calculate statistics
+      const res = await axios.get(API + '/analytics', {headers:{Authorization:'Bearer '+token}});
+      const {overall, groups} = res.data;
+      if (!overall) { setDataAnalysis(null); return; }
       const analysis = {
-        totalStudents: students.length,
-        passRate: students.filter(s => (s.result || '').toLowerCase() === 'pass').length / students.length * 100,
-        averageHours: calculateAverage(students, 'Hours_Studied'),
-        averageAttendance: calculateAverage(students, 'Attendance'),
-        averageScore: calculateAverage(students, 'Previous_Scores'),
-        correlationHoursResult: calculateCorrelation(students, 'Hours_Studied', 'result'),
-        correlationAttendanceResult: calculateCorrelation(students, 'Attendance', 'result'),
-        correlationScoreResult: calculateCorrelation(students, 'Previous_Scores', 'result'),
-        genderDistribution: calculateDistribution(students, 'Gender'),
-        parentalInvolvementDistribution: calculateDistribution(students, 'Parental_Involvement'),
-        learningDisabilitiesDistribution: calculateDistribution(students, 'Learning_Disabilities'),
+        totalStudents: overall.students,
+        passCount: overall.pass_count,
+        failCount: overall.fail_count,
+        passRate: (overall.pass_rate || 0) * 100,
+        averageHours: overall.mean_Hours_Studied || 0,
+        averageAttendance: overall.mean_Attendance || 0,
+        averageScore: overall.mean_Previous_Scores || 0,
+        correlationHoursResult: toPassRates(overall.histograms.Hours_Studied),
+        correlationAttendanceResult: toPassRates(overall.histograms.Attendance),
+        correlationScoreResult: toPassRates(overall.histograms.Previous_Scores),
+        genderDistribution: toDistribution(groups.Gender),
+        parentalInvolvementDistribution: toDistribution(groups.Parental_Involvement),
+        learningDisabilitiesDistribution: toDistribution(groups.Learning_Disabilities),
       };
       
       setDataAnalysis(analysis);
@@ -48,58 +45,25 @@ export default function TeacherDashboard({token, onLogout}){
     }
   };
   
-  // Helper functions for data analysis
-  const calculateAverage = (data, field) => {
-    const values = data
-      .map(item => Number(item[field] || 0))
-      .filter(val => !isNaN(val));
-    
-    return values.length ? values.reduce((sum, val) => sum + val, 0) / values.length : 0;
-  };
+  // Helper functions for mapping the analytics response
+  const toDistribution = (group) => (group || []).map(g => ({ name: g.value, value: g.students }));
   
-  const calculateDistribution = (data, field) => {
-    const distribution = {};
-    data.forEach(item => {
-      const value = item[field] || 'Unknown';
-      distribution[value] = (distribution[value] || 0) + 1;
-    });
-    
-    return Object.entries(distribution).map(([name, value]) => ({ name, value }));
-  };
-  
-  const calculateCorrelation = (data, field, resultField) => {
-    // Simple correlation - percentage of passing students per value range
-    const ranges = {};
-    const rangeSize = 10;
-    
-    data.forEach(item => {
-      const value = Number(item[field] || 0);
-      if (!isNaN(value)) {
-        const rangeKey = Math.floor(value / rangeSize) * rangeSize;
-        if (!ranges[rangeKey]) {
-          ranges[rangeKey] = { total: 0, pass: 0 };
-        }
-        ranges[rangeKey].total++;
-        if ((item[resultField] || '').toLowerCase() === 'pass') {
-          ranges[rangeKey].pass++;
-        }
-      }
-    });
-    
-    return Object.entries(ranges).map(([range, stats]) => ({
-      name: `${range}-${Number(range) + rangeSize}`,
-      passRate: (stats.pass / stats.total) * 100,
-      count: stats.total
+  const toPassRates = (bins) => (bins || [])
+    .filter(bin => bin.students > 0)
+    .map(bin => ({
+      name: `${bin.from}-${bin.to}`,
+      passRate: bin.pass_rate * 100,
+      count: bin.students
     }));
-  };
 
   const fetchStudents = async ()=>{
-    try{ const res = await axios.get(API + '/students', {headers:{Authorization:'Bearer '+token}}); setStudents(res.data||[]); } catch(e){ console.error(e); }
+    // only the first page is listed and plotted; totals come from /analytics
+    try{ const res = await axios.get(API + '/students', {params:{limit:300}, headers:{Authorization:'Bearer '+token}}); setStudents(res.data.items||[]); } catch(e){ console.error(e); }
   };
 
   // File upload and retrain functionality removed
 
-  const passFail = [{name:'Pass', value: students.filter(s=> (s.result||'').toString().toLowerCase()==='pass').length},{name:'Fail', value: students.filter(s=> (s.result||'').toString().toLowerCase()!=='pass').length}];
+  const passFail = dataAnalysis ? [{name:'Pass', value: dataAnalysis.passCount},{name:'Fail', value: dataAnalysis.failCount}] : [];
 
   return (
     <Box sx={{p:2}}>
@@ -253,7 +217,7 @@ export default function TeacherDashboard({token, onLogout}){
               <Grid item xs={12}>
                 <Card className="dashboard-card">
                   <CardContent>
-                    <Typography variant="h6" className="card-header">Performance Scatter Plot</Typography>
+                    <Typography variant="h6" className="card-header">Performance Scatter Plot (first 300)</Typography>
                     <ResponsiveContainer width="100%" height={400}>
                       <ScatterChart margin={{ top: 20, right: 20, bottom: 20, left: 20 }}>
                         <CartesianGrid />
@@ -340,7 +304,7 @@ function PredictionForm({token}){
       const payload = {...form};
       fields.forEach(f=>{ if(f.type==='number') payload[f.key] = Number(payload[f.key]); });
       const axios = await import('axios').then(m=>m.default);
-      const r = await axios.post(API + '/predict', payload, {headers:{Authorization:'Bearer '+token}});
+      const r = await axios.post(API + '/predict', payload, {params:{explain:1}, headers:{Authorization:'Bearer '+token}});
       setRes(r.data);
     }catch(e){ setRes({error: e.response?.data?.message || e.message}); }
   };
@@ -381,14 +345,18 @@ function PredictionForm({token}){
           
           <Box sx={{mt:2, mb:1}}>
             <Typography variant="subtitle2" sx={{fontWeight: 'bold'}}>Key Factors:</Typography>
-            <ul>
+            {res.explanation ? <ul>
+              {res.explanation.contributions.slice(0,5).map(c=>(<li key={c.feature}>
+                {c.feature.replace(/_/g,' ')}: {form[c.feature]} ({c.contribution >= 0 ? '+' : ''}{(c.contribution*100).toFixed(1)} pts) {c.contribution >= 0 ? '✅' : '⚠️'}
+              </li>))}
+            </ul> : <ul>
               <li>Hours Studied: {form.Hours_Studied} {Number(form.Hours_Studied) >= 5 ? '✅' : '⚠️'}</li>
               <li>Previous Scores: {form.Previous_Scores} {Number(form.Previous_Scores) >= 50 ? '✅' : '⚠️'}</li>
               <li>Attendance: {form.Attendance}% {Number(form.Attendance) >= 70 ? '✅' : '⚠️'}</li>
               <li>Parental Involvement: {form.Parental_Involvement}</li>
               <li>Access to Resources: {form.Access_to_Resources}</li>
               <li>Internet Access: {form.Internet_Access}</li>
-            </ul>
+            </ul>}
           </Box>
           
           <Typography variant="body2" sx={{fontStyle: 'italic'}}>